@@ -0,0 +1,353 @@
+import math
+import random
+from collections import namedtuple
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from police.models import PatrolTeam
+from reports.models import Report
+from safety.models import Hospital, PoliceStation
+from sos.models import SOSAlert, SOSLocationUpdate, Volunteer, VolunteerAlert
+from users.models import User
+
+City = namedtuple('City', 'name state latitude longitude radius_km weight')
+
+# Weight is roughly relative population; incidents are spread in proportion
+CITIES = [
+    City('Mumbai', 'Maharashtra', 19.0760, 72.8777, 18, 20),
+    City('Delhi', 'Delhi', 28.6139, 77.2090, 22, 19),
+    City('Kolkata', 'West Bengal', 22.5726, 88.3639, 14, 12),
+    City('Bengaluru', 'Karnataka', 12.9716, 77.5946, 16, 12),
+    City('Hyderabad', 'Telangana', 17.3850, 78.4867, 15, 10),
+    City('Chennai', 'Tamil Nadu', 13.0827, 80.2707, 14, 9),
+    City('Ahmedabad', 'Gujarat', 23.0225, 72.5714, 12, 8),
+    City('Pune', 'Maharashtra', 18.5204, 73.8567, 12, 6),
+]
+
+# Row counts per model. users are citizens; volunteers and police officers
+# (two to four per patrol team) come on top
+PROFILES = {
+    'small': {
+        'users': 300, 'reports': 3000, 'sos_alerts': 400, 'location_updates': 4000,
+        'volunteers': 60, 'patrol_teams': 12, 'police_stations': 40, 'hospitals': 60,
+    },
+    'city': {
+        'users': 5000, 'reports': 50000, 'sos_alerts': 5000, 'location_updates': 100000,
+        'volunteers': 600, 'patrol_teams': 120, 'police_stations': 300, 'hospitals': 500,
+    },
+    'metro': {
+        'users': 50000, 'reports': 500000, 'sos_alerts': 50000, 'location_updates': 1000000,
+        'volunteers': 5000, 'patrol_teams': 800, 'police_stations': 1500, 'hospitals': 2500,
+    },
+}
+
+SEED_EMAIL_DOMAIN = 'seed.cityshield.test'
+SEED_PASSWORD = 'cityshield-seed'
+SEED_TEAM_PREFIX = 'SEED-'
+
+HOTSPOTS_PER_CITY = 12
+# Share of incidents drawn from a hotspot rather than anywhere in the city
+HOTSPOT_SHARE = 0.8
+HOTSPOT_SPREAD_M = 500
+ACTIVE_SOS_SHARE = 0.1
+
+REPORT_TYPES = {
+    'crime': (0.3, ['Chain snatching', 'Mobile phone theft', 'Vehicle theft', 'Burglary', 'Pickpocketing']),
+    'harassment': (0.2, ['Catcalling near bus stop', 'Stalking', 'Verbal harassment', 'Eve teasing']),
+    'safety': (0.25, ['Poorly lit lane', 'Unsafe crossing', 'Stray dog attack', 'Waterlogging']),
+    'infrastructure': (0.15, ['Broken streetlight', 'Open manhole', 'Pothole', 'Collapsed footpath']),
+    'other': (0.1, ['Illegal parking', 'Garbage dumping', 'Noise complaint']),
+}
+REPORT_STATUSES = {'pending': 0.35, 'investigating': 0.25, 'resolved': 0.3, 'dismissed': 0.1}
+EMERGENCY_TYPES = {'general_emergency': 0.4, 'medical': 0.25, 'harassment': 0.15, 'accident': 0.15, 'fire': 0.05}
+HOSPITAL_TYPES = ['General', 'Multi-speciality', 'Clinic', 'Trauma centre', 'Maternity']
+
+
+def offset_point(latitude, longitude, north_m, east_m):
+    """Move a point by a distance in meters"""
+    return (
+        latitude + north_m / 111320,
+        longitude + east_m / (111320 * math.cos(math.radians(latitude))),
+    )
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    north = (lat2 - lat1) * 111.32
+    east = (lng2 - lng1) * 111.32 * math.cos(math.radians(lat1))
+    return math.hypot(north, east)
+
+
+def _pick(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+class CityGenerator:
+    """Synthetic city-scale data with incidents clustered around hotspots.
+
+    Each city gets HOTSPOTS_PER_CITY hotspots of falling popularity;
+    reports, SOS alerts and volunteers mostly sit within a few hundred
+    meters of one, the rest anywhere in the city. Facilities are spread
+    over the whole city. The same seed always gives the same hotspots and
+    rows, so points from ``point()`` land where the data is.
+    """
+
+    def __init__(self, volumes, seed=42, cities=None, days=90, batch_size=1000, log=None):
+        self.volumes = volumes
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.cities = cities or CITIES
+        self.days = days
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.hotspots = {city.name: self._hotspots(city) for city in self.cities}
+
+    def _hotspots(self, city):
+        hotspots = []
+        for rank in range(HOTSPOTS_PER_CITY):
+            spread = city.radius_km * 1000 / 2
+            north, east = self.rng.gauss(0, spread), self.rng.gauss(0, spread)
+            hotspots.append((*offset_point(city.latitude, city.longitude, north, east), 1 / (rank + 1)))
+        return hotspots
+
+    def city(self, rng=None):
+        rng = rng or self.rng
+        return rng.choices(self.cities, weights=[city.weight for city in self.cities])[0]
+
+    def point(self, city=None, rng=None):
+        """A point where incidents cluster; pass your own rng to leave the seeded one alone"""
+        rng = rng or self.rng
+        city = city or self.city(rng)
+        if rng.random() < HOTSPOT_SHARE:
+            hotspots = self.hotspots[city.name]
+            latitude, longitude, _ = rng.choices(hotspots, weights=[h[2] for h in hotspots])[0]
+            spread = HOTSPOT_SPREAD_M
+        else:
+            latitude, longitude = city.latitude, city.longitude
+            spread = city.radius_km * 1000 / 2
+        return offset_point(latitude, longitude, rng.gauss(0, spread), rng.gauss(0, spread))
+
+    def spread_point(self, city):
+        """A point anywhere in the city, for facilities"""
+        radius = city.radius_km * 1000 * math.sqrt(self.rng.random())
+        angle = self.rng.uniform(0, 2 * math.pi)
+        return offset_point(city.latitude, city.longitude, radius * math.cos(angle), radius * math.sin(angle))
+
+    def _past(self, max_days=None):
+        # Skewed towards recent activity
+        seconds = (max_days or self.days) * 86400 * self.rng.random() ** 1.5
+        return self.now - timedelta(seconds=seconds)
+
+    def _bulk_create(self, manager, objs):
+        for start in range(0, len(objs), self.batch_size):
+            manager.bulk_create(objs[start:start + self.batch_size])
+        return objs
+
+    def _bulk_update(self, manager, objs, fields):
+        for start in range(0, len(objs), self.batch_size):
+            manager.bulk_update(objs[start:start + self.batch_size], fields)
+
+    def generate(self):
+        """Create every row; returns counts per model.
+
+        Running it again on the same database adds another batch around
+        the same hotspots.
+        """
+        self.now = timezone.now()
+        self.password = make_password(SEED_PASSWORD)
+        self.user_offset = User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}').count()
+        self.team_offset = PatrolTeam.objects.filter(team_id__startswith=SEED_TEAM_PREFIX).count()
+        # Fresh rows (facility coordinates are unique) for each batch
+        self.rng = random.Random(f'{self.seed}:{self.user_offset}')
+        self._users_made = 0
+
+        counts = {}
+        stations = self.police_stations(self.volumes['police_stations'])
+        counts['police_stations'] = len(stations)
+        counts['hospitals'] = len(self.hospitals(self.volumes['hospitals']))
+        citizens = self.users(self.volumes['users'], 'citizen')
+        counts['users'] = len(citizens)
+        volunteers = self.volunteers(self.volumes['volunteers'])
+        counts['volunteers'] = len(volunteers)
+        teams, officers = self.patrol_teams(self.volumes['patrol_teams'], stations)
+        counts['patrol_teams'], counts['police_officers'] = len(teams), len(officers)
+        counts['reports'] = len(self.reports(self.volumes['reports'], citizens))
+        alerts = self.sos_alerts(self.volumes['sos_alerts'], citizens)
+        counts['sos_alerts'] = len(alerts)
+        counts['location_updates'] = len(self.location_updates(self.volumes['location_updates'], alerts))
+        counts['volunteer_alerts'] = len(self.volunteer_alerts(alerts, volunteers))
+        return counts
+
+    def police_stations(self, count):
+        stations = []
+        for n in range(count):
+            city = self.city()
+            latitude, longitude = self.spread_point(city)
+            stations.append(PoliceStation(
+                name=f'{city.name} Police Station {n + 1}', latitude=latitude, longitude=longitude,
+                address=f'Ward {n + 1}, {city.name}', city=city.name, state=city.state,
+                contact_number=f'100{n:07d}'[:10], source='seed'
+            ))
+        self.log(f'Creating {count} police stations')
+        return self._bulk_create(PoliceStation.objects, stations)
+
+    def hospitals(self, count):
+        hospitals = []
+        for n in range(count):
+            city = self.city()
+            latitude, longitude = self.spread_point(city)
+            hospitals.append(Hospital(
+                name=f'{city.name} Hospital {n + 1}', latitude=latitude, longitude=longitude,
+                address=f'Sector {n + 1}, {city.name}', city=city.name, state=city.state,
+                contact_number=f'108{n:07d}'[:10], hospital_type=self.rng.choice(HOSPITAL_TYPES), source='seed'
+            ))
+        self.log(f'Creating {count} hospitals')
+        return self._bulk_create(Hospital.objects, hospitals)
+
+    def _user(self, role, station=None):
+        number = self.user_offset + self._users_made
+        self._users_made += 1
+        email = f'{role}{number}@{SEED_EMAIL_DOMAIN}'
+        return User(
+            username=email, email=email, password=self.password, role=role,
+            name=f'Seed {role.title()} {number}', phone=f'9{number:09d}'[:10],
+            police_station=station, date_joined=self._past()
+        )
+
+    def users(self, count, role):
+        self.log(f'Creating {count} {role} users')
+        return self._bulk_create(User.objects, [self._user(role) for _ in range(count)])
+
+    def volunteers(self, count):
+        volunteers = []
+        for user in self.users(count, 'volunteer'):
+            city = self.city()
+            latitude, longitude = self.point(city)
+            volunteer = Volunteer(
+                user=user, phone_number=user.phone, is_verified=self.rng.random() < 0.85,
+                is_available=self.rng.random() < 0.5, current_latitude=latitude, current_longitude=longitude,
+                last_location_update=self._past(max_days=1)
+            )
+            volunteer.seed_city = city
+            volunteers.append(volunteer)
+        return self._bulk_create(Volunteer.objects, volunteers)
+
+    def patrol_teams(self, count, stations):
+        teams, officers, memberships = [], [], []
+        for n in range(count):
+            station = self.rng.choice(stations)
+            members = [self._user('police', station) for _ in range(self.rng.randint(2, 4))]
+            latitude, longitude = offset_point(
+                station.latitude, station.longitude, self.rng.gauss(0, 1500), self.rng.gauss(0, 1500)
+            )
+            teams.append(PatrolTeam(
+                team_id=f'{SEED_TEAM_PREFIX}{self.team_offset + n:05d}', station=station, team_leader=members[0],
+                members_count=len(members), vehicle_number=f'MH01-{n:04d}', is_active=self.rng.random() < 0.8,
+                current_latitude=latitude, current_longitude=longitude
+            ))
+            officers.extend(members)
+            memberships.append(members)
+        self.log(f'Creating {count} patrol teams with {len(officers)} officers')
+        self._bulk_create(User.objects, officers)
+        self._bulk_create(PatrolTeam.objects, teams)
+        self._bulk_create(PatrolTeam.members.through.objects, [
+            PatrolTeam.members.through(patrolteam_id=team.id, user_id=member.id)
+            for team, members in zip(teams, memberships) for member in members
+        ])
+        return teams, officers
+
+    def reports(self, count, citizens):
+        reports = []
+        type_weights = {name: weight for name, (weight, _) in REPORT_TYPES.items()}
+        for _ in range(count):
+            city = self.city()
+            latitude, longitude = self.point(city)
+            report_type = _pick(self.rng, type_weights)
+            title = self.rng.choice(REPORT_TYPES[report_type][1])
+            report = Report(
+                reported_by=self.rng.choice(citizens) if self.rng.random() < 0.8 else None,
+                title=title, description=f'{title} reported near {city.name}. Residents have raised this before.',
+                report_type=report_type, status=_pick(self.rng, REPORT_STATUSES),
+                latitude=latitude, longitude=longitude, location=f'{city.name}, {city.state}'
+            )
+            report.seed_created_at = self._past()
+            reports.append(report)
+        self.log(f'Creating {count} reports')
+        self._bulk_create(Report.objects, reports)
+        # auto_now_add/auto_now overwrite these on insert, so set them after
+        for report in reports:
+            report.created_at = report.seed_created_at
+            report.updated_at = min(self.now, report.created_at + timedelta(hours=self.rng.uniform(0, 96)))
+        self._bulk_update(Report.objects, reports, ['created_at', 'updated_at'])
+        return reports
+
+    def sos_alerts(self, count, citizens):
+        alerts = []
+        for _ in range(count):
+            city = self.city()
+            latitude, longitude = self.point(city)
+            active = self.rng.random() < ACTIVE_SOS_SHARE
+            emergency_type = _pick(self.rng, EMERGENCY_TYPES)
+            alert = SOSAlert(
+                user=self.rng.choice(citizens), latitude=latitude, longitude=longitude,
+                emergency_type=emergency_type, description=f'{emergency_type.replace("_", " ").title()} in {city.name}',
+                is_active=active
+            )
+            alert.seed_city = city
+            alert.seed_created_at = self.now - timedelta(minutes=self.rng.uniform(0, 60)) if active else self._past()
+            alerts.append(alert)
+        self.log(f'Creating {count} SOS alerts')
+        self._bulk_create(SOSAlert.objects, alerts)
+        for alert in alerts:
+            alert.created_at = alert.seed_created_at
+            if not alert.is_active:
+                alert.resolved_at = alert.created_at + timedelta(minutes=self.rng.uniform(5, 120))
+        self._bulk_update(SOSAlert.objects, alerts, ['created_at', 'resolved_at'])
+        return alerts
+
+    def location_updates(self, count, alerts):
+        """Random-walk trails, with active alerts getting the longer ones"""
+        if not alerts:
+            return []
+        weights = [5 if alert.is_active else 1 for alert in alerts]
+        per_alert = {}
+        for alert in self.rng.choices(alerts, weights=weights, k=count):
+            per_alert[alert.id] = per_alert.get(alert.id, 0) + 1
+
+        updates = []
+        for alert in alerts:
+            latitude, longitude = alert.latitude, alert.longitude
+            for n in range(per_alert.get(alert.id, 0)):
+                latitude, longitude = offset_point(latitude, longitude, self.rng.gauss(0, 20), self.rng.gauss(0, 20))
+                update = SOSLocationUpdate(
+                    sos_alert=alert, latitude=latitude, longitude=longitude, accuracy=self.rng.uniform(5, 50)
+                )
+                update.seed_timestamp = alert.created_at + timedelta(seconds=10 * (n + 1))
+                updates.append(update)
+        self.log(f'Creating {len(updates)} SOS location updates')
+        self._bulk_create(SOSLocationUpdate.objects, updates)
+        for update in updates:
+            update.timestamp = update.seed_timestamp
+        self._bulk_update(SOSLocationUpdate.objects, updates, ['timestamp'])
+        return updates
+
+    def volunteer_alerts(self, alerts, volunteers):
+        by_city = {}
+        for volunteer in volunteers:
+            by_city.setdefault(volunteer.seed_city.name, []).append(volunteer)
+
+        volunteer_alerts = []
+        for alert in alerts:
+            nearby = by_city.get(alert.seed_city.name, [])
+            for volunteer in self.rng.sample(nearby, min(len(nearby), self.rng.randint(0, 3))):
+                responded = self.rng.random() < 0.6
+                volunteer_alerts.append(VolunteerAlert(
+                    sos_alert=alert, volunteer=volunteer, responded=responded,
+                    response_time=alert.created_at + timedelta(minutes=self.rng.uniform(1, 15)) if responded else None,
+                    distance=distance_km(alert.latitude, alert.longitude,
+                                         volunteer.current_latitude, volunteer.current_longitude),
+                    status='responding' if responded else 'pending'
+                ))
+        self.log(f'Creating {len(volunteer_alerts)} volunteer alerts')
+        return self._bulk_create(VolunteerAlert.objects, volunteer_alerts)
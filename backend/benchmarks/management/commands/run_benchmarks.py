@@ -0,0 +1,109 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from benchmarks.city import PROFILES, CityGenerator
+from benchmarks.runner import (
+    DEFAULT_THRESHOLD, BenchContext, find_regressions, load_baseline, run_benchmarks, save_results
+)
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.upstreams import fake_upstreams
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the hot API endpoints through the test client (p50/p95/p99, queries, peak RSS) '
+        'and fail when they regress against the saved baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=PROFILES, default='small',
+                            help='Data volume seeded into the throwaway benchmark database')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for the data and the request mix')
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests before each scenario')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'),
+                            help='Baseline JSON to compare against')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Allowed slowdown as a fraction, e.g. 0.2 for 20%%')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+        parser.add_argument('--existing-db', action='store_true',
+                            help='Run against the configured database (seeded with seed_city --seed <same seed>) '
+                                 'instead of a throwaway one; the upload scenarios add rows to it')
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        generator = CityGenerator(PROFILES[options['profile']], seed=options['seed'])
+        meta = {'profile': None if options['existing_db'] else options['profile']}
+
+        # External services are served locally, so runs don't hit the network
+        with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=os.path.join(directory, 'media')), \
+                fake_upstreams():
+            if options['existing_db']:
+                results = self._run(generator, names, options, meta)
+            else:
+                old_config = self._setup_databases(directory)
+                try:
+                    self.stdout.write(f'Seeding the {options["profile"]} profile...')
+                    generator.generate()
+                    results = self._run(generator, names, options, meta)
+                finally:
+                    teardown_databases(old_config, verbosity=0)
+
+        if options['output']:
+            save_results(results, options['output'])
+        if options['save_baseline']:
+            save_results(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {options["baseline"]}'))
+            return
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(f'No baseline at {options["baseline"]}; run with --save-baseline to record one')
+            return
+
+        baseline = load_baseline(options['baseline'])
+        for key in ('profile', 'seed', 'iterations', 'database'):
+            if baseline['meta'].get(key) != results['meta'].get(key):
+                self.stdout.write(self.style.WARNING(
+                    f'Baseline was recorded with {key}={baseline["meta"].get(key)}, this run used {results["meta"].get(key)}'
+                ))
+        regressions = find_regressions(results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError(
+                f'{len(regressions)} regressions beyond {options["threshold"]:.0%}:\n  ' + '\n  '.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS(f'No regressions beyond {options["threshold"]:.0%} against the baseline'))
+
+    def _setup_databases(self, directory):
+        # On-disk test databases, so the numbers include real file I/O
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            if settings_dict['ENGINE'].endswith('sqlite3') and not settings_dict['TEST'].get('MIRROR'):
+                settings_dict['TEST']['NAME'] = os.path.join(directory, f'{alias}.sqlite3')
+        return setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+
+    def _run(self, generator, names, options, meta):
+        self.stdout.write(f'{"scenario":<24} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"rss MB":>8} {"errors":>7}')
+
+        def log(name, result):
+            self.stdout.write(
+                f'{name:<24} {result["p50_ms"]:>8.1f} {result["p95_ms"]:>8.1f} {result["p99_ms"]:>8.1f} '
+                f'{result["queries"]:>8.1f} {result["peak_rss_mb"] or 0:>8.0f} {result["errors"]:>7}'
+            )
+            if result.get('first_error'):
+                self.stdout.write(self.style.WARNING(f'  first error: {result["first_error"]}'))
+
+        return run_benchmarks(
+            BenchContext(generator), names, options['iterations'], options['warmup'], options['seed'], meta, log=log
+        )
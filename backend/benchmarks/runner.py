@@ -0,0 +1,237 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+
+import django
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from sos.models import SOSAlert
+from users.models import User
+
+from .city import SEED_EMAIL_DOMAIN
+from .scenarios import SCENARIOS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+RSS_SAMPLE_INTERVAL = 0.01  # seconds
+
+DEFAULT_THRESHOLD = 0.2
+# A metric only regresses when it is past the threshold *and* worse by
+# more than this, so sub-millisecond jitter on fast endpoints doesn't fail
+REGRESSION_SLACK = {
+    'p50_ms': 2,
+    'p95_ms': 3,
+    'p99_ms': 5,
+    'queries': 0.5,
+    'peak_rss_mb': 10,
+}
+
+
+def current_rss_mb():
+    """Resident set size of this process, or its peak where the current value isn't available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / MB if sys.platform == 'darwin' else peak / 1024
+
+
+class RssSampler:
+    """Polls the process RSS on a background thread and keeps the highest reading"""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bench-rss', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+            self.peak_mb = rss
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+class QueryCounter:
+    """execute_wrapper that counts queries on every database alias"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    @contextlib.contextmanager
+    def installed(self):
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+class BenchContext:
+    """What scenarios need from the seeded data"""
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.sos_ids = list(SOSAlert.objects.filter(is_active=True).order_by('id').values_list('id', flat=True)[:1000])
+        if not self.sos_ids:
+            self.sos_ids = list(SOSAlert.objects.order_by('id').values_list('id', flat=True)[:1000])
+        self._clients = {}
+
+    def point(self, rng):
+        return self.generator.point(rng=rng)
+
+    def sos_id(self, rng):
+        return rng.choice(self.sos_ids) if self.sos_ids else 0
+
+    def client(self, role=None):
+        """A test client sending a real JWT, so authentication is part of the timing"""
+        if role not in self._clients:
+            headers = {}
+            if role is not None:
+                user = (
+                    User.objects.filter(role=role, email__endswith=f'@{SEED_EMAIL_DOMAIN}').order_by('id').first()
+                    or User.objects.filter(role=role).order_by('id').first()
+                )
+                if user is None:
+                    raise ValueError(f'No {role} user to run as; seed the database first')
+                headers['Authorization'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+            self._clients[role] = Client(headers=headers)
+        return self._clients[role]
+
+
+def _percentiles(latencies):
+    if len(latencies) == 1:
+        return latencies * 3
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+def run_scenario(scenario, ctx, iterations, warmup, seed):
+    """Time ``iterations`` runs of a scenario after ``warmup`` untimed ones"""
+    rng = random.Random(f'{seed}:{scenario.name}')
+    client = ctx.client(scenario.role)
+    counter = QueryCounter()
+    latencies, queries = [], []
+    errors, first_error = 0, None
+
+    cache.clear()
+    # Some views print; keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            scenario.run(client, ctx, rng)
+
+        with RssSampler() as rss, counter.installed():
+            for _ in range(iterations):
+                counter.count = 0
+                started = time.perf_counter()
+                response = scenario.run(client, ctx, rng)
+                latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(counter.count)
+                if response.status_code >= 400:
+                    errors += 1
+                    first_error = first_error or f'{response.status_code}: {response.content[:200].decode(errors="replace")}'
+
+    p50, p95, p99 = _percentiles(latencies)
+    result = {
+        'iterations': iterations,
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'p50_ms': round(p50, 2),
+        'p95_ms': round(p95, 2),
+        'p99_ms': round(p99, 2),
+        'queries': round(statistics.fmean(queries), 1),
+        'max_queries': max(queries),
+        'peak_rss_mb': round(rss.peak_mb, 1) if rss.peak_mb is not None else None,
+        'rss_growth_mb': round(rss.peak_mb - rss.start_mb, 1) if rss.peak_mb is not None else None,
+        'errors': errors,
+    }
+    if first_error:
+        result['first_error'] = first_error
+    return result
+
+
+def run_benchmarks(ctx, names, iterations, warmup, seed, meta, log=None):
+    log = log or (lambda name, result: None)
+    results = {}
+    for name in names:
+        results[name] = run_scenario(SCENARIOS[name], ctx, iterations, warmup, seed)
+        log(name, results[name])
+    return {
+        'meta': {
+            **meta,
+            'seed': seed,
+            'iterations': iterations,
+            'warmup': warmup,
+            'database': connections['default'].vendor,
+            'databases': sorted(connections.settings),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+            'recorded_at': timezone.now().isoformat(),
+        },
+        'scenarios': results,
+    }
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+
+
+def find_regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Metrics worse than the baseline by more than ``threshold`` (a fraction)"""
+    regressions = []
+    for name, result in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        for metric, slack in REGRESSION_SLACK.items():
+            current, previous = result.get(metric), base.get(metric)
+            if current is None or previous is None:
+                continue
+            if current > previous * (1 + threshold) and current - previous > slack:
+                change = f'+{(current / previous - 1) * 100:.0f}%' if previous else 'new'
+                regressions.append(f'{name}: {metric} {previous} -> {current} ({change})')
+        if result['errors'] > base.get('errors', 0):
+            regressions.append(f'{name}: {result["errors"]} failed requests (baseline {base.get("errors", 0)})')
+    return regressions
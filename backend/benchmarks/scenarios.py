@@ -0,0 +1,105 @@
+import json
+from collections import namedtuple
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+Scenario = namedtuple('Scenario', 'name run role')
+
+# In the order they run: reads first, then the uploads that add rows
+SCENARIOS = {}
+
+# Search radius the map screens use, in meters (the police screens take km)
+RADIUS_M = 5000
+REPORT_IMAGE_SIZE = 32 * 1024
+VIDEO_CHUNK_SIZE = 512 * 1024
+
+
+def scenario(name, role=None):
+    """Register a benchmark scenario.
+
+    The function gets a test client (authenticated as a seeded user with
+    ``role`` when one is given), the run's BenchContext and a random.Random
+    seeded for this scenario, makes one or more requests and returns the
+    last response.
+    """
+    def register(func):
+        SCENARIOS[name] = Scenario(name, func, role)
+        return func
+    return register
+
+
+def _location(ctx, rng, radius=RADIUS_M):
+    latitude, longitude = ctx.point(rng)
+    return {'latitude': round(latitude, 6), 'longitude': round(longitude, 6), 'radius': radius}
+
+
+@scenario('nearby_facilities')
+def nearby_facilities(client, ctx, rng):
+    return client.post(reverse('nearby_facilities'), json.dumps(_location(ctx, rng)), content_type='application/json')
+
+
+@scenario('chloropleth_data')
+def chloropleth_data(client, ctx, rng):
+    return client.get(reverse('get_chloropleth_data'), _location(ctx, rng))
+
+
+@scenario('predict_safety_zones')
+def predict_safety_zones(client, ctx, rng):
+    return client.post(reverse('predict_safety_zones'), json.dumps(_location(ctx, rng)), content_type='application/json')
+
+
+@scenario('sos_by_role', role='police')
+def sos_by_role(client, ctx, rng):
+    return client.get(reverse('sos_by_role'), _location(ctx, rng))
+
+
+@scenario('all_reports_combined', role='police')
+def all_reports_combined(client, ctx, rng):
+    return client.get(reverse('all_reports_combined'), _location(ctx, rng, radius=RADIUS_M / 1000))
+
+
+@scenario('police_dashboard_stats', role='police')
+def police_dashboard_stats(client, ctx, rng):
+    return client.get(reverse('police_dashboard_stats'), _location(ctx, rng, radius=RADIUS_M / 1000))
+
+
+@scenario('create_report', role='citizen')
+def create_report(client, ctx, rng):
+    location = _location(ctx, rng)
+    return client.post(reverse('create_report'), {
+        'title': 'Broken streetlight',
+        'description': 'Streetlight out for a week, the lane is dark after 8pm.',
+        'report_type': 'infrastructure',
+        'latitude': location['latitude'],
+        'longitude': location['longitude'],
+        'media': SimpleUploadedFile('photo.jpg', rng.randbytes(REPORT_IMAGE_SIZE), content_type='image/jpeg'),
+    })
+
+
+@scenario('camera_feed_upload')
+def camera_feed_upload(client, ctx, rng):
+    return client.post(reverse('camera_feed'), {
+        'sos_id': ctx.sos_id(rng),
+        'chunk_number': rng.randint(1, 100),
+        'video': SimpleUploadedFile('chunk.webm', rng.randbytes(VIDEO_CHUNK_SIZE), content_type='video/webm'),
+    })
+
+
+@scenario('resumable_video_upload')
+def resumable_video_upload(client, ctx, rng):
+    """Start, one PATCH with the whole chunk, finalize"""
+    body = rng.randbytes(VIDEO_CHUNK_SIZE)
+    response = client.post(reverse('start_video_upload'), {
+        'sos_id': ctx.sos_id(rng), 'filename': 'chunk.webm', 'total_size': len(body),
+    })
+    if response.status_code >= 400:
+        return response
+    upload_id = response.json()['upload_id']
+    response = client.patch(
+        reverse('video_upload_detail', args=[upload_id]), body, content_type='application/offset+octet-stream',
+        headers={'Content-Range': f'bytes 0-{len(body) - 1}/{len(body)}'}
+    )
+    if response.status_code >= 400:
+        return response
+    return client.post(reverse('finalize_video_upload', args=[upload_id]))
@@ -0,0 +1,512 @@
+"""SOS surge load simulator.
+
+Replays a city-wide incident against a running server: SOS alerts arrive
+as a Poisson process whose rate ramps from --rate to --peak-rate over the
+run, and each one then fans out to volunteers, pings its location every
+--ping-interval seconds, uploads a video chunk every --video-interval
+seconds and is resolved after --sos-lifetime seconds. Police dashboards
+poll the alert lists alongside. Every --report-interval seconds it prints
+how create-to-ack latency, "database is locked" errors, throughput and
+saturation are moving, and flags the arrival rate at which the server
+stopped keeping up.
+
+Standalone: needs only ``requests``, not Django. Point it at a server
+whose database you don't mind filling, e.g.
+
+    python benchmarks/surge.py --base-url http://localhost:8000 --rate 1 --peak-rate 20 --duration 300
+
+It registers its own police and citizen accounts (surge-*@load.test).
+In-flight requests are what the server is working on; with
+--server-workers set to the number of gunicorn workers (x threads) that
+is shown as utilisation. A growing "backlog" or "late" column means the
+simulator itself is short of threads (--clients), not the server.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import math
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+LOCKED_MARKER = 'database is locked'
+KINDS = ('create', 'fanout', 'ping', 'video', 'resolve', 'poll')
+SAMPLE_INTERVAL = 0.1  # seconds between in-flight samples
+PING_STEP_M = 15
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def _offset(latitude, longitude, north_m, east_m):
+    return (
+        latitude + north_m / 111320,
+        longitude + east_m / (111320 * math.cos(math.radians(latitude))),
+    )
+
+
+class Window:
+    """Everything that happened during one report interval"""
+
+    def __init__(self, started):
+        self.started = started
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+        self.arrivals = 0
+        self.in_flight = []
+        self.backlog = []
+        self.lateness = []
+
+    def summary(self, elapsed, seconds, server_workers=None):
+        completed = sum(sum(counter.values()) for counter in self.outcomes.values())
+        create = self.latencies['create']
+        in_flight = statistics.fmean(self.in_flight) if self.in_flight else 0
+        summary = {
+            't': round(elapsed, 1),
+            'arrivals_per_s': round(self.arrivals / seconds, 2),
+            'requests_per_s': round(completed / seconds, 1),
+            'create_p50_ms': _round(_percentile(create, 50)),
+            'create_p95_ms': _round(_percentile(create, 95)),
+            'create_p99_ms': _round(_percentile(create, 99)),
+            'ping_p95_ms': _round(_percentile(self.latencies['ping'], 95)),
+            'poll_p95_ms': _round(_percentile(self.latencies['poll'], 95)),
+            'locked': sum(counter['locked'] for counter in self.outcomes.values()),
+            'errors': sum(counter['error'] + counter['timeout'] for counter in self.outcomes.values()),
+            'in_flight_avg': round(in_flight, 1),
+            'in_flight_max': max(self.in_flight, default=0),
+            'backlog_max': max(self.backlog, default=0),
+            'late_p95_ms': _round(_percentile(self.lateness, 95)),
+            'by_kind': {kind: dict(counter) for kind, counter in self.outcomes.items()},
+        }
+        if server_workers:
+            summary['utilisation'] = round(min(in_flight / server_workers, 1), 2)
+        return summary
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+class Stats:
+    """Thread-safe counters, rolled into a Window per report interval"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.window = Window(time.monotonic())
+        self.totals = defaultdict(Counter)
+        self.latencies = defaultdict(list)
+        self.in_flight = 0
+        self.backlog = 0
+
+    def record(self, kind, latency_ms, outcome):
+        with self._lock:
+            self.window.outcomes[kind][outcome] += 1
+            self.totals[kind][outcome] += 1
+            if outcome == 'ok':
+                self.window.latencies[kind].append(latency_ms)
+                self.latencies[kind].append(latency_ms)
+
+    def add(self, name, delta):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def arrival(self):
+        with self._lock:
+            self.window.arrivals += 1
+
+    def late(self, lateness_ms):
+        with self._lock:
+            self.window.lateness.append(lateness_ms)
+
+    def sample(self):
+        with self._lock:
+            self.window.in_flight.append(self.in_flight)
+            self.window.backlog.append(self.backlog)
+
+    def roll(self):
+        with self._lock:
+            window, self.window = self.window, Window(time.monotonic())
+        return window
+
+
+class Scheduler:
+    """Min-heap of (monotonic time, callable); ``next_due`` blocks until one is due"""
+
+    def __init__(self):
+        self._heap = []
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self.closed = False
+
+    def at(self, when, func, *args):
+        with self._cond:
+            if self.closed:
+                return
+            heapq.heappush(self._heap, (when, next(self._seq), func, args))
+            self._cond.notify()
+
+    def next_due(self):
+        with self._cond:
+            while not self.closed:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    when, _, func, args = heapq.heappop(self._heap)
+                    return when, func, args
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class SurgeSimulator:
+    def __init__(self, options):
+        self.options = options
+        self.base_url = options.base_url.rstrip('/')
+        self.rng = random.Random(options.seed)
+        self.rng_lock = threading.Lock()
+        self.stats = Stats()
+        self.scheduler = Scheduler()
+        self.pool = ThreadPoolExecutor(max_workers=options.clients, thread_name_prefix='surge')
+        self.local = threading.local()
+        self.citizen_tokens = []
+        self.police_tokens = []
+        self.active = {}
+        self.active_lock = threading.Lock()
+        self.windows = []
+        self.run_id = uuid.uuid4().hex[:8]
+
+    # -- HTTP --
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def request(self, kind, method, path, token=None, **kwargs):
+        """One request; returns the parsed JSON body on success, else None"""
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        self.stats.add('in_flight', 1)
+        started = time.perf_counter()
+        try:
+            response = self.session().request(
+                method, f'{self.base_url}{path}', headers=headers, timeout=self.options.timeout, **kwargs
+            )
+            latency = (time.perf_counter() - started) * 1000
+        except requests.Timeout:
+            self.stats.record(kind, None, 'timeout')
+            return None
+        except requests.RequestException:
+            self.stats.record(kind, None, 'error')
+            return None
+        finally:
+            self.stats.add('in_flight', -1)
+
+        if response.status_code < 400:
+            self.stats.record(kind, latency, 'ok')
+            try:
+                return response.json()
+            except ValueError:
+                return {}
+        self.stats.record(kind, latency, 'locked' if LOCKED_MARKER in response.text.lower() else 'error')
+        return None
+
+    def register(self, role, count):
+        tokens = []
+        for n in range(count):
+            body = self.request('setup', 'post', '/api/users/register/', json={
+                'email': f'surge-{self.run_id}-{role}-{n}@load.test', 'password': uuid.uuid4().hex, 'role': role,
+            })
+            if body and body.get('token'):
+                tokens.append(body['token'])
+        return tokens
+
+    # -- Scheduling --
+
+    def submit(self, when, func, *args):
+        """Hand a due event to a client thread"""
+        self.stats.add('backlog', 1)
+
+        def run():
+            self.stats.add('backlog', -1)
+            self.stats.late((time.monotonic() - when) * 1000)
+            try:
+                func(when, *args)
+            except Exception as e:
+                print(f'surge: {func.__name__} failed: {e}', file=sys.stderr)
+        self.pool.submit(run)
+
+    def draw(self, func, *args):
+        with self.rng_lock:
+            return getattr(self.rng, func)(*args)
+
+    def arrival_times(self, start):
+        """Poisson arrivals with the rate ramping linearly, by thinning"""
+        options = self.options
+        peak = max(options.rate, options.peak_rate)
+        t = 0
+        while peak > 0:
+            t += self.rng.expovariate(peak)
+            if t >= options.duration:
+                break
+            if self.rng.random() * peak <= options.rate + (options.peak_rate - options.rate) * t / options.duration:
+                yield start + t
+
+    def rate_at(self, elapsed):
+        options = self.options
+        return options.rate + (options.peak_rate - options.rate) * min(elapsed / options.duration, 1)
+
+    # -- The incident --
+
+    def create_sos(self, when):
+        self.stats.arrival()
+        options = self.options
+        north, east = self.draw('gauss', 0, options.spread_km * 1000), self.draw('gauss', 0, options.spread_km * 1000)
+        latitude, longitude = _offset(options.latitude, options.longitude, north, east)
+        token = self.draw('choice', self.citizen_tokens) if self.citizen_tokens else None
+        body = self.request('create', 'post', '/api/sos/emergency/', token=token, json={
+            'latitude': latitude, 'longitude': longitude, 'emergency_type': 'general_emergency',
+        })
+        if not body or 'sos_id' not in body:
+            return
+        sos = {'id': body['sos_id'], 'latitude': latitude, 'longitude': longitude, 'chunk': 0,
+               'ends_at': time.monotonic() + options.sos_lifetime}
+        with self.active_lock:
+            self.active[sos['id']] = sos
+
+        self.scheduler.at(time.monotonic(), self.fan_out, sos)
+        self.scheduler.at(time.monotonic() + self.draw('uniform', 0, options.ping_interval), self.ping, sos)
+        if options.video_interval:
+            self.scheduler.at(time.monotonic() + self.draw('uniform', 0, options.video_interval), self.upload_video, sos)
+        self.scheduler.at(sos['ends_at'], self.resolve, sos)
+
+    def fan_out(self, when, sos):
+        self.request('fanout', 'post', '/api/sos/alert-volunteers/', json={
+            'latitude': sos['latitude'], 'longitude': sos['longitude'], 'sos_alert_id': sos['id'], 'radius': 2000,
+        })
+
+    def ping(self, when, sos):
+        next_at = when + self.options.ping_interval
+        if next_at < sos['ends_at']:
+            self.scheduler.at(next_at, self.ping, sos)
+        sos['latitude'], sos['longitude'] = _offset(
+            sos['latitude'], sos['longitude'], self.draw('gauss', 0, PING_STEP_M), self.draw('gauss', 0, PING_STEP_M)
+        )
+        self.request('ping', 'post', '/api/sos/location-update/', json={
+            'sos_id': sos['id'], 'latitude': sos['latitude'], 'longitude': sos['longitude'], 'accuracy': 10,
+        })
+
+    def upload_video(self, when, sos):
+        next_at = when + self.options.video_interval
+        if next_at < sos['ends_at']:
+            self.scheduler.at(next_at, self.upload_video, sos)
+        sos['chunk'] += 1
+        chunk = self.draw('randbytes', self.options.video_kb * 1024)
+        self.request('video', 'post', '/api/sos/camera-feed/', data={
+            'sos_id': sos['id'], 'chunk_number': sos['chunk'],
+        }, files={'video': (f'chunk-{sos["chunk"]}.webm', chunk, 'video/webm')})
+
+    def resolve(self, when, sos):
+        with self.active_lock:
+            if self.active.pop(sos['id'], None) is None:
+                return
+        self.request('resolve', 'post', f'/api/sos/resolve/{sos["id"]}/')
+
+    def poll(self, when, token, n):
+        """Police dashboards alternate between the two alert lists"""
+        self.scheduler.at(when + self.options.poll_interval, self.poll, token, n + 1)
+        params = {'latitude': self.options.latitude, 'longitude': self.options.longitude}
+        if n % 2:
+            self.request('poll', 'get', '/api/sos/by-role/', token=token, params={**params, 'radius': 10000})
+        else:
+            self.request('poll', 'get', '/api/police/sos-alerts/', token=token, params={**params, 'radius': 10})
+
+    # -- Running --
+
+    def dispatch(self):
+        while True:
+            event = self.scheduler.next_due()
+            if event is None:
+                return
+            when, func, args = event
+            self.submit(when, func, *args)
+
+    def report(self, start, stop):
+        header = (
+            f'{"t s":>6} {"arr/s":>6} {"target":>6} {"active":>6} {"req/s":>6} {"create p50/p95/p99 ms":>22} '
+            f'{"ping p95":>8} {"poll p95":>8} {"locked":>6} {"errors":>6} {"in-flight":>10} {"backlog":>7} {"late p95":>8}'
+        )
+        if self.options.server_workers:
+            header += f' {"util":>5}'
+        print(header)
+        next_roll = start + self.options.report_interval
+        while not stop.is_set():
+            stop.wait(SAMPLE_INTERVAL)
+            self.stats.sample()
+            now = time.monotonic()
+            if now >= next_roll or stop.is_set():
+                self.roll(start, now)
+                next_roll = now + self.options.report_interval
+
+    def roll(self, start, now):
+        window = self.stats.roll()
+        summary = window.summary(now - start, max(now - window.started, 1e-6), self.options.server_workers)
+        summary['target_rate'] = round(self.rate_at(now - start), 2)
+        summary['active_sos'] = len(self.active)
+        self.windows.append(summary)
+
+        create = '/'.join(_format(summary[f'create_p{p}_ms']) for p in (50, 95, 99))
+        line = (
+            f'{summary["t"]:>6.0f} {summary["arrivals_per_s"]:>6.1f} {summary["target_rate"]:>6.1f} '
+            f'{summary["active_sos"]:>6} {summary["requests_per_s"]:>6.0f} {create:>22} '
+            f'{_format(summary["ping_p95_ms"]):>8} {_format(summary["poll_p95_ms"]):>8} {summary["locked"]:>6} '
+            f'{summary["errors"]:>6} {summary["in_flight_avg"]:>5.1f}/{summary["in_flight_max"]:<4} '
+            f'{summary["backlog_max"]:>7} {_format(summary["late_p95_ms"]):>8}'
+        )
+        if 'utilisation' in summary:
+            line += f' {summary["utilisation"]:>5.0%}'
+        print(line, flush=True)
+
+    def capacity_limit(self):
+        """First window where acks got slower than the SLO or the database started refusing writes"""
+        for window in self.windows:
+            slow = window['create_p95_ms'] is not None and window['create_p95_ms'] > self.options.ack_slo_ms
+            if slow or window['locked']:
+                reason = f'create p95 {window["create_p95_ms"]} ms' if slow else f'{window["locked"]} locked errors'
+                return {'t': window['t'], 'target_rate': window['target_rate'], 'reason': reason}
+        return None
+
+    def summary(self):
+        kinds = {}
+        for kind in KINDS:
+            outcomes = self.stats.totals.get(kind)
+            if not outcomes:
+                continue
+            latencies = self.stats.latencies[kind]
+            kinds[kind] = {
+                **dict(outcomes),
+                'p50_ms': _round(_percentile(latencies, 50)),
+                'p95_ms': _round(_percentile(latencies, 95)),
+                'p99_ms': _round(_percentile(latencies, 99)),
+            }
+        return {
+            'kinds': kinds,
+            'peak_requests_per_s': max((window['requests_per_s'] for window in self.windows), default=0),
+            'capacity_limit': self.capacity_limit(),
+        }
+
+    def run(self):
+        options = self.options
+        self.citizen_tokens = self.register('citizen', options.citizens)
+        self.police_tokens = self.register('police', options.pollers)
+        if options.pollers and not self.police_tokens:
+            sys.exit(f'surge: could not register police accounts at {self.base_url}/api/users/register/')
+        print(f'Registered {len(self.citizen_tokens)} citizens and {len(self.police_tokens)} police pollers')
+
+        self.stats.roll()  # leave the registrations out
+        start = time.monotonic()
+        for when in self.arrival_times(start):
+            self.scheduler.at(when, self.create_sos)
+        for n, token in enumerate(self.police_tokens):
+            self.scheduler.at(start + self.rng.uniform(0, options.poll_interval), self.poll, token, n)
+
+        stop = threading.Event()
+        dispatcher = threading.Thread(target=self.dispatch, name='surge-dispatch', daemon=True)
+        reporter = threading.Thread(target=self.report, args=(start, stop), name='surge-report', daemon=True)
+        dispatcher.start()
+        reporter.start()
+        try:
+            time.sleep(options.duration)
+        except KeyboardInterrupt:
+            print('Interrupted, waiting for in-flight requests')
+        self.scheduler.close()
+        if self.active:
+            # Don't leave the server with alerts nobody will resolve
+            print(f'Resolving {len(self.active)} alerts still open')
+            for sos in list(self.active.values()):
+                self.submit(time.monotonic(), self.resolve, sos)
+        self.pool.shutdown(wait=True)
+        stop.set()
+        reporter.join()
+
+        summary = self.summary()
+        print()
+        print(f'{"kind":<8} {"ok":>7} {"locked":>7} {"errors":>7} {"timeouts":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+        for kind, result in summary['kinds'].items():
+            print(
+                f'{kind:<8} {result.get("ok", 0):>7} {result.get("locked", 0):>7} {result.get("error", 0):>7} '
+                f'{result.get("timeout", 0):>8} {_format(result["p50_ms"]):>8} {_format(result["p95_ms"]):>8} '
+                f'{_format(result["p99_ms"]):>8}'
+            )
+        print(f'Peak throughput {summary["peak_requests_per_s"]} requests/s')
+        limit = summary['capacity_limit']
+        if limit:
+            print(f'Capacity limit at about {limit["target_rate"]} SOS/s ({limit["t"]:.0f}s in): {limit["reason"]}')
+        else:
+            print(f'Kept up with {options.peak_rate} SOS/s (create p95 under {options.ack_slo_ms} ms, no locked errors)')
+
+        if options.output:
+            with open(options.output, 'w') as f:
+                json.dump({'options': vars(options), 'windows': self.windows, 'summary': summary}, f, indent=2)
+                f.write('\n')
+        return summary
+
+
+def _format(value):
+    return '-' if value is None else f'{value:.0f}'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate a city-wide SOS surge against a running server')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--rate', type=float, default=1, help='SOS alerts per second at the start')
+    parser.add_argument('--peak-rate', type=float, help='SOS alerts per second at the end (default: --rate)')
+    parser.add_argument('--duration', type=float, default=120, help='Seconds of new arrivals')
+    parser.add_argument('--sos-lifetime', type=float, default=60, help='Seconds before an alert is resolved')
+    parser.add_argument('--ping-interval', type=float, default=3, help='Seconds between location pings')
+    parser.add_argument('--video-interval', type=float, default=10, help='Seconds between video chunks (0 disables)')
+    parser.add_argument('--video-kb', type=int, default=256, help='Size of each video chunk')
+    parser.add_argument('--pollers', type=int, default=10, help='Police dashboards polling the alert lists')
+    parser.add_argument('--poll-interval', type=float, default=5, help='Seconds between polls per dashboard')
+    parser.add_argument('--citizens', type=int, default=20, help='Citizen accounts the alerts are raised from')
+    parser.add_argument('--center', default='19.0760,72.8777', help='Incident center as lat,lng')
+    parser.add_argument('--spread-km', type=float, default=5, help='Standard deviation of alert locations')
+    parser.add_argument('--clients', type=int, default=200, help='Simulator threads, i.e. max concurrent requests')
+    parser.add_argument('--server-workers', type=int, help='Server worker count, to show in-flight requests as utilisation')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--ack-slo-ms', type=float, default=2000, help='create p95 above this marks the capacity limit')
+    parser.add_argument('--report-interval', type=float, default=5, help='Seconds per report line')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the per-interval results to this JSON file')
+    options = parser.parse_args(argv)
+    if options.peak_rate is None:
+        options.peak_rate = options.rate
+    try:
+        options.latitude, options.longitude = (float(part) for part in options.center.split(','))
+    except ValueError:
+        parser.error('--center must look like 19.0760,72.8777')
+    if options.duration <= 0:
+        parser.error('--duration must be positive')
+    return options
+
+
+def main(argv=None):
+    SurgeSimulator(parse_args(argv)).run()
+
+
+if __name__ == '__main__':
+    main()
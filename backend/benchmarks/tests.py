@@ -0,0 +1,131 @@
+import contextlib
+import io
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from core import outbound
+from safety.views import fetch_overpass_data
+from .runner import find_regressions
+from .surge import Scheduler, SurgeSimulator, Window, parse_args
+from .upstreams import FAKE_FACILITIES, fake_upstreams, overpass_answer
+
+
+class FakeUpstreamTests(TestCase):
+    def test_answer_is_around_the_query_point_and_repeatable(self):
+        query = '[out:json];(node["amenity"="hospital"](around:2000,19.076,72.8777););out center meta;'
+        answer = overpass_answer(query)
+        self.assertEqual(len(answer['elements']), FAKE_FACILITIES)
+        for element in answer['elements']:
+            self.assertAlmostEqual(element['lat'], 19.076, delta=0.01)
+            self.assertEqual(element['tags']['amenity'], 'hospital')
+        self.assertEqual(overpass_answer(query), answer)
+
+    def test_overpass_is_served_locally_inside_the_block(self):
+        live = outbound.upstream('overpass')
+        with fake_upstreams():
+            self.assertTrue(outbound.upstream('overpass').urls[0].startswith('http://127.0.0.1:'))
+            payload = outbound.client.post_json('overpass', data={'data': '(around:1000,12.97,77.59);"amenity"="police"'})
+            self.assertEqual(len(payload['elements']), FAKE_FACILITIES)
+        self.assertIs(outbound.upstream('overpass'), live)
+
+    def test_views_get_facilities_from_the_fake(self):
+        with fake_upstreams():
+            data = fetch_overpass_data(19.076, 72.8777, 3000)
+        self.assertEqual(len(data['hospitals']), FAKE_FACILITIES)
+        self.assertEqual(len(data['police_stations']), FAKE_FACILITIES)
+
+
+class RegressionTests(SimpleTestCase):
+    baseline = {'scenarios': {
+        'search': {'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'queries': 2, 'peak_rss_mb': 100.0, 'errors': 0},
+        'fast': {'p50_ms': 1.0, 'p95_ms': 2.0, 'p99_ms': 3.0, 'queries': 1, 'peak_rss_mb': 100.0, 'errors': 0},
+    }}
+
+    def results(self, **changes):
+        scenarios = {name: dict(metrics) for name, metrics in self.baseline['scenarios'].items()}
+        for key, value in changes.items():
+            name, metric = key.split('__')
+            scenarios[name][metric] = value
+        return {'scenarios': scenarios}
+
+    def test_unchanged_run_passes(self):
+        self.assertEqual(find_regressions(self.results(), self.baseline), [])
+
+    def test_slower_past_threshold_and_slack_regresses(self):
+        self.assertEqual(
+            find_regressions(self.results(search__p95_ms=30.0), self.baseline),
+            ['search: p95_ms 20.0 -> 30.0 (+50%)']
+        )
+
+    def test_change_within_threshold_or_slack_passes(self):
+        # +10% is under the 20% threshold
+        self.assertEqual(find_regressions(self.results(search__p50_ms=11.0), self.baseline), [])
+        # +100% on a 1 ms endpoint is jitter inside the 2 ms slack
+        self.assertEqual(find_regressions(self.results(fast__p50_ms=2.0), self.baseline), [])
+
+    def test_new_errors_and_scenarios(self):
+        results = self.results(search__errors=3)
+        results['scenarios']['new'] = {'p50_ms': 500.0, 'errors': 0}
+        self.assertEqual(find_regressions(results, self.baseline), ['search: 3 failed requests (baseline 0)'])
+
+
+class SurgeSimulatorTests(SimpleTestCase):
+    def simulator(self, *argv):
+        simulator = SurgeSimulator(parse_args(['--pollers', '0', '--clients', '2', *argv]))
+        self.addCleanup(simulator.pool.shutdown)
+        return simulator
+
+    def test_arguments(self):
+        options = parse_args(['--rate', '3', '--center', '12.97,77.59'])
+        self.assertEqual((options.peak_rate, options.latitude, options.longitude), (3, 12.97, 77.59))
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            parse_args(['--center', 'mumbai'])
+
+    def test_arrivals_follow_the_ramp(self):
+        simulator = self.simulator('--rate', '0', '--peak-rate', '20', '--duration', '100')
+        arrivals = list(simulator.arrival_times(0))
+        self.assertEqual(arrivals, sorted(arrivals))
+        self.assertLess(arrivals[-1], 100)
+        # Integral of the ramp: 1000 in total, a quarter of them in the first half
+        self.assertAlmostEqual(len(arrivals), 1000, delta=100)
+        first_half = sum(1 for t in arrivals if t < 50)
+        self.assertAlmostEqual(first_half / len(arrivals), 0.25, delta=0.05)
+
+    def test_scheduler_releases_events_in_time_order(self):
+        scheduler = Scheduler()
+        now = time.monotonic()
+        scheduler.at(now + 0.05, 'later')
+        scheduler.at(now, 'sooner')
+        self.assertEqual(scheduler.next_due()[1], 'sooner')
+        self.assertEqual(scheduler.next_due()[1], 'later')
+        self.assertGreaterEqual(time.monotonic(), now + 0.05)
+        scheduler.close()
+        self.assertIsNone(scheduler.next_due())
+
+    def test_locked_responses_are_counted_apart_from_errors(self):
+        simulator = self.simulator()
+        answers = [
+            mock.Mock(status_code=201, json=lambda: {'sos_id': 1}),
+            mock.Mock(status_code=500, text='OperationalError: database is locked'),
+            mock.Mock(status_code=400, text='{"error": "bad"}'),
+        ]
+        with mock.patch.object(simulator, 'session', return_value=mock.Mock(request=mock.Mock(side_effect=answers))):
+            self.assertEqual(simulator.request('create', 'post', '/'), {'sos_id': 1})
+            self.assertIsNone(simulator.request('create', 'post', '/'))
+            self.assertIsNone(simulator.request('create', 'post', '/'))
+        self.assertEqual(dict(simulator.stats.totals['create']), {'ok': 1, 'locked': 1, 'error': 1})
+        self.assertEqual(simulator.stats.in_flight, 0)
+
+    def test_capacity_limit_is_the_first_window_over_the_slo(self):
+        simulator = self.simulator('--ack-slo-ms', '500')
+        for t, p95, locked in ((5, 100, 0), (10, 800, 0), (15, 900, 3)):
+            window = Window(0)
+            window.latencies['create'] = [p95]
+            window.outcomes['create']['locked'] = locked
+            summary = window.summary(t, 5, server_workers=4)
+            summary['target_rate'] = t / 5
+            simulator.windows.append(summary)
+        self.assertEqual(simulator.capacity_limit(), {'t': 10, 'target_rate': 2.0, 'reason': 'create p95 800 ms'})
+        self.assertEqual(simulator.windows[0]['utilisation'], 0)
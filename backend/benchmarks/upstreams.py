@@ -0,0 +1,76 @@
+import contextlib
+import json
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from core import outbound
+
+AROUND_RE = re.compile(r'around:([\d.]+),(-?[\d.]+),(-?[\d.]+)')
+# Facilities the fake Overpass answers with, per amenity
+FAKE_FACILITIES = 8
+
+
+def overpass_answer(query):
+    """A fixed set of hospitals and police stations around the query's point.
+
+    The same point always gets the same facilities, so repeated runs write
+    the same rows.
+    """
+    match = AROUND_RE.search(query)
+    if match is None:
+        return {'elements': []}
+    radius, latitude, longitude = (float(part) for part in match.groups())
+    amenities = [amenity for amenity in ('hospital', 'police') if f'"amenity"="{amenity}"' in query]
+    rng = random.Random(f'{latitude:.4f},{longitude:.4f}')
+    spread = radius / 111_000 / 2
+    elements = []
+    for amenity in amenities:
+        for n in range(FAKE_FACILITIES):
+            elements.append({
+                'type': 'node',
+                'id': len(elements) + 1,
+                'lat': round(latitude + rng.uniform(-spread, spread), 6),
+                'lon': round(longitude + rng.uniform(-spread, spread), 6),
+                'tags': {'amenity': amenity, 'name': f'Bench {amenity} {n + 1}'},
+            })
+    return {'elements': elements}
+
+
+class _OverpassHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+        query = parse_qs(body).get('data', [''])[0]
+        payload = json.dumps(overpass_answer(query)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def fake_upstreams():
+    """Serve the 'overpass' upstream from a local HTTP server for the block.
+
+    Calls still go through the shared outbound client (pool, breakers,
+    budget), so its overhead stays in the numbers, but nothing leaves the
+    machine and upstream latency doesn't add noise.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _OverpassHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), name='bench-overpass', daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        with outbound.replaced('overpass', [f'http://{host}:{port}/api/interpreter'], timeout=(1, 5)):
+            yield
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cityshield_backend.settings')
 
 application = get_asgi_application()
+
+from .startup import on_server_start  # noqa: E402
+
+on_server_start()
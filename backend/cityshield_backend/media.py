@@ -0,0 +1,137 @@
+import logging
+import mimetypes
+import os
+import posixpath
+import time
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_SALT = 'cityshield.media'
+
+# Report types whose attachments are only visible to the reporter and police
+DEFAULT_PRIVATE_REPORT_MEDIA_TYPES = ['harassment']
+
+
+def _url_max_age():
+    return getattr(settings, 'MEDIA_URL_MAX_AGE', 300)
+
+
+def _signature(name, expires):
+    return salted_hmac(SIGNATURE_SALT, f'{name}:{expires}').hexdigest()
+
+
+def signed_media_url(name, request=None):
+    """Short-lived URL for a file under MEDIA_ROOT, valid without a DB lookup.
+
+    Expiry is rounded up to a MEDIA_URL_MAX_AGE boundary so repeated calls
+    hand out the same URL for a while and browsers can cache the bytes.
+    """
+    if not name:
+        return None
+    max_age = _url_max_age()
+    expires = (int(time.time()) // max_age + 2) * max_age
+    url = reverse('protected_media', args=[name]) + '?' + urlencode({
+        'expires': expires,
+        'sig': _signature(name, expires)
+    })
+    return request.build_absolute_uri(url) if request else url
+
+
+def verify_signature(name, expires, signature):
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    return constant_time_compare(_signature(name, expires), signature or '')
+
+
+def report_media_visible(user, report):
+    """Public rule for report attachments: owner, police/admin, or a non-private report type"""
+    if user is not None and user.is_authenticated:
+        if user.role in ['police', 'admin'] or report.reported_by_id == user.id:
+            return True
+    private_types = getattr(settings, 'PRIVATE_REPORT_MEDIA_TYPES', DEFAULT_PRIVATE_REPORT_MEDIA_TYPES)
+    return report.report_type not in private_types
+
+
+def can_access_media(user, name):
+    """Authorization for callers without a signed URL"""
+    if name.startswith('sos_videos/'):
+        return user is not None and user.is_authenticated and user.role in ['police', 'admin']
+
+    if name.startswith('report_media/'):
+        from reports.models import Report
+
+        reports = Report.objects.filter(media__file=name).only('id', 'report_type', 'reported_by_id')
+        return any(report_media_visible(user, report) for report in reports)
+
+    return False
+
+
+def serve_media(request, name):
+    """Hand a file to the front web server, or stream it when not configured.
+
+    With MEDIA_ACCEL = 'nginx' the response carries X-Accel-Redirect to the
+    internal MEDIA_ACCEL_PREFIX location; with 'apache' it carries
+    X-Sendfile. Either way the file bytes never pass through the worker.
+    Without it (development) the file is streamed with Range support.
+    """
+    from sos.streaming import ranged_file_response
+
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid media path')
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    accel = getattr(settings, 'MEDIA_ACCEL', None)
+
+    if accel == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/') + quote(name)
+    elif accel == 'apache':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        if not os.path.isfile(path):
+            raise Http404('Media not found')
+        response = ranged_file_response(request, path, content_type)
+
+    response['Cache-Control'] = f'private, max-age={_url_max_age()}'
+    return response
+
+
+def protected_media(request, name):
+    """Serve MEDIA_ROOT files to signed URLs or authorized users"""
+    name = posixpath.normpath(name).lstrip('/')
+    if name.startswith('..'):
+        raise Http404('Invalid media path')
+
+    if 'sig' in request.GET:
+        if not verify_signature(name, request.GET.get('expires'), request.GET.get('sig')):
+            return HttpResponseForbidden('Invalid or expired media link')
+        return serve_media(request, name)
+
+    user = None
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+        if authenticated:
+            user = authenticated[0]
+    except AuthenticationFailed as e:
+        logger.warning(f"Rejected media token for {name}: {str(e)}")
+
+    if not can_access_media(user, name):
+        return HttpResponseForbidden('Access denied')
+    return serve_media(request, name)
@@ -1,7 +1,9 @@
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 load_dotenv()
 
@@ -18,8 +20,18 @@ ALLOWED_HOSTS = ['*']
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
+# Multipart uploads above this spill to a temp file instead of worker RAM;
+# large videos should use the resumable video-uploads/ endpoints
+FILE_UPLOAD_MAX_MEMORY_SIZE = 262144  # 256KB
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB, excludes file uploads
+
+# Media is handed out as short-lived signed /api/media/ URLs. In production
+# set MEDIA_ACCEL to 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile) so
+# the web server sends the bytes, and expose MEDIA_ROOT only through the
+# internal MEDIA_ACCEL_PREFIX location.
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_URL_MAX_AGE = 300  # seconds
 
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
@@ -29,6 +41,11 @@ CORS_ALLOWED_ORIGINS = [
     "https://cityshield.onrender.com"
 ]
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (
+    *default_headers,
+    'idempotency-key',
+    'content-range',
+)
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(seconds=int(os.getenv('JWT_ACCESS_TOKEN_LIFETIME', 3600))),
@@ -65,9 +82,14 @@ INSTALLED_APPS = [
     'sos',
     'safety',
     'police',
+    'core',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiler.ProfilerMiddleware',
+    'core.outbound.OutboundBudgetMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -76,6 +98,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.routing.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'cityshield_backend.urls'
@@ -99,12 +122,144 @@ TEMPLATES = [
 WSGI_APPLICATION = 'cityshield_backend.wsgi.application'
 
 
+# Connections are kept open between requests (and pinged before reuse).
+# On SQLite, core/db.py switches to WAL with a busy timeout on connect, and
+# IMMEDIATE transactions take the write lock up front instead of failing
+# when a read lock can't be upgraded.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Optional read replica for the heavy map/dashboard reads (core/routing.py).
+# DB_REPLICA=sqlite keeps a second SQLite file, refreshed with
+# `manage.py sync_replica --interval 5`; DB_REPLICA=postgresql points at a
+# PostgreSQL stand-in or standby (DB_REPLICA_NAME/HOST/PORT/USER/PASSWORD).
+DB_REPLICA = os.getenv('DB_REPLICA', '')
+if DB_REPLICA == 'sqlite':
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', str(BASE_DIR / 'db-replica.sqlite3')),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif DB_REPLICA == 'postgresql':
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_REPLICA_NAME', 'cityshield'),
+        'HOST': os.getenv('DB_REPLICA_HOST', 'localhost'),
+        'PORT': os.getenv('DB_REPLICA_PORT', '5432'),
+        'USER': os.getenv('DB_REPLICA_USER', ''),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', ''),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_MAX_LAG = 30  # seconds
+
+# Region shards for incident data (core/sharding.py), off unless
+# STATE_SHARDS is set, e.g. as JSON in the environment:
+#   {"shard_west": {"shard_id": 1, "states": ["Maharashtra", "Gujarat", "Goa"],
+#                   "bboxes": [[15.6, 72.6, 22.1, 80.9], [20.1, 68.1, 24.7, 74.5], [14.9, 73.6, 15.8, 74.4]]}}
+# shard_id fixes the shard's primary key range and must never change.
+# bboxes (min_lat, min_lng, max_lat, max_lng) place points the offline
+# geocoder can't and pick the shards an area query reads; without them
+# the shard's states must all have places in the geocoder datasets, or
+# startup fails. Rows in states no shard lists stay in the default
+# database. Each shard is a SQLite file in DB_SHARD_DIR unless DATABASES
+# already defines it; create it with `manage.py migrate --database <alias>`.
+STATE_SHARDS = json.loads(os.getenv('STATE_SHARDS', '{}'))
+SHARDED_MODELS = ['reports.Report', 'sos.SOSLocationUpdate']
+DB_SHARD_DIR = Path(os.getenv('DB_SHARD_DIR', BASE_DIR))
+for alias in STATE_SHARDS:
+    DATABASES.setdefault(alias, {
+        **DATABASES['default'],
+        'NAME': DB_SHARD_DIR / f'{alias}.sqlite3',
+        # Users and alerts referenced by shard rows live in the default database
+        'PRAGMAS': {'foreign_keys': 'OFF'},
+    })
+
+DATABASE_ROUTERS = ['core.sharding.ShardRouter', 'core.routing.ReplicaRouter']
+
+# High-frequency writes (location pings, video view tracking) go through
+# one writer thread per process (core/db.py)
+WRITE_LANE = True
+
+# Response cache for public read endpoints (core/response_cache.py).
+# Local memory is per process, so invalidations only reach the worker that
+# made the change; with several workers set CACHE_BACKEND to 'redis' or
+# 'memcached' (CACHE_LOCATION is the server URL) or 'file' (a directory
+# shared by the workers on one host).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / '.cache') if CACHE_BACKEND == 'file' else ''),
     }
 }
+RESPONSE_CACHE_TIMEOUT = 300  # seconds
+
+# Per-view timing, query, outbound HTTP and response size metrics
+# (core/metrics.py), scraped as Prometheus text from /api/metrics. With
+# several gunicorn workers set METRICS_DIR to a directory they share, and
+# empty it on deploy, so each scrape adds up every worker. If METRICS_TOKEN
+# is set the scraper must send it as a Bearer token.
+METRICS_ENABLED = True
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# Requests slower than this go to the slow request log with their top SQL;
+# without SLOW_REQUEST_LOG (a file path) they go to stderr
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', '1000'))
+SLOW_REQUEST_LOG = os.getenv('SLOW_REQUEST_LOG')
+# Admins can POST /api/profile to sample the Python stacks of live requests
+# in the worker that takes the call (core/profiler.py); the collapsed
+# output is written here for GET /api/profile/<id>. Share it between
+# workers like METRICS_DIR. Nothing runs until a profile is armed.
+PROFILER_DIR = os.getenv('PROFILER_DIR')
+
+# Outbound HTTP (core/outbound.py) shares one keep-alive pool per worker.
+# A request may spend at most OUTBOUND_REQUEST_BUDGET seconds waiting on
+# upstreams; each endpoint has a circuit breaker, and when one is open the
+# last good answer (or nothing) is served at once. OUTBOUND_UPSTREAMS
+# overrides an upstream's options, e.g. {'overpass': {'hedge_after': 1}}.
+OUTBOUND_REQUEST_BUDGET = float(os.getenv('OUTBOUND_REQUEST_BUDGET', '15'))
+OUTBOUND_POOL_SIZE = 10
+OUTBOUND_UPSTREAMS = {}
+# Comma-separated Overpass API mirrors, hedged against overpass-api.de
+OVERPASS_MIRRORS = [url.strip() for url in os.getenv('OVERPASS_MIRRORS', '').split(',') if url.strip()]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': SLOW_REQUEST_LOG,
+            'delay': True,
+        } if SLOW_REQUEST_LOG else {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.metrics.slow': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
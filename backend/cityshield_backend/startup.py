@@ -0,0 +1,28 @@
+import logging
+
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+
+def on_server_start():
+    """Warm in-memory indexes when a server process starts.
+
+    Called from wsgi.py/asgi.py rather than AppConfig.ready() so management
+    commands (migrate, shell, ...) don't touch the database on import.
+    """
+    from core.sharding import region_map, sharding_active
+    from police.dispatch import team_index
+    from reports.offline_geocoder import offline_geocoder
+    from sos.volunteer_index import volunteer_index
+
+    for index in (volunteer_index, team_index):
+        try:
+            index.warm()
+        except DatabaseError as e:
+            logger.warning(f"Skipping {type(index).__name__} warm-up: {e}")
+
+    offline_geocoder.load()
+    if sharding_active():
+        # Raises ImproperlyConfigured for shards with no known extent
+        region_map.bboxes()
@@ -3,6 +3,9 @@ from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import metrics, profile_result, start_profile
+
+from .media import protected_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -13,6 +16,10 @@ urlpatterns = [
     path('api/police/', include('police.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/media/<path:name>', protected_media, name='protected_media'),
+    path('api/metrics', metrics, name='metrics'),
+    path('api/profile', start_profile, name='start_profile'),
+    path('api/profile/<str:profile_id>', profile_result, name='profile_result'),
 ]
 
 if settings.DEBUG:
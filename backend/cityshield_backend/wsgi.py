@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cityshield_backend.settings')
 
 application = get_wsgi_application()
+
+from .startup import on_server_start  # noqa: E402
+
+on_server_start()
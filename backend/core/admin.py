@@ -0,0 +1,20 @@
+from django.contrib import admin
+from .models import IdempotencyRecord, Job, ReplicaHeartbeat
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(admin.ModelAdmin):
+    list_display = ['scope', 'key', 'status_code', 'created_at', 'expires_at']
+    list_filter = ['scope', 'status_code']
+    search_fields = ['key']
+    ordering = ['-created_at']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task_name', 'queue', 'priority', 'status', 'attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'queue', 'task_name']
+    search_fields = ['task_name', 'last_error']
+    ordering = ['-created_at']
+
+@admin.register(ReplicaHeartbeat)
+class ReplicaHeartbeatAdmin(admin.ModelAdmin):
+    list_display = ['id', 'written_at']
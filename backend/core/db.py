@@ -0,0 +1,177 @@
+import atexit
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Applied to every new SQLite connection. WAL lets readers run alongside
+# the one writer, NORMAL only fsyncs at checkpoints (safe in WAL mode) and
+# busy_timeout makes a writer wait for the lock instead of failing with
+# "database is locked". Override keys with SQLITE_PRAGMAS, then per
+# database with a 'PRAGMAS' entry in its DATABASES dict; None skips one.
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,  # ms
+    'cache_size': -65536,  # KiB, so 64 MB
+    'mmap_size': 268435456,  # 256 MB
+    'temp_store': 'MEMORY',
+}
+
+DEFAULT_WRITE_LANE_BATCH = 200
+DEFAULT_WRITE_LANE_QUEUE = 10000
+
+
+def sqlite_pragmas(settings_dict):
+    return {**DEFAULT_SQLITE_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {}), **settings_dict.get('PRAGMAS', {})}
+
+
+def apply_sqlite_pragmas(connection):
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas(connection.settings_dict).items():
+            if value is not None:
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply the SQLite pragmas when Django opens a connection"""
+    if connection.vendor == 'sqlite':
+        apply_sqlite_pragmas(connection)
+
+
+@receiver(post_migrate)
+def reconfigure_sqlite(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Migrations switch foreign_keys back on; put the pragmas back for the rest of the process"""
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and connection.connection is not None:
+        apply_sqlite_pragmas(connection)
+
+
+class WriteLane:
+    """One thread that runs small, frequent writes for the whole process.
+
+    SQLite allows a single writer at a time, so location pings and view
+    tracking coming from many request threads would otherwise queue up on
+    the database lock (and fail once busy_timeout runs out). Here they
+    queue in memory instead: the lane thread drains up to WRITE_LANE_BATCH
+    of them and runs them in one transaction, each in its own savepoint so
+    one failing write doesn't undo the others. Callers of ``run`` block
+    until their write is committed and get its return value (or
+    exception); ``submit`` returns the Future without waiting.
+
+    Writes made inside a caller's transaction run inline, since the lane's
+    connection couldn't see that transaction's rows. Set WRITE_LANE to
+    False to run everything inline.
+    """
+
+    def __init__(self, using='default', max_batch=None, max_queue=None):
+        self.using = using
+        self.max_batch = max_batch or getattr(settings, 'WRITE_LANE_BATCH', DEFAULT_WRITE_LANE_BATCH)
+        self._queue = queue.Queue(maxsize=max_queue or getattr(settings, 'WRITE_LANE_QUEUE', DEFAULT_WRITE_LANE_QUEUE))
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'WRITE_LANE', True)
+
+    def run(self, func, *args, **kwargs):
+        """Run ``func`` on the lane and return its result once committed"""
+        if self._inline():
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+
+    def submit(self, func, *args, **kwargs):
+        """Queue ``func`` for the lane; returns a Future"""
+        future = Future()
+        if self._inline():
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+            return future
+        self._ensure_running()
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been written"""
+        if self._thread is None or threading.current_thread() is self._thread:
+            return
+        self.submit(lambda: None).result(timeout)
+
+    def _inline(self):
+        return (
+            not self.enabled
+            or threading.current_thread() is self._thread
+            or connections[self.using].in_atomic_block
+        )
+
+    def _ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f'write-lane-{self.using}', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Write lane batch of {len(batch)} failed: {str(e)}")
+                for future, *_ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                close_old_connections()
+
+    def _write(self, batch):
+        outcomes = []
+        with transaction.atomic(using=self.using):
+            for future, func, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with transaction.atomic(using=self.using):
+                        outcomes.append((future, func(*args, **kwargs), None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+        # Only report back once the batch is committed
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+write_lane = WriteLane()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        write_lane.flush(timeout=10)
+    except Exception as e:
+        logger.error(f"Error flushing the write lane on exit: {str(e)}")
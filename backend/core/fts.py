@@ -0,0 +1,66 @@
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Word characters in any script, so "Sola" and "सोला" both tokenize
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 8
+
+# Grid cell tokens that FTS tables index in a ``cells`` column, finest
+# first, so bbox filters can be matched inside the index. Must match the
+# CAST arithmetic in the migrations that create the tables:
+# '<level><int(lat + 90) cells>x<int(lng + 180) cells>'.
+CELL_LEVELS = (
+    ('cc', lambda offset: int(offset * 10)),  # 0.1 degree
+    ('cb', lambda offset: int(offset)),  # 1 degree
+    ('ca', lambda offset: int(offset / 10)),  # 10 degrees
+)
+MAX_COVER_CELLS = 24
+
+
+def fts_available(using=DEFAULT_DB_ALIAS):
+    """Whether the FTS5 tables exist (they're only created on SQLite)"""
+    return connections[using].vendor == 'sqlite'
+
+
+def match_expression(text, prefix=True, columns=None):
+    """Turn user input into a safe FTS5 MATCH expression.
+
+    Each word is quoted, so FTS5 operators and syntax characters in the
+    input are searched as plain text, and words are ANDed. With ``prefix``
+    the last word also matches as a prefix for search-as-you-type.
+    ``columns`` restricts the match to those columns. Returns None if the
+    input has no words.
+    """
+    terms = TERM_RE.findall((text or '').lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += ' *'
+    expression = ' '.join(quoted)
+    if columns:
+        expression = f'{{{" ".join(columns)}}} : ({expression})'
+    return expression
+
+
+def parse_bbox(value):
+    """Parse 'min_lat,min_lng,max_lat,max_lng'; raises ValueError"""
+    parts = [float(part) for part in (value or '').split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox must be min_lat,min_lng,max_lat,max_lng')
+    min_lat, min_lng, max_lat, max_lng = parts
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError('bbox minimums must not exceed maximums')
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def cover_cells(bbox, column='cells'):
+    """MATCH expression for the cell tokens covering a bbox, or None if too many"""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    for level, cell in CELL_LEVELS:
+        rows = range(cell(max(min_lat, -90) + 90), cell(min(max_lat, 90) + 90) + 1)
+        cols = range(cell(max(min_lng, -180) + 180), cell(min(max_lng, 180) + 180) + 1)
+        if len(rows) * len(cols) <= MAX_COVER_CELLS:
+            return f'{column} : (' + ' OR '.join(f'"{level}{row}x{col}"' for row in rows for col in cols) + ')'
+    return None
@@ -0,0 +1,201 @@
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL = timedelta(hours=24)
+# An unfinished claim older than this belongs to a worker that died (timeout,
+# OOM) mid-request; a retry may take it over
+DEFAULT_CLAIM_LEASE = timedelta(seconds=60)
+LRU_SIZE = 1024
+
+
+class ResponseLRU:
+    """Per-process cache of completed idempotent responses"""
+
+    def __init__(self, max_size=LRU_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= timezone.now():
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return entry
+
+    def put(self, cache_key, entry):
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+response_cache = ResponseLRU()
+
+
+def request_fingerprint(request):
+    """sha256 over the request's form/JSON fields and uploaded files' names and sizes"""
+    digest = hashlib.sha256()
+    data = request.data
+    items = data.lists() if hasattr(data, 'lists') else data.items()
+    for field, value in sorted(items, key=lambda item: item[0]):
+        if field in request.FILES:
+            continue
+        digest.update(f'{field}={json.dumps(value, sort_keys=True, cls=DjangoJSONEncoder)};'.encode())
+    for field, files in sorted(request.FILES.lists()):
+        for uploaded in files:
+            digest.update(f'{field}:{uploaded.name}:{uploaded.size};'.encode())
+    return digest.hexdigest()
+
+
+def _replay(entry):
+    response = Response(json.loads(entry['body']), status=entry['status_code'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _scope(view, request):
+    if request.user.is_authenticated:
+        caller = request.user.id
+    else:
+        # Anonymous callers are told apart by address, so two clients that
+        # happen to pick the same key don't see each other's responses
+        caller = f'anon:{request.META.get("REMOTE_ADDR", "")}'
+    return f'{view.__name__}:{caller}'[:100]
+
+
+def _take_over(existing):
+    """Claim an unfinished record whose lease ran out; False if it is still held"""
+    now = timezone.now()
+    lease = getattr(settings, 'IDEMPOTENCY_CLAIM_LEASE', DEFAULT_CLAIM_LEASE)
+    return bool(IdempotencyRecord.objects.filter(
+        id=existing.id,
+        status_code__isnull=True,
+        created_at__lte=now - lease
+    ).update(created_at=now))
+
+
+def _mismatch():
+    return Response({
+        'success': False,
+        'error': f'{HEADER} was already used with a different request'
+    }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+def idempotent(view):
+    """Replay the first successful response for repeated Idempotency-Keys.
+
+    Requests without the header run normally. The first request with a key
+    claims it by inserting an IdempotencyRecord; a retry while it is still
+    running gets 409, and a retry after it succeeded gets the stored
+    response without running the view again (so nothing downstream is
+    repeated). Failed (non-2xx) responses release the key so the client
+    can retry, and a claim left unfinished for IDEMPOTENCY_CLAIM_LEASE
+    (the worker died) is taken over by the next retry. Keys are scoped to
+    the view and caller (user, or address for anonymous callers) and
+    expire after IDEMPOTENCY_KEY_TTL.
+
+    Goes below @api_view so request.data and request.user are available.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({
+                'success': False,
+                'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = _scope(view, request)
+        fingerprint = request_fingerprint(request)
+
+        cached = response_cache.get((scope, key))
+        if cached is not None:
+            return _replay(cached) if cached['request_hash'] == fingerprint else _mismatch()
+
+        now = timezone.now()
+        IdempotencyRecord.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyRecord.objects.create(
+                    scope=scope,
+                    key=key,
+                    request_hash=fingerprint,
+                    expires_at=now + getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+                )
+        except IntegrityError:
+            existing = IdempotencyRecord.objects.filter(scope=scope, key=key).first()
+            if existing is None:
+                # Released by a failed first attempt in the meantime
+                return view(request, *args, **kwargs)
+            if existing.request_hash != fingerprint:
+                return _mismatch()
+            if existing.status_code is None:
+                if not _take_over(existing):
+                    response = Response({
+                        'success': False,
+                        'error': 'The original request is still being processed'
+                    }, status=status.HTTP_409_CONFLICT)
+                    response['Retry-After'] = '1'
+                    return response
+                record = existing
+            else:
+                entry = {
+                    'request_hash': existing.request_hash,
+                    'status_code': existing.status_code,
+                    'body': existing.response_body,
+                    'expires_at': existing.expires_at
+                }
+                response_cache.put((scope, key), entry)
+                return _replay(entry)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if not 200 <= response.status_code < 300 or not isinstance(response, Response):
+            record.delete()
+            return response
+
+        record.status_code = response.status_code
+        record.response_body = json.dumps(response.data, cls=DjangoJSONEncoder)
+        record.save(update_fields=['status_code', 'response_body'])
+        response_cache.put((scope, key), {
+            'request_hash': fingerprint,
+            'status_code': record.status_code,
+            'body': record.response_body,
+            'expires_at': record.expires_at
+        })
+        return response
+
+    return wrapper
+
+
+def purge_expired_records():
+    """Delete expired idempotency records; returns how many"""
+    deleted, _ = IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,135 @@
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from core.db import DEFAULT_SQLITE_PRAGMAS, WriteLane
+
+# Each profile is run against its own scratch database file:
+#   stock  - Django's default SQLite setup: rollback journal, a connection
+#            per request (CONN_MAX_AGE=0) and deferred transactions
+#   tuned  - the pragmas from core/db.py, persistent connections and
+#            IMMEDIATE transactions; every writer writes directly
+#   lane   - tuned, with the writes funnelled through a WriteLane
+PROFILES = {
+    'stock': {'PRAGMAS': dict.fromkeys(DEFAULT_SQLITE_PRAGMAS), 'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+    'tuned': {
+        'PRAGMAS': DEFAULT_SQLITE_PRAGMAS,
+        'CONN_MAX_AGE': None,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'}
+    },
+}
+PROFILES['lane'] = PROFILES['tuned']
+
+SCHEMA = [
+    'CREATE TABLE bench_alert (id INTEGER PRIMARY KEY, latitude REAL, longitude REAL)',
+    'CREATE TABLE bench_ping (id INTEGER PRIMARY KEY, alert_id INTEGER, latitude REAL, longitude REAL, created_at REAL)',
+    'CREATE INDEX bench_ping_alert ON bench_ping (alert_id, created_at)',
+]
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Measure SQLite write throughput under concurrent writers for each connection profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=50, help='Concurrent writer threads')
+        parser.add_argument('--writes', type=int, default=100, help='Location pings per writer')
+        parser.add_argument('--profiles', default=','.join(PROFILES), help='Comma-separated profiles to run')
+
+    def handle(self, *args, **options):
+        profiles = [name.strip() for name in options['profiles'].split(',') if name.strip()]
+        unknown = set(profiles) - set(PROFILES)
+        if unknown:
+            self.stderr.write(f'Unknown profiles: {", ".join(sorted(unknown))}')
+            return
+
+        self.stdout.write(
+            f'{options["writers"]} writers x {options["writes"]} location pings '
+            '(insert ping + update alert per transaction)'
+        )
+        self.stdout.write(f'{"profile":<8} {"ok":>7} {"failed":>7} {"seconds":>8} {"writes/s":>9} {"p50 ms":>8} {"p99 ms":>8}')
+        with tempfile.TemporaryDirectory() as directory:
+            for name in profiles:
+                result = self._run_profile(name, Path(directory), options['writers'], options['writes'])
+                self.stdout.write(
+                    f'{name:<8} {result["ok"]:>7} {result["failed"]:>7} {result["seconds"]:>8.2f} '
+                    f'{result["ok"] / result["seconds"]:>9.0f} {result["p50"]:>8.1f} {result["p99"]:>8.1f}'
+                )
+
+    def _run_profile(self, name, directory, writers, writes):
+        alias = f'bench_{name}'
+        connections.settings[alias] = {
+            **connections['default'].settings_dict,
+            **PROFILES[name],
+            'NAME': str(directory / f'{name}.sqlite3'),
+        }
+        with connections[alias].cursor() as cursor:
+            for sql in SCHEMA:
+                cursor.execute(sql)
+            cursor.executemany(
+                'INSERT INTO bench_alert (id, latitude, longitude) VALUES (%s, 0, 0)',
+                [(alert_id,) for alert_id in range(writers)]
+            )
+        connections[alias].close()
+
+        lane = WriteLane(using=alias) if name == 'lane' else None
+        latencies = []
+        failed = []
+        start_line = threading.Barrier(writers)
+
+        def ping(alert_id, n):
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO bench_ping (alert_id, latitude, longitude, created_at) VALUES (%s, %s, %s, %s)',
+                    [alert_id, n * 1e-5, n * 1e-5, time.time()]
+                )
+                cursor.execute(
+                    'UPDATE bench_alert SET latitude = %s, longitude = %s WHERE id = %s',
+                    [n * 1e-5, n * 1e-5, alert_id]
+                )
+
+        def writer(alert_id):
+            start_line.wait()
+            for n in range(writes):
+                started = time.perf_counter()
+                try:
+                    if lane:
+                        lane.run(ping, alert_id, n)
+                    else:
+                        with transaction.atomic(using=alias):
+                            ping(alert_id, n)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                except OperationalError:
+                    failed.append(alert_id)
+                finally:
+                    if PROFILES[name]['CONN_MAX_AGE'] == 0:
+                        connections[alias].close()
+            connections[alias].close()
+
+        threads = [threading.Thread(target=writer, args=(alert_id,)) for alert_id in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+
+        connections[alias].close()
+        return {
+            'ok': len(latencies),
+            'failed': len(failed),
+            'seconds': seconds,
+            'p50': statistics.median(latencies) if latencies else 0,
+            'p99': _percentile(latencies, 99),
+        }
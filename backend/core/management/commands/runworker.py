@@ -0,0 +1,51 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.worker import Worker
+
+
+def _work(concurrency, queues, poll_interval, once):
+    worker = Worker(concurrency=concurrency, queues=queues, poll_interval=poll_interval)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    worker.run(once=once)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs queued with @task(...).delay()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Worker threads per process')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to fork')
+        parser.add_argument('--queues', help='Comma-separated queues to serve (default: all)')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls when idle')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is runnable')
+
+    def handle(self, *args, **options):
+        queues = [q.strip() for q in options['queues'].split(',')] if options['queues'] else None
+        worker_args = (options['concurrency'], queues, options['poll_interval'], options['once'])
+
+        if options['processes'] <= 1:
+            _work(*worker_args)
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=_work, args=worker_args, name=f'runworker-{i}')
+            for i in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        def forward(signum, frame):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for process in processes:
+            process.join()
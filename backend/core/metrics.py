@@ -0,0 +1,342 @@
+import atexit
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('core.metrics.slow')
+
+PREFIX = 'cityshield'
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# name: (type, help, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests served, by view, method and status class', None),
+    'http_request_duration_seconds': ('histogram', 'Wall time from middleware entry to response', TIME_BUCKETS),
+    'db_queries_per_request': ('histogram', 'Database queries per request, on every alias', QUERY_BUCKETS),
+    'db_duration_seconds': ('histogram', 'Time per request spent in database queries', TIME_BUCKETS),
+    'outbound_http_duration_seconds': ('histogram', 'Outbound HTTP calls, by view and service', TIME_BUCKETS),
+    'http_response_bytes': ('histogram', 'Response body size', BYTES_BUCKETS),
+    'outbound_requests_total': ('counter', 'Outbound HTTP attempts, by service, endpoint and outcome', None),
+    'outbound_attempt_duration_seconds': ('histogram', 'Outbound HTTP attempts, by service and endpoint', TIME_BUCKETS),
+    'outbound_circuit_state': ('gauge', 'Circuit breaker per upstream endpoint, worst worker: 0 closed, 1 half open, 2 open', None),
+}
+
+DEFAULT_FLUSH_INTERVAL = 5  # seconds
+STALE_GAUGE_FLUSHES = 3  # a worker file this many intervals old belongs to an exited worker
+DEFAULT_SLOW_REQUEST_MS = 1000
+SLOW_LOG_STATEMENTS = 5
+SLOW_LOG_SQL_CHARS = 500
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current = ContextVar('metrics_request', default=None)
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms for this process.
+
+    Series are keyed by (name, sorted label pairs). A histogram is a list
+    of per-bucket counts (the last one is +Inf) followed by sum and count.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(buckets) + 1) + [0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def set(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._series[key] = value
+
+    def snapshot(self):
+        with self._lock:
+            return [[name, list(labels), list(value) if isinstance(value, list) else value]
+                    for (name, labels), value in self._series.items()]
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _kind(name):
+    return METRICS[name][0] if name in METRICS else None
+
+
+def merge(snapshots):
+    """Add up snapshots from several processes; gauges keep the highest value"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            if key not in merged:
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(merged[key], value)]
+            elif _kind(name) == 'gauge':
+                merged[key] = max(merged[key], value)
+            else:
+                merged[key] += value
+    return merged
+
+
+class FileExporter:
+    """Shares this process's metrics with the other workers through METRICS_DIR.
+
+    Every worker rewrites its own <pid>.json snapshot every
+    METRICS_FLUSH_INTERVAL seconds (and on exit); a scrape adds up all the
+    files, with the scraped worker's live numbers in place of its own file.
+    Files of exited workers are kept so counters don't go backwards; clear
+    the directory when the server (re)starts. Gauges are only read from
+    files that are still being refreshed.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def path(self, pid=None):
+        return os.path.join(self.directory, f'{pid or os.getpid()}.json')
+
+    def ensure_running(self):
+        if not self.directory or (self._pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked from a process that had already recorded: start
+                # from zero, the parent's numbers are in the parent's file
+                if self._pid is not None:
+                    self.registry.clear()
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name='metrics-export', daemon=True)
+                self._thread.start()
+
+    @property
+    def interval(self):
+        return getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+    def _run(self):
+        interval = self.interval
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def flush(self):
+        if not self.directory or self._pid != os.getpid():
+            return
+        try:
+            temp = f'{self.path()}.tmp'
+            with open(temp, 'w') as f:
+                json.dump(self.registry.snapshot(), f)
+            os.replace(temp, self.path())
+        except OSError as e:
+            logger.error(f"Could not write metrics to {self.directory}: {str(e)}")
+
+    def collect(self):
+        """Merged series of every worker"""
+        snapshots = [self.registry.snapshot()]
+        if self.directory and os.path.isdir(self.directory):
+            own = f'{os.getpid()}.json'
+            stale_before = time.time() - STALE_GAUGE_FLUSHES * self.interval
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json') or name == own:
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                    if os.path.getmtime(path) < stale_before:
+                        snapshot = [series for series in snapshot if _kind(series[0]) != 'gauge']
+                    snapshots.append(snapshot)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Skipping unreadable metrics file {name}: {str(e)}")
+        return merge(snapshots)
+
+
+registry = MetricsRegistry()
+exporter = FileExporter(registry)
+atexit.register(exporter.flush)
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs, extra=()):
+    pairs = [*pairs, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render_prometheus(series):
+    """Prometheus text exposition format"""
+    by_name = {}
+    for (name, labels), value in sorted(series.items()):
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, entries in by_name.items():
+        if name not in METRICS:
+            continue
+        kind, help_text, buckets = METRICS[name]
+        full_name = f'{PREFIX}_{name}'
+        lines.append(f'# HELP {full_name} {help_text}')
+        lines.append(f'# TYPE {full_name} {kind}')
+        for labels, value in entries:
+            if kind in ('counter', 'gauge'):
+                lines.append(f'{full_name}{_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], value):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{full_name}_sum{_labels(labels)} {value[-2]}')
+            lines.append(f'{full_name}_count{_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+class RequestRecorder:
+    """execute_wrapper collecting one request's query count, time and statements"""
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.db_seconds = 0
+        self.outbound_seconds = 0
+        self.statements = {}  # sql -> [count, seconds]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            statement = self.statements.setdefault(sql, [0, 0])
+            statement[0] += 1
+            statement[1] += elapsed
+
+
+@contextlib.contextmanager
+def track_outbound(service):
+    """Time an outbound HTTP call, attributed to the current request's view"""
+    recorder = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if metrics_enabled():
+            view = _view_name(recorder.request) if recorder else 'background'
+            registry.observe('outbound_http_duration_seconds', {'view': view, 'service': service}, elapsed)
+            exporter.ensure_running()
+        if recorder:
+            recorder.outbound_seconds += elapsed
+
+
+def _response_bytes(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """Records wall time, queries, outbound HTTP time and response size per view.
+
+    Goes first in MIDDLEWARE so the other middleware is included in the
+    time. Streaming responses are timed up to the first byte. Requests
+    slower than SLOW_REQUEST_MS are written to the 'core.metrics.slow'
+    log with their most expensive SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics_enabled():
+            return self.get_response(request)
+
+        recorder = RequestRecorder(request)
+        token = _current.set(recorder)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+
+        view = _view_name(request)
+        size = _response_bytes(response)
+        registry.inc('http_requests_total', {
+            'view': view, 'method': request.method, 'status': f'{response.status_code // 100}xx'
+        })
+        registry.observe('http_request_duration_seconds', {'view': view}, elapsed)
+        registry.observe('db_queries_per_request', {'view': view}, recorder.queries)
+        registry.observe('db_duration_seconds', {'view': view}, recorder.db_seconds)
+        if size is not None:
+            registry.observe('http_response_bytes', {'view': view}, size)
+        exporter.ensure_running()
+
+        if elapsed * 1000 >= getattr(settings, 'SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS):
+            self.log_slow(request, response, view, elapsed, size, recorder)
+        return response
+
+    def log_slow(self, request, response, view, elapsed, size, recorder):
+        top = sorted(recorder.statements.items(), key=lambda item: item[1][1], reverse=True)[:SLOW_LOG_STATEMENTS]
+        lines = [
+            f"Slow request {request.method} {request.get_full_path()} ({view}) {response.status_code} "
+            f"in {elapsed * 1000:.0f} ms: {recorder.queries} queries in {recorder.db_seconds * 1000:.0f} ms, "
+            f"outbound HTTP {recorder.outbound_seconds * 1000:.0f} ms, {size if size is not None else '?'} bytes"
+        ]
+        for sql, (count, seconds) in top:
+            lines.append(f"  {count:>5} x {seconds * 1000:>8.1f} ms  {sql[:SLOW_LOG_SQL_CHARS]}")
+        slow_logger.warning('\n'.join(lines))
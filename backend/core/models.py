@@ -0,0 +1,64 @@
+from django.db import models
+from django.utils import timezone
+
+
+class IdempotencyRecord(models.Model):
+    """Outcome of a request made with an Idempotency-Key header"""
+    scope = models.CharField(max_length=100)  # view name and caller
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.IntegerField(null=True, blank=True)  # null while the first request is running
+    response_body = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ['scope', 'key']
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.status_code or 'in progress'})"
+
+
+class Job(models.Model):
+    """Background task invocation, claimed and run by `manage.py runworker`"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    task_name = models.CharField(max_length=200)
+    queue = models.CharField(max_length=50, default='default')
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.IntegerField(default=0)  # higher runs first; includes the queue's priority
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} {self.task_name} ({self.status})"
+
+
+class ReplicaHeartbeat(models.Model):
+    """Single row stamped on the primary by `manage.py sync_replica`.
+
+    Read back from the replica, it tells how far the replica has caught up
+    (see core/routing.py).
+    """
+    written_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Replica heartbeat {self.written_at}"
@@ -0,0 +1,393 @@
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+from .metrics import METRICS, exporter, metrics_enabled, registry, track_outbound
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUEST_BUDGET = 15  # seconds an API request may spend waiting on upstreams
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (3.05, 10)  # connect, read
+MIN_ATTEMPT_SECONDS = 0.25  # don't start a call with less budget left than this
+STALE_TTL = 86400  # seconds a good answer is kept for when the upstream is down
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_deadline = ContextVar('outbound_deadline', default=None)
+
+
+class OutboundError(requests.RequestException):
+    """No usable answer from any endpoint of an upstream"""
+
+
+class CircuitOpen(OutboundError):
+    """Every endpoint's breaker is open; nothing was sent"""
+
+
+class BudgetExhausted(OutboundError):
+    """The caller's budget ran out before or during the call"""
+
+
+@contextlib.contextmanager
+def budget(seconds):
+    """Cap the time outbound calls in this block may take, in total; nested budgets only shrink"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left in the current budget, or None outside one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class OutboundBudgetMiddleware:
+    """Gives every request OUTBOUND_REQUEST_BUDGET seconds for upstream calls"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with budget(getattr(settings, 'OUTBOUND_REQUEST_BUDGET', DEFAULT_REQUEST_BUDGET)):
+            return self.get_response(request)
+
+
+def _record(name, labels, value=1):
+    if not metrics_enabled():
+        return
+    kind = METRICS[name][0]
+    if kind == 'counter':
+        registry.inc(name, labels, value)
+    elif kind == 'gauge':
+        registry.set(name, labels, value)
+    else:
+        registry.observe(name, labels, value)
+    exporter.ensure_running()
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one endpoint, per process.
+
+    Opens after ``failure_threshold`` failures in a row and rejects calls
+    for ``open_seconds``; then lets a single trial call through (half
+    open) and closes again if it succeeds.
+    """
+
+    def __init__(self, service, endpoint, failure_threshold, open_seconds):
+        self.service = service
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._set(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def release(self):
+        """Give back an allowed call that was never sent"""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial = False
+            self._set(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set(OPEN)
+            else:
+                self._set(self.state)
+
+    def _set(self, state):
+        if state != self.state:
+            log = logger.warning if state == OPEN else logger.info
+            log(f"Circuit for {self.service} at {self.endpoint} is now {state} after {self.failures} failures")
+            self.state = state
+        _record('outbound_circuit_state', {'service': self.service, 'endpoint': self.endpoint}, STATE_VALUES[state])
+
+
+class Upstream:
+    """An external HTTP service: its endpoints (primary first, then mirrors) and call policy.
+
+    Without ``hedge_after`` a failed endpoint fails over to the next one;
+    with it, the next endpoint is also tried whenever the ones in flight
+    haven't answered within that many seconds, and the first answer wins.
+    """
+
+    def __init__(self, name, urls, timeout=DEFAULT_TIMEOUT, failure_threshold=5, open_seconds=30,
+                 hedge_after=None, headers=None, stale_ttl=STALE_TTL):
+        if not urls:
+            raise ValueError(f'Upstream {name} needs at least one URL')
+        self.name = name
+        self.urls = list(urls)
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.headers = headers or {}
+        self.stale_ttl = stale_ttl
+        self.breakers = [
+            CircuitBreaker(name, urlsplit(url).netloc or url, failure_threshold, open_seconds) for url in self.urls
+        ]
+
+    @property
+    def max_seconds(self):
+        return sum(self.timeout) if isinstance(self.timeout, tuple) else self.timeout
+
+    def attempt_timeout(self, seconds_left):
+        """The configured timeout, shrunk to what is left of the call's deadline"""
+        if isinstance(self.timeout, tuple):
+            return tuple(min(part, seconds_left) for part in self.timeout)
+        return min(self.timeout, seconds_left)
+
+
+_upstreams = {}
+
+
+def register(name, urls, **options):
+    """Declare an upstream; OUTBOUND_UPSTREAMS[name] in settings overrides any option, urls included"""
+    options = {**options, **getattr(settings, 'OUTBOUND_UPSTREAMS', {}).get(name, {})}
+    urls = options.pop('urls', urls)
+    _upstreams[name] = Upstream(name, urls, **options)
+    return _upstreams[name]
+
+
+def upstream(name):
+    return _upstreams[name]
+
+
+@contextlib.contextmanager
+def replaced(name, urls, **options):
+    """Point an upstream at other endpoints (a local fake, say) inside this block; settings don't apply"""
+    previous = _upstreams.get(name)
+    _upstreams[name] = Upstream(name, urls, **options)
+    try:
+        yield _upstreams[name]
+    finally:
+        if previous is None:
+            _upstreams.pop(name, None)
+        else:
+            _upstreams[name] = previous
+
+
+class _Rejected(Exception):
+    """4xx from an upstream, raised out of an attempt so the caller stops trying mirrors"""
+
+
+class OutboundClient:
+    """Pooled keep-alive session and call threads shared by every upstream in the process.
+
+    Calls run on the pool so the caller can stop waiting at its deadline
+    even when an upstream trickles bytes slower than the read timeout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._session = None
+        self._executor = None
+
+    def _resources(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Sockets and threads don't survive a fork; start over in the child
+                    size = getattr(settings, 'OUTBOUND_POOL_SIZE', DEFAULT_POOL_SIZE)
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=size, thread_name_prefix='outbound'
+                    )
+                    self._pid = os.getpid()
+        return self._session, self._executor
+
+    def get_json(self, name, params=None, **options):
+        return self.request_json(name, 'GET', params=params, **options)
+
+    def post_json(self, name, data=None, **options):
+        return self.request_json(name, 'POST', data=data, **options)
+
+    def request_json(self, name, method, params=None, data=None, stale=False):
+        """Decoded JSON answer of an upstream, within the caller's budget.
+
+        Raises OutboundError (a requests.RequestException) when no endpoint
+        answers in time, every breaker is open, or the upstream rejects the
+        request. With ``stale`` the last good answer to the same request is
+        returned instead, if one is cached.
+        """
+        target = upstream(name)
+        key = self._stale_key(name, method, params, data) if stale else None
+        try:
+            with track_outbound(name):
+                payload = self._call(target, method, {'params': params, 'data': data})
+        except OutboundError as e:
+            cached = self._cache_get(key) if key else None
+            if cached is None:
+                raise
+            logger.info(f"Serving a stale {name} answer: {str(e)}")
+            return cached
+        if key:
+            self._cache_set(key, payload, target.stale_ttl)
+        return payload
+
+    def _call(self, target, method, kwargs):
+        left = remaining()
+        seconds = target.max_seconds if left is None else min(target.max_seconds, left)
+        if seconds < MIN_ATTEMPT_SECONDS:
+            _record('outbound_requests_total', {'service': target.name, 'endpoint': '-', 'outcome': 'no_budget'})
+            raise BudgetExhausted(f'No time left to call {target.name}')
+        deadline = time.monotonic() + seconds
+
+        session, executor = self._resources()
+        candidates = iter(range(len(target.urls)))
+        pending = {}  # future -> endpoint index
+        errors = []
+
+        def launch():
+            for index in candidates:
+                breaker = target.breakers[index]
+                if not breaker.allow():
+                    _record('outbound_requests_total', {
+                        'service': target.name, 'endpoint': breaker.endpoint, 'outcome': 'circuit_open'
+                    })
+                    errors.append(f'{breaker.endpoint}: circuit open')
+                    continue
+                future = executor.submit(
+                    self._attempt, session, target, index, method,
+                    target.attempt_timeout(deadline - time.monotonic()), kwargs
+                )
+                pending[future] = index
+                return True
+            return False
+
+        if not launch():
+            raise CircuitOpen(f'Circuit open for {target.name}: {"; ".join(errors)}')
+
+        more = True
+        while pending:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            hedge = target.hedge_after if more else None
+            done, _ = concurrent.futures.wait(
+                pending, timeout=min(left, hedge) if hedge else left,
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if not done:
+                if hedge and deadline - time.monotonic() >= MIN_ATTEMPT_SECONDS:
+                    more = launch()
+                continue
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    payload = future.result()
+                except _Rejected as e:
+                    self._abandon(target, pending)
+                    raise OutboundError(str(e)) from e
+                except (requests.RequestException, ValueError) as e:
+                    errors.append(f'{target.breakers[index].endpoint}: {str(e)}')
+                    continue
+                self._abandon(target, pending)
+                return payload
+            if not pending and more and deadline - time.monotonic() >= MIN_ATTEMPT_SECONDS:
+                more = launch()
+
+        self._abandon(target, pending)
+        if not errors:
+            raise BudgetExhausted(f'{target.name} did not answer within {seconds:.1f}s')
+        raise OutboundError(f'{target.name} failed: {"; ".join(errors)}')
+
+    def _abandon(self, target, pending):
+        # Calls already on the wire finish in the background and still
+        # count towards their breaker; queued ones are dropped
+        for future, index in pending.items():
+            if future.cancel():
+                target.breakers[index].release()
+
+    def _attempt(self, session, target, index, method, timeout, kwargs):
+        breaker = target.breakers[index]
+        labels = {'service': target.name, 'endpoint': breaker.endpoint}
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = session.request(method, target.urls[index], headers=target.headers, timeout=timeout, **kwargs)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise requests.HTTPError(f'{response.status_code} {response.reason}', response=response)
+            if response.status_code >= 400:
+                # The upstream is fine, the request isn't; a mirror won't do better
+                breaker.record_success()
+                outcome = 'rejected'
+                raise _Rejected(f'{target.name} rejected the request: {response.status_code} {response.reason}')
+            payload = response.json()
+        except requests.Timeout:
+            breaker.record_failure()
+            outcome = 'timeout'
+            raise
+        except (requests.RequestException, ValueError):
+            breaker.record_failure()
+            raise
+        else:
+            breaker.record_success()
+            outcome = 'ok'
+            return payload
+        finally:
+            _record('outbound_attempt_duration_seconds', labels, time.perf_counter() - started)
+            _record('outbound_requests_total', {**labels, 'outcome': outcome})
+
+    def _stale_key(self, name, method, params, data):
+        body = json.dumps([method, params, data], sort_keys=True, default=str)
+        return f'outbound:{name}:{hashlib.sha1(body.encode()).hexdigest()}'
+
+    def _cache_get(self, key):
+        try:
+            return cache.get(key)
+        except Exception as e:
+            logger.error(f"Could not read stale answer {key}: {str(e)}")
+            return None
+
+    def _cache_set(self, key, payload, timeout):
+        try:
+            cache.set(key, payload, timeout=timeout)
+        except Exception as e:
+            logger.error(f"Could not store answer {key}: {str(e)}")
+
+
+client = OutboundClient()
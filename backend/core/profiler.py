@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_MS = 5
+MIN_INTERVAL_MS = 1
+MAX_INTERVAL_MS = 100
+DEFAULT_REQUEST_TIMEOUT = 60  # seconds to wait for the requested number of requests
+MAX_SECONDS = 300
+MAX_REQUESTS = 1000
+
+_lock = threading.Lock()
+_session = None  # the armed ProfileSession of this process, if any
+_labels = {}  # code object -> frame label
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILER_DIR', None) or os.path.join(tempfile.gettempdir(), 'cityshield-profiles')
+
+
+def _path_prefixes():
+    prefixes = {str(settings.BASE_DIR)} | {path for path in sys.path if path and os.path.isabs(path)}
+    return sorted(prefixes, key=len, reverse=True)
+
+
+def _label(code, prefixes):
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        for prefix in prefixes:
+            if filename.startswith(prefix + os.sep):
+                filename = filename[len(prefix) + 1:]
+                break
+        name = getattr(code, 'co_qualname', code.co_name)
+        # ';' separates frames in the collapsed format
+        label = _labels[code] = f'{name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+    return label
+
+
+def collapse(frame, prefixes):
+    """Root-first 'a;b;c' stack of a frame, the format flamegraph.pl and speedscope read"""
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame.f_code, prefixes))
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+def view_matches(view, path):
+    """Whether ``path`` resolves to ``view`` (URL name, namespaced name or function name)"""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return False
+    func = getattr(match.func, 'view_class', match.func)
+    return view in (match.view_name, match.url_name, func.__name__, f'{func.__module__}.{func.__name__}')
+
+
+class ProfileSession:
+    """One armed sampling run in this process.
+
+    A sampler thread reads ``sys._current_frames()`` every ``interval_ms``
+    and counts the stacks of the threads that are serving a matching
+    request at that moment. It stops after ``seconds``, or once
+    ``requests`` matching requests have finished, and writes the collapsed
+    stacks to PROFILER_DIR.
+    """
+
+    def __init__(self, seconds, view=None, requests=None, interval_ms=DEFAULT_INTERVAL_MS, started_by=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.seconds = seconds
+        self.view = view
+        self.requests = requests
+        self.interval = interval_ms / 1000
+        self.started_by = started_by
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.claimed = 0
+        self.finished_requests = 0
+        self.threads = set()  # idents of threads serving a profiled request
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'profiler-{self.id}', daemon=True)
+
+    def meta(self, status):
+        return {
+            'id': self.id,
+            'status': status,
+            'pid': os.getpid(),
+            'view': self.view,
+            'seconds': self.seconds,
+            'requests': self.requests,
+            'interval_ms': self.interval * 1000,
+            'started_at': self.started_at,
+            'started_by': self.started_by,
+            'profiled_requests': self.finished_requests,
+            'samples': self.samples,
+        }
+
+    def start(self):
+        os.makedirs(profile_dir(), exist_ok=True)
+        self._write(f'{self.id}.json', json.dumps(self.meta('running')))
+        self._thread.start()
+
+    def claim(self, path):
+        """Register the current request's thread if it should be profiled"""
+        if self.view is not None and not view_matches(self.view, path):
+            return False
+        with self._threads_lock:
+            if self.requests is not None and self.claimed >= self.requests:
+                return False
+            self.claimed += 1
+            self.threads.add(threading.get_ident())
+        return True
+
+    def release(self):
+        with self._threads_lock:
+            self.threads.discard(threading.get_ident())
+            self.finished_requests += 1
+            if self.requests is not None and self.finished_requests >= self.requests:
+                self._stop.set()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        global _session
+        prefixes = _path_prefixes()
+        try:
+            while not self._stop.wait(self.interval) and time.monotonic() < self.deadline:
+                with self._threads_lock:
+                    idents = list(self.threads)
+                if not idents:
+                    continue
+                frames = sys._current_frames()
+                for ident in idents:
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        self.stacks[collapse(frame, prefixes)] += 1
+                        self.samples += 1
+                del frames
+        finally:
+            with _lock:
+                if _session is self:
+                    _session = None
+            self._save()
+
+    def _save(self):
+        lines = [f'{stack} {count}' for stack, count in sorted(self.stacks.items())]
+        try:
+            self._write(f'{self.id}.txt', '\n'.join(lines) + '\n' if lines else '')
+            self._write(f'{self.id}.json', json.dumps(self.meta('done')))
+        except OSError as e:
+            logger.error(f"Could not write profile {self.id} to {profile_dir()}: {str(e)}")
+            return
+        logger.info(f"Profile {self.id} done: {self.samples} samples over {self.finished_requests} requests")
+
+    def _write(self, name, content):
+        path = os.path.join(profile_dir(), name)
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(content)
+        os.replace(f'{path}.tmp', path)
+
+
+def arm(seconds, view=None, requests=None, interval_ms=DEFAULT_INTERVAL_MS, started_by=None):
+    """Start a session in this process; None if one is already armed"""
+    global _session
+    with _lock:
+        if _session is not None:
+            return None
+        session = _session = ProfileSession(seconds, view, requests, interval_ms, started_by)
+    try:
+        session.start()
+    except Exception:
+        with _lock:
+            _session = None
+        raise
+    return session
+
+
+def current():
+    return _session
+
+
+def load(profile_id):
+    """(meta, collapsed stacks or None while running) of a saved profile, or None"""
+    if not profile_id.isalnum():
+        return None
+    path = os.path.join(profile_dir(), profile_id)
+    try:
+        with open(f'{path}.json') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta['status'] != 'done':
+        return meta, None
+    try:
+        with open(f'{path}.txt') as f:
+            return meta, f.read()
+    except OSError:
+        return None
+
+
+class ProfilerMiddleware:
+    """Hands matching requests to the armed profile session.
+
+    Costs one global lookup per request while nothing is armed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = _session
+        if session is None or not session.claim(request.path_info):
+            return self.get_response(request)
+        try:
+            return self.get_response(request)
+        finally:
+            session.release()
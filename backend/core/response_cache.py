@@ -0,0 +1,115 @@
+import functools
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'resp'
+DEFAULT_TIMEOUT = 300  # seconds
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:ns:{namespace}'
+
+
+def _fresh_version():
+    # Millisecond clock, so a namespace recreated after eviction never
+    # reuses a version that cached entries may still embed
+    return int(time.time() * 1000)
+
+
+def namespace_versions(namespaces):
+    """Current version of each namespace, creating missing ones"""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # add() so a concurrent bump isn't overwritten
+            cache.add(key, _fresh_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_namespace(namespace):
+    """Invalidate every cached response in a namespace.
+
+    Cached keys embed the namespace version, so bumping it makes old
+    entries unreachable; they age out of the cache on their own.
+    """
+    key = _version_key(namespace)
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), timeout=None)
+    except Exception as e:
+        # Called from model signals; don't fail the write over it
+        logger.error(f"Could not invalidate response cache namespace {namespace}: {str(e)}")
+
+
+def normalized_query(request):
+    """Query parameters as a stable string: sorted keys, sorted repeated values"""
+    params = sorted(
+        (key, sorted(request.GET.getlist(key)))
+        for key in request.GET
+    )
+    return '&'.join(f'{key}={",".join(values)}' for key, values in params)
+
+
+def cache_response(*namespaces, timeout=None, vary_on=None):
+    """Cache successful GET responses of a view per query string.
+
+    Keys combine the view, its URL kwargs, the normalized query parameters,
+    the current versions of ``namespaces`` (see bump_namespace) and, if
+    given, ``vary_on(request)`` for data that lives outside the DB such as
+    a file's mtime. Only 200 responses are cached. The user is not part of
+    the key, so use it only on public views whose output is the same for
+    everyone.
+
+    Goes below @api_view like @idempotent.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            try:
+                parts = [
+                    view.__module__,
+                    view.__name__,
+                    repr(sorted(kwargs.items())),
+                    normalized_query(request),
+                    repr(namespace_versions(namespaces)),
+                    repr(vary_on(request)) if vary_on else ''
+                ]
+                key = f'{KEY_PREFIX}:{hashlib.sha256("|".join(parts).encode()).hexdigest()}'
+                data = cache.get(key)
+            except Exception as e:
+                # A cache outage shouldn't fail the request
+                logger.warning(f"Response cache unavailable for {view.__name__}: {str(e)}")
+                return view(request, *args, **kwargs)
+
+            if data is not None:
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                entry_timeout = timeout if timeout is not None else getattr(settings, 'RESPONSE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+                try:
+                    cache.set(key, response.data, entry_timeout)
+                except Exception as e:
+                    logger.warning(f"Could not cache response of {view.__name__}: {str(e)}")
+                response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
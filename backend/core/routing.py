@@ -0,0 +1,142 @@
+import functools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+# Past this lag (seconds) the replica is ignored; also how long a client's
+# last write is remembered
+DEFAULT_MAX_LAG = 30
+# How long a process trusts the replica position it last read (seconds)
+STATUS_TTL = 1.0
+PIN_KEY_PREFIX = 'replica:last-write'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def max_lag():
+    return getattr(settings, 'REPLICA_MAX_LAG', DEFAULT_MAX_LAG)
+
+
+class ReplicaRouter:
+    """Sends reads inside @replica_reads views to the 'replica' database.
+
+    Everything else, and every write, goes to the primary. Objects loaded
+    from the replica are saved back to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == REPLICA_ALIAS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_ALIAS}:
+            return True
+        return None
+
+
+class _ReplicaStatus:
+    """Per-process cache of the replica's heartbeat, refreshed every STATUS_TTL"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0
+        self._synced_at = None
+
+    def synced_at(self):
+        """Unix time up to which the replica has every committed write, or None"""
+        now = time.monotonic()
+        if now - self._checked_at < STATUS_TTL:
+            return self._synced_at
+        with self._lock:
+            if now - self._checked_at >= STATUS_TTL:
+                self._synced_at = self._read()
+                self._checked_at = now
+        return self._synced_at
+
+    def _read(self):
+        from .models import ReplicaHeartbeat
+        try:
+            written_at = ReplicaHeartbeat.objects.using(REPLICA_ALIAS).values_list('written_at', flat=True).first()
+        except DatabaseError as e:
+            logger.warning(f"Replica unavailable, reading from primary: {e}")
+            return None
+        return written_at.timestamp() if written_at else None
+
+
+replica_status = _ReplicaStatus()
+
+
+def _client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'{PIN_KEY_PREFIX}:user:{user.pk}'
+    return f'{PIN_KEY_PREFIX}:ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def record_write(request):
+    """Remember that this client just wrote, for read-your-writes"""
+    cache.set(_client_key(request), time.time(), timeout=max_lag())
+
+
+def replica_usable(request):
+    """Whether the replica is fresh enough to serve this client's reads"""
+    if not replica_configured():
+        return False
+    synced_at = replica_status.synced_at()
+    if synced_at is None or time.time() - synced_at > max_lag():
+        return False
+    last_write = cache.get(_client_key(request))
+    return last_write is None or last_write <= synced_at
+
+
+def replica_reads(view):
+    """Let a read-only view read from the replica when it's usable.
+
+    Falls back to the primary when no replica is configured, when it lags
+    by more than REPLICA_MAX_LAG seconds, or when the caller wrote
+    something the replica hasn't caught up with yet. Goes below the DRF
+    decorators so request.user is the authenticated user.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not replica_usable(request):
+            return view(request, *args, **kwargs)
+        token = _replica_reads.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """Records successful writes so @replica_reads serves them back from the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and replica_configured():
+            # DRF copies the token-authenticated user onto the request
+            record_write(request)
+        return response
@@ -0,0 +1,474 @@
+import itertools
+import logging
+import math
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, models, router
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.query import (
+    FlatValuesListIterable,
+    ModelIterable,
+    NamedValuesListIterable,
+    ValuesIterable,
+    ValuesListIterable,
+)
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Each shard allocates primary keys from its own block (shard_id *
+# ID_BLOCK onwards), so ids stay unique across shards and an id alone says
+# which database holds the row. The default database is shard 0.
+ID_BLOCK = 10 ** 12
+METERS_PER_DEGREE = 111320
+
+
+def shard_config():
+    """STATE_SHARDS: {alias: {'shard_id': n, 'states': [...], 'bboxes': [...]}}"""
+    return getattr(settings, 'STATE_SHARDS', {})
+
+
+def sharding_active():
+    return bool(shard_config())
+
+
+def shard_aliases():
+    """Every database holding sharded rows, the default one first"""
+    return [DEFAULT_DB_ALIAS, *shard_config()]
+
+
+def alias_for_id(pk):
+    block = int(pk) // ID_BLOCK
+    if block:
+        for alias, config in shard_config().items():
+            if config['shard_id'] == block:
+                return alias
+    return DEFAULT_DB_ALIAS
+
+
+def _sharded_models():
+    return {apps.get_model(label) for label in getattr(settings, 'SHARDED_MODELS', [])}
+
+
+def shard_local(model):
+    """Sharded models plus the M2M tables and targets that follow them"""
+    for sharded in _sharded_models():
+        if model is sharded:
+            return True
+        for field in sharded._meta.many_to_many:
+            if model in (field.remote_field.through, field.related_model):
+                return True
+    return False
+
+
+def _overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class RegionMap:
+    """Which shard stores a point, and which shards an area touches.
+
+    A point belongs to the shard listing its state, as named by the
+    offline geocoder's nearest place; points the geocoder can't place fall
+    back to the shards' bboxes, then to the default database. Each shard's
+    bboxes are its configured 'bboxes' or else the extent of its states'
+    places in the geocoder datasets; a shard listing a state the datasets
+    don't cover must configure its bboxes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bboxes = None
+
+    def reset(self):
+        self._bboxes = None
+
+    def alias_for_point(self, latitude, longitude):
+        from reports.offline_geocoder import offline_geocoder
+
+        place = offline_geocoder.reverse(latitude, longitude)
+        if place and place['address']['state']:
+            state = place['address']['state'].lower()
+            for alias, config in shard_config().items():
+                if state in (name.lower() for name in config.get('states', [])):
+                    return alias
+
+        point = (latitude, longitude, latitude, longitude)
+        for alias, boxes in self.bboxes().items():
+            if any(_overlaps(point, box) for box in boxes):
+                return alias
+        return DEFAULT_DB_ALIAS
+
+    def aliases_for_bbox(self, bbox):
+        """Databases that may hold rows inside (min_lat, min_lng, max_lat, max_lng)"""
+        if not sharding_active():
+            return [DEFAULT_DB_ALIAS]
+        # The default database keeps whatever no shard claims
+        return [DEFAULT_DB_ALIAS] + [
+            alias for alias, boxes in self.bboxes().items()
+            if any(_overlaps(bbox, box) for box in boxes)
+        ]
+
+    def aliases_for_area(self, latitude, longitude, radius):
+        """Databases that may hold rows within ``radius`` meters of a point"""
+        lat_delta = radius / METERS_PER_DEGREE
+        lng_delta = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        return self.aliases_for_bbox((
+            latitude - lat_delta, longitude - lng_delta,
+            latitude + lat_delta, longitude + lng_delta
+        ))
+
+    def bboxes(self):
+        if self._bboxes is None:
+            with self._lock:
+                if self._bboxes is None:
+                    self._bboxes = self._build_bboxes()
+        return self._bboxes
+
+    def _build_bboxes(self):
+        from reports.offline_geocoder import offline_geocoder
+
+        bounds = None
+        bboxes = {}
+        for alias, config in shard_config().items():
+            if config.get('bboxes'):
+                bboxes[alias] = [tuple(box) for box in config['bboxes']]
+                continue
+            if bounds is None:
+                bounds = {state.lower(): box for state, box in offline_geocoder.state_bounds().items()}
+            # A state without places would silently send its rows to the
+            # default database and leave it out of area queries
+            unknown = [state for state in config.get('states', []) if state.lower() not in bounds]
+            if unknown:
+                raise ImproperlyConfigured(
+                    f"STATE_SHARDS[{alias!r}]: no places for {', '.join(unknown)} in the offline geocoder "
+                    f"datasets; give the shard explicit 'bboxes'"
+                )
+            bboxes[alias] = [bounds[state.lower()] for state in config.get('states', [])]
+            if not bboxes[alias]:
+                logger.warning(f"Shard {alias} has no bbox; nearby queries will skip it")
+        return bboxes
+
+
+region_map = RegionMap()
+
+
+def shard_id_for_point(latitude, longitude):
+    """shard_id of the shard a point belongs to, 0 for the default database"""
+    alias = region_map.alias_for_point(latitude, longitude)
+    return shard_config().get(alias, {}).get('shard_id', 0)
+
+
+class ShardRouter:
+    """Stores SHARDED_MODELS rows on the shard of their region.
+
+    New rows go to the shard of their latitude/longitude, or to the one
+    their model's shard_alias() names when it has one. Existing rows stay
+    where their id says they live, and M2M rows and targets follow the
+    sharded row they hang off. Anything else reached from a sharded row
+    (users, alerts) is read from the default database.
+    Does nothing unless STATE_SHARDS is set.
+    """
+
+    def db_for_write(self, model, **hints):
+        if not sharding_active():
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if model in _sharded_models() and isinstance(instance, model):
+            if instance.pk is not None:
+                return alias_for_id(instance.pk)
+            if hasattr(instance, 'shard_alias'):
+                return instance.shard_alias()
+            return region_map.alias_for_point(instance.latitude, instance.longitude)
+        return self._follow(model, instance)
+
+    def db_for_read(self, model, **hints):
+        if not sharding_active():
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        return self._follow(model, instance)
+
+    def _follow(self, model, instance):
+        db = instance._state.db
+        if db in shard_config():
+            return db if shard_local(model) else DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding_active() and {obj1._state.db, obj2._state.db} <= {*shard_aliases(), 'replica'}:
+            return True
+        return None
+
+
+@receiver(post_migrate)
+def seed_id_ranges(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Start each shard's sharded tables at its id block"""
+    config = shard_config().get(using)
+    if not config:
+        return
+    connection = connections[using]
+    start = config['shard_id'] * ID_BLOCK
+    tables = {model._meta.db_table for model in apps.get_models(include_auto_created=True) if shard_local(model)}
+    existing = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        for table in sorted(tables & existing):
+            if connection.vendor == 'sqlite':
+                cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s', [start, table, start])
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                    'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                    [table, start, table]
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'SELECT setval(pg_get_serial_sequence(%s, %s), GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM "{table}")))',
+                    [table, 'id', start]
+                )
+
+
+def _row_getter(queryset):
+    """Function reading a named field from one result row, or None"""
+    iterable = queryset._iterable_class
+    fields = list(queryset._fields or [])
+    if iterable is ModelIterable:
+        attnames = {field.name: field.attname for field in queryset.model._meta.concrete_fields}
+        return lambda row, name: getattr(row, attnames.get(name, name))
+    if iterable is NamedValuesListIterable:
+        return getattr
+    if iterable is ValuesIterable:
+        return lambda row, name: row[name]
+    if iterable is ValuesListIterable:
+        return lambda row, name: row[fields.index(name)]
+    if iterable is FlatValuesListIterable:
+        return lambda row, name: row
+    return None
+
+
+def _merge_order(queryset, rows):
+    """Sort rows gathered from several shards by the queryset's ordering.
+
+    Only plain field orderings can be replayed; anything else (related
+    fields, expressions, '?') keeps the rows grouped by shard.
+    """
+    query = queryset.query
+    if query.order_by:
+        ordering = query.order_by
+    elif query.default_ordering and query.get_meta().ordering:
+        ordering = query.get_meta().ordering
+    else:
+        return rows
+
+    keys = []
+    for field in ordering:
+        if not isinstance(field, str) or field == '?' or '__' in field:
+            return rows
+        descending = field.startswith('-')
+        name = field.lstrip('-+')
+        if name == 'pk':
+            name = queryset.model._meta.pk.name
+        keys.append((name, descending != (not query.standard_ordering)))
+
+    get = _row_getter(queryset)
+    if get is None:
+        return rows
+    def sort_key(name):
+        def key(row):
+            # NULLs sort as the smallest value, as in SQLite
+            value = get(row, name)
+            return (False, 0) if value is None else (True, value)
+        return key
+
+    try:
+        for name, descending in reversed(keys):
+            rows.sort(key=sort_key(name), reverse=descending)
+    except (AttributeError, KeyError, ValueError, TypeError):
+        pass
+    return rows
+
+
+class ShardedQuerySet(models.QuerySet):
+    """QuerySet over every shard unless pinned to one with using().
+
+    Reads run once per database and are merged (ordering is replayed,
+    slices taken after the merge); count/exists/update/delete add up per
+    shard, and create/bulk_create route each object through ShardRouter.
+    With sharding off it is a plain QuerySet.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._area_aliases = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._area_aliases = self._area_aliases
+        return clone
+
+    def for_area(self, latitude, longitude, radius):
+        """Only read the shards overlapping a circle (radius in meters)"""
+        clone = self._chain()
+        clone._area_aliases = region_map.aliases_for_area(latitude, longitude, radius)
+        return clone
+
+    def for_bbox(self, bbox):
+        """Only read the shards overlapping (min_lat, min_lng, max_lat, max_lng)"""
+        clone = self._chain()
+        clone._area_aliases = region_map.aliases_for_bbox(bbox)
+        return clone
+
+    def _scatter_aliases(self):
+        if self._db is not None or not sharding_active():
+            return None
+        instance = self._hints.get('instance')
+        if instance is not None and instance._state.db in shard_config() and shard_local(self.model):
+            return [instance._state.db]
+        return self._area_aliases or shard_aliases()
+
+    def _on_shard(self, alias):
+        queryset = self.using(alias)
+        if alias != DEFAULT_DB_ALIAS and queryset.query.select_related:
+            # Related rows (users, alerts) live on the default database,
+            # so join them in with a second query instead
+            related = queryset.query.select_related
+            paths = []
+
+            def walk(tree, prefix):
+                for name, subtree in tree.items():
+                    paths.append(prefix + name)
+                    walk(subtree, prefix + name + '__')
+
+            if isinstance(related, dict):
+                walk(related, '')
+            else:
+                paths = [field.name for field in self.model._meta.concrete_fields if field.is_relation]
+            queryset = queryset.select_related(None).prefetch_related(*paths)
+        return queryset
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            aliases = self._scatter_aliases()
+            if aliases is not None:
+                self._result_cache = self._gather(aliases)
+                self._prefetch_done = True
+        super()._fetch_all()
+
+    def _gather(self, aliases):
+        low, high = self.query.low_mark, self.query.high_mark
+        rows = []
+        for alias in aliases:
+            queryset = self._on_shard(alias)
+            if self.query.is_sliced:
+                queryset.query.clear_limits()
+                queryset.query.set_limits(0, high)
+            rows.extend(queryset)
+        if len(aliases) > 1:
+            rows = _merge_order(self, rows)
+        if self.query.is_sliced:
+            rows = rows[low:high]
+        return rows
+
+    def iterator(self, chunk_size=None):
+        aliases = self._scatter_aliases()
+        if aliases is None:
+            return super().iterator(chunk_size)
+        return itertools.chain.from_iterable(self._on_shard(alias).iterator(chunk_size) for alias in aliases)
+
+    def count(self):
+        aliases = self._scatter_aliases()
+        if aliases is None or self._result_cache is not None:
+            return super().count()
+        if self.query.is_sliced:
+            return len(self)
+        return sum(self.using(alias).count() for alias in aliases)
+
+    def exists(self):
+        aliases = self._scatter_aliases()
+        if aliases is None or self._result_cache is not None:
+            return super().exists()
+        return any(self.using(alias).exists() for alias in aliases)
+
+    def aggregate(self, *args, **kwargs):
+        aliases = self._scatter_aliases()
+        if aliases is None:
+            return super().aggregate(*args, **kwargs)
+        expressions = {**{arg.default_alias: arg for arg in args}, **kwargs}
+        results = [self.using(alias).aggregate(**expressions) for alias in aliases]
+        combined = {}
+        for name, expression in expressions.items():
+            values = [result[name] for result in results if result[name] is not None]
+            if isinstance(expression, (Count, Sum)):
+                combined[name] = sum(values) if values else (0 if isinstance(expression, Count) else None)
+            elif isinstance(expression, (Max, Min)):
+                combined[name] = (max if isinstance(expression, Max) else min)(values) if values else None
+            else:
+                raise NotImplementedError(f'{type(expression).__name__} cannot be combined across shards')
+        return combined
+
+    def get(self, *args, **kwargs):
+        aliases = self._scatter_aliases()
+        pk = kwargs.get('pk', kwargs.get(self.model._meta.pk.name))
+        if aliases is not None and not args and isinstance(pk, (int, str)) and str(pk).isdigit():
+            return self.using(alias_for_id(pk)).get(**kwargs)
+        return super().get(*args, **kwargs)
+
+    def create(self, **kwargs):
+        if self._db is not None or not sharding_active():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)  # ShardRouter picks the database
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is not None or not sharding_active():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        groups = {}
+        for obj in objs:
+            groups.setdefault(router.db_for_write(self.model, instance=obj), []).append(obj)
+        for alias, group in groups.items():
+            self.using(alias).bulk_create(group, *args, **kwargs)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if self._db is not None or not sharding_active():
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        groups = {}
+        for obj in objs:
+            groups.setdefault(obj._state.db or alias_for_id(obj.pk), []).append(obj)
+        return sum(self.using(alias).bulk_update(group, fields, *args, **kwargs) for alias, group in groups.items())
+
+    def update(self, **kwargs):
+        aliases = self._scatter_aliases()
+        if aliases is None:
+            return super().update(**kwargs)
+        return sum(self.using(alias).update(**kwargs) for alias in aliases)
+
+    def delete(self):
+        aliases = self._scatter_aliases()
+        if aliases is None:
+            return super().delete()
+        total, per_model = 0, {}
+        for alias in aliases:
+            deleted, counts = self.using(alias).delete()
+            total += deleted
+            for label, count in counts.items():
+                per_model[label] = per_model.get(label, 0) + count
+        self._result_cache = None
+        return total, per_model
+
+    update.alters_data = True
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class ShardedManager(models.Manager.from_queryset(ShardedQuerySet)):
+    pass
@@ -0,0 +1,77 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Queue priorities: a worker always takes the highest-priority runnable
+# job, so SOS fan-out never waits behind bulk imports. Override with the
+# JOB_QUEUES setting.
+DEFAULT_QUEUES = {
+    'sos': 100,
+    'default': 50,
+    'imports': 10,
+}
+
+registry = {}
+
+
+def queue_priority(queue):
+    queues = getattr(settings, 'JOB_QUEUES', DEFAULT_QUEUES)
+    if queue not in queues:
+        raise ValueError(f'Unknown job queue: {queue}')
+    return queues[queue]
+
+
+class Task:
+    """A function that can run inline or be queued as a Job"""
+
+    def __init__(self, func, name, queue, priority, max_attempts):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue the task with these arguments (JSON-serializable)"""
+        return self.apply_async(args=args, kwargs=kwargs)
+
+    def apply_async(self, args=(), kwargs=None, countdown=0, priority=None):
+        from .models import Job
+
+        job = Job.objects.create(
+            task_name=self.name,
+            queue=self.queue,
+            args=list(args),
+            kwargs=kwargs or {},
+            priority=queue_priority(self.queue) + (self.priority if priority is None else priority),
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=countdown)
+        )
+        logger.debug(f"Queued {self.name} as job {job.id} on '{self.queue}'")
+        return job
+
+
+def task(func=None, *, queue='default', priority=0, max_attempts=5, name=None):
+    """Register a function as a background task.
+
+    Use as @task or @task(queue='sos', priority=10); then call
+    ``func.delay(...)`` to run it on a worker (`manage.py runworker`).
+    Tasks live in an app's tasks.py so workers find them on start-up.
+    """
+    def register(func):
+        queue_priority(queue)  # fail fast on typos
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = Task(func, task_name, queue, priority, max_attempts)
+        return registry[task_name]
+
+    if func is not None:
+        return register(func)
+    return register
@@ -0,0 +1,710 @@
+import concurrent.futures
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from urllib.parse import urlencode
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cityshield_backend import media
+from cityshield_backend.media import serve_media, signed_media_url
+from reports.models import Report
+from users.models import User
+from . import metrics, outbound, profiler
+from .db import WriteLane
+from sos.models import SOSAlert, SOSLocationUpdate
+from .management.commands.sync_replica import Command as SyncReplicaCommand
+from .metrics import FileExporter, MetricsRegistry, merge, render_prometheus
+from .models import IdempotencyRecord, Job
+from .sharding import ID_BLOCK, RegionMap, ShardedQuerySet, ShardRouter, alias_for_id
+from .routing import REPLICA_ALIAS, ReplicaRouter, _replica_reads, record_write, replica_reads, replica_usable
+from .tasks import registry, task
+from .worker import WRITE_RETRY_BASE, Worker, claim_job, requeue_stale_jobs, retry_locked, run_job
+
+SOS_URL = '/api/sos/emergency/'
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.key = uuid.uuid4().hex
+        self.body = {'latitude': 19.076, 'longitude': 72.8777, 'emergency_type': 'medical'}
+
+    def post(self, body=None, ip='10.0.0.1'):
+        return self.client.post(
+            SOS_URL, body or self.body, content_type='application/json',
+            headers={'Idempotency-Key': self.key}, REMOTE_ADDR=ip
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self.post()
+        second = self.post()
+        self.assertLess(first.status_code, 300)
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(SOSAlert.objects.count(), 1)
+
+    def test_same_key_with_different_body_is_rejected(self):
+        self.post()
+        self.assertEqual(self.post({**self.body, 'latitude': 18.5}).status_code, 422)
+
+    def test_anonymous_callers_do_not_share_keys(self):
+        self.post(ip='10.0.0.1')
+        other = self.post(ip='10.0.0.2')
+        self.assertFalse(other.has_header('Idempotent-Replayed'))
+        self.assertEqual(SOSAlert.objects.count(), 2)
+
+    def test_running_claim_gets_409(self):
+        # A record with this request's fingerprint, moved to a fresh key
+        # (the process-wide replay cache only knows the old one)
+        self.post()
+        SOSAlert.objects.all().delete()
+        self.key, key = uuid.uuid4().hex, self.key
+        IdempotencyRecord.objects.filter(key=key).update(key=self.key, status_code=None, created_at=timezone.now())
+
+        response = self.post()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(SOSAlert.objects.count(), 0)
+
+    def test_expired_claim_is_taken_over(self):
+        self.post()
+        SOSAlert.objects.all().delete()
+        self.key, key = uuid.uuid4().hex, self.key
+        IdempotencyRecord.objects.filter(key=key).update(
+            key=self.key, status_code=None, created_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        response = self.post()
+        self.assertLess(response.status_code, 300)
+        self.assertEqual(SOSAlert.objects.count(), 1)
+        self.assertIsNotNone(IdempotencyRecord.objects.get(key=self.key).status_code)
+        self.assertEqual(self.post()['Idempotent-Replayed'], 'true')
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.9')
+        self.request.user = AnonymousUser()
+        for patcher in (
+            mock.patch('core.routing.replica_configured', return_value=True),
+            mock.patch('core.routing.replica_status.synced_at', side_effect=lambda: self.synced_at),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.synced_at = time.time()
+
+    def test_fresh_replica_is_used(self):
+        self.assertTrue(replica_usable(self.request))
+
+    def test_lagging_or_unknown_replica_is_skipped(self):
+        self.synced_at = time.time() - 600
+        self.assertFalse(replica_usable(self.request))
+        self.synced_at = None
+        self.assertFalse(replica_usable(self.request))
+
+    def test_client_is_pinned_to_primary_after_a_write(self):
+        self.synced_at = time.time() - 1
+        record_write(self.request)
+        self.assertFalse(replica_usable(self.request))
+        other = RequestFactory().get('/', REMOTE_ADDR='10.0.0.10')
+        other.user = AnonymousUser()
+        self.assertTrue(replica_usable(other))
+        self.synced_at = time.time() + 1
+        self.assertTrue(replica_usable(self.request))
+
+    def test_reads_inside_the_view_go_to_the_replica(self):
+        router = ReplicaRouter()
+        seen = []
+        view = replica_reads(lambda request: seen.append(router.db_for_read(None)))
+        view(self.request)
+        self.assertEqual(seen, [REPLICA_ALIAS])
+        self.assertIsNone(router.db_for_read(None))
+        self.assertFalse(_replica_reads.get())
+
+    def test_objects_read_from_the_replica_are_written_to_the_primary(self):
+        instance = SimpleNamespace(_state=SimpleNamespace(db=REPLICA_ALIAS))
+        self.assertEqual(ReplicaRouter().db_for_write(None, instance=instance), 'default')
+
+
+class ReplicaBackupTests(SimpleTestCase):
+    def test_backup_finishes_while_the_primary_is_written(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary_path, replica_path = os.path.join(directory, 'primary.db'), os.path.join(directory, 'replica.db')
+        source = sqlite3.connect(primary_path, check_same_thread=False)
+        self.addCleanup(source.close)
+        source.execute('PRAGMA journal_mode=WAL')
+        source.execute('CREATE TABLE ping (id INTEGER PRIMARY KEY, payload TEXT)')
+        source.executemany('INSERT INTO ping (payload) VALUES (?)', [('x' * 200,)] * 50000)
+        source.commit()
+
+        stop = threading.Event()
+
+        def write():
+            writer = sqlite3.connect(primary_path)
+            while not stop.is_set():
+                writer.execute("INSERT INTO ping (payload) VALUES ('y')")
+                writer.commit()
+                stop.wait(0.002)
+            writer.close()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            primary = SimpleNamespace(ensure_connection=lambda: None, connection=source)
+            replica = SimpleNamespace(settings_dict={'NAME': replica_path})
+            SyncReplicaCommand()._backup(primary, replica)
+        finally:
+            stop.set()
+            thread.join()
+
+        copied = sqlite3.connect(replica_path)
+        self.addCleanup(copied.close)
+        self.assertGreaterEqual(copied.execute('SELECT COUNT(*) FROM ping').fetchone()[0], 50000)
+
+
+WEST = {'shard_west': {'shard_id': 1, 'states': ['Maharashtra', 'Gujarat'], 'bboxes': [[15.6, 68.1, 24.7, 80.9]]}}
+
+
+@override_settings(STATE_SHARDS=WEST)
+class ShardRoutingTests(SimpleTestCase):
+    def test_points_go_to_the_shard_of_their_state_or_bbox(self):
+        regions = RegionMap()
+        self.assertEqual(regions.alias_for_point(23.0225, 72.5714), 'shard_west')  # geocoded: Gujarat
+        self.assertEqual(regions.alias_for_point(19.0760, 72.8777), 'shard_west')  # bbox
+        self.assertEqual(regions.alias_for_point(28.6139, 77.2090), 'default')
+
+    def test_area_queries_read_the_shards_they_overlap(self):
+        regions = RegionMap()
+        self.assertEqual(regions.aliases_for_area(19.0760, 72.8777, 5000), ['default', 'shard_west'])
+        self.assertEqual(regions.aliases_for_area(28.6139, 77.2090, 5000), ['default'])
+
+    def test_new_rows_are_routed_and_ids_name_their_shard(self):
+        with mock.patch('core.sharding.region_map', RegionMap()):
+            report = Report(title='t', description='', report_type='crime', latitude=19.07, longitude=72.87)
+            self.assertEqual(ShardRouter().db_for_write(Report, instance=report), 'shard_west')
+        self.assertEqual(alias_for_id(ID_BLOCK + 5), 'shard_west')
+        self.assertEqual(alias_for_id(5), 'default')
+
+    def test_a_track_crossing_a_shard_border_stays_on_its_alerts_shard(self):
+        with mock.patch('core.sharding.region_map', RegionMap()), mock.patch('django.db.models.Model.save'):
+            mumbai = SOSAlert(latitude=19.07, longitude=72.87)
+            mumbai.save()
+            delhi = SOSAlert(latitude=28.61, longitude=77.20)
+            delhi.save()
+        self.assertEqual((mumbai.shard, delhi.shard), (1, 0))
+
+        router = ShardRouter()
+        into_delhi = SOSLocationUpdate(sos_alert=mumbai, latitude=28.61, longitude=77.20)
+        self.assertEqual(router.db_for_write(SOSLocationUpdate, instance=into_delhi), 'shard_west')
+        into_mumbai = SOSLocationUpdate(sos_alert=delhi, latitude=19.07, longitude=72.87)
+        self.assertEqual(router.db_for_write(SOSLocationUpdate, instance=into_mumbai), 'default')
+
+    def test_states_without_places_need_bboxes(self):
+        with override_settings(STATE_SHARDS={'shard_west': {'shard_id': 1, 'states': ['Maharashtra']}}):
+            with self.assertRaises(ImproperlyConfigured):
+                RegionMap().bboxes()
+        with override_settings(STATE_SHARDS={'shard_west': {'shard_id': 1, 'states': ['Gujarat']}}):
+            self.assertEqual(len(RegionMap().bboxes()['shard_west']), 1)
+
+
+class ScatterGatherTests(TestCase):
+    """Two fake shards inside the test database: odd and even ids"""
+
+    def setUp(self):
+        now = timezone.now()
+        for n, title in enumerate(['f', 'a', 'd', 'b', 'e', 'c']):
+            report = Report.objects.create(title=title, description='', report_type='crime', latitude=19.07, longitude=72.87)
+            Report.objects.filter(id=report.id).update(created_at=now - timedelta(minutes=n))
+        ids = Report.objects.values_list('id', flat=True)
+        shards = {'odd': [pk for pk in ids if pk % 2], 'even': [pk for pk in ids if not pk % 2]}
+
+        def on_shard(queryset, alias):
+            # _gather sets the shard's own limits afterwards
+            shard = queryset.using('default')
+            shard.query.clear_limits()
+            return shard.filter(id__in=shards[alias])
+
+        for patcher in (
+            mock.patch.object(ShardedQuerySet, '_scatter_aliases', lambda queryset: None if queryset._db else ['odd', 'even']),
+            mock.patch.object(ShardedQuerySet, '_on_shard', on_shard),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def expected(self, queryset):
+        return list(queryset.using('default'))
+
+    def test_merged_rows_follow_the_ordering(self):
+        self.assertEqual(list(Report.objects.all()), self.expected(Report.objects.all()))
+        self.assertEqual(
+            list(Report.objects.order_by('title').values_list('title', flat=True)), ['a', 'b', 'c', 'd', 'e', 'f']
+        )
+        self.assertEqual(list(Report.objects.order_by('-title').values('title'))[0], {'title': 'f'})
+
+    def test_slices_are_taken_after_the_merge(self):
+        self.assertEqual(list(Report.objects.order_by('title').values_list('title', flat=True)[1:4]), ['b', 'c', 'd'])
+        self.assertEqual(Report.objects.order_by('title')[2].title, 'c')
+        self.assertEqual(Report.objects.order_by('title')[4:].count(), 2)
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.reason = 'Fake'
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Answers by URL: a FakeResponse, or an exception to raise"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(url)
+        answer = self.answers[url]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+class OutboundTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        self.session = FakeSession({})
+        for patcher in (
+            mock.patch.object(outbound.client, '_resources', return_value=(self.session, executor)),
+            mock.patch.object(outbound, 'logger'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def use(self, answers, **options):
+        self.session.answers = answers
+        replaced = outbound.replaced('fake', list(answers), **{'failure_threshold': 2, **options})
+        self.upstream = replaced.__enter__()
+        self.addCleanup(replaced.__exit__, None, None, None)
+
+    def test_breaker_opens_half_opens_and_closes(self):
+        breaker = outbound.CircuitBreaker('fake', 'a', failure_threshold=2, open_seconds=60)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, outbound.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, outbound.OPEN)
+        self.assertFalse(breaker.allow())
+
+        breaker._opened_at -= 61
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, outbound.HALF_OPEN)
+        self.assertFalse(breaker.allow())  # one trial call at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, outbound.OPEN)
+
+        breaker._opened_at -= 61
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, outbound.CLOSED)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_fails_over_to_the_mirror(self):
+        self.use({'http://a/': FakeResponse(503), 'http://b/': FakeResponse(200, {'ok': True})})
+        self.assertEqual(outbound.client.get_json('fake'), {'ok': True})
+        self.assertEqual(self.upstream.breakers[0].failures, 1)
+
+    def test_rejected_request_does_not_try_mirrors(self):
+        self.use({'http://a/': FakeResponse(400), 'http://b/': FakeResponse(200, {'ok': True})})
+        with self.assertRaises(outbound.OutboundError):
+            outbound.client.get_json('fake')
+        self.assertEqual(self.session.calls, ['http://a/'])
+        self.assertEqual(self.upstream.breakers[0].state, outbound.CLOSED)
+
+    def test_open_circuit_serves_the_stale_answer(self):
+        self.use({'http://a/': FakeResponse(200, {'n': 1})})
+        self.assertEqual(outbound.client.get_json('fake', params={'q': 1}, stale=True), {'n': 1})
+        self.session.answers['http://a/'] = outbound.requests.ConnectionError('down')
+        for _ in range(2):
+            self.assertEqual(outbound.client.get_json('fake', params={'q': 1}, stale=True), {'n': 1})
+        self.assertEqual(self.upstream.breakers[0].state, outbound.OPEN)
+
+        calls = len(self.session.calls)
+        self.assertEqual(outbound.client.get_json('fake', params={'q': 1}, stale=True), {'n': 1})
+        self.assertEqual(len(self.session.calls), calls)
+        with self.assertRaises(outbound.CircuitOpen):
+            outbound.client.get_json('fake', params={'q': 2}, stale=True)
+
+    def test_spent_budget_sends_nothing(self):
+        self.use({'http://a/': FakeResponse(200, {})})
+        with outbound.budget(0.1):
+            with self.assertRaises(outbound.BudgetExhausted):
+                outbound.client.get_json('fake')
+        self.assertEqual(self.session.calls, [])
+
+
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+class WriteLaneTests(TransactionTestCase):
+    def setUp(self):
+        self.lane = WriteLane(max_batch=50)
+
+    def create(self, latitude):
+        return SOSAlert.objects.create(latitude=latitude, longitude=72.8777).id
+
+    def fail(self):
+        SOSAlert.objects.create(latitude=1, longitude=1)
+        raise IntegrityError('boom')
+
+    def test_writes_run_on_the_lane_thread_and_commit(self):
+        threads = []
+        ident = self.lane.run(lambda: threads.append(threading.current_thread().name) or self.create(19.0))
+        self.assertEqual(threads, ['write-lane-default'])
+        self.assertTrue(SOSAlert.objects.filter(id=ident).exists())
+
+    def test_a_failing_write_does_not_undo_its_batch(self):
+        self.lane.run(lambda: None)  # start the thread
+        gate = threading.Event()
+        self.lane.submit(gate.wait)
+        futures = [self.lane.submit(self.create, 19.0 + n) for n in range(3)]
+        failing = self.lane.submit(self.fail)
+        gate.set()
+
+        self.assertEqual(len({future.result(timeout=5) for future in futures}), 3)
+        with self.assertRaises(IntegrityError):
+            failing.result(timeout=5)
+        self.assertEqual(SOSAlert.objects.count(), 3)
+
+    def test_writes_inside_a_transaction_run_inline(self):
+        with transaction.atomic():
+            self.lane.run(self.create, 19.0)
+        self.assertIsNone(self.lane._thread)
+
+
+def register_task(func, **options):
+    """Register func as a task named after this module"""
+    return task(func, name=f'core.tests.{func.__name__}', **options)
+
+
+class JobQueueTests(TestCase):
+    def register(self, func, **options):
+        registered = register_task(func, **options)
+        self.addCleanup(registry.pop, registered.name)
+        return registered
+
+    def test_higher_priority_queues_are_claimed_first(self):
+        def bulk():
+            pass
+
+        def fan_out():
+            pass
+
+        imports = self.register(bulk, queue='imports').delay()
+        sos = self.register(fan_out, queue='sos').delay()
+        self.assertEqual(claim_job('w').id, sos.id)
+        self.assertEqual(claim_job('w').id, imports.id)
+        self.assertIsNone(claim_job('w'))
+
+    def test_countdown_delays_the_job(self):
+        def later():
+            pass
+
+        self.register(later).apply_async(countdown=60)
+        self.assertIsNone(claim_job('w'))
+
+    def test_unknown_queue_is_rejected(self):
+        with self.assertRaises(ValueError):
+            task(lambda: None, queue='nope')
+
+    def test_failures_back_off_then_fail(self):
+        def flaky():
+            raise RuntimeError('down')
+
+        job = self.register(flaky, max_attempts=2).delay()
+        with self.assertLogs('core.worker', 'WARNING'):
+            self.assertFalse(run_job(claim_job('w')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('RuntimeError: down', job.last_error)
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        with self.assertLogs('core.worker', 'ERROR'):
+            self.assertFalse(run_job(claim_job('w')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_outcome_is_recorded_once_the_lock_clears(self):
+        def quick():
+            pass
+
+        job = self.register(quick).delay()
+        claimed = claim_job('w')
+        update = QuerySet.update
+        failures = iter([OperationalError('database table is locked: core_job')])
+
+        def locked_once(queryset, **fields):
+            error = next(failures, None)
+            if error is not None:
+                raise error
+            return update(queryset, **fields)
+
+        with mock.patch.object(QuerySet, 'update', locked_once), mock.patch('core.worker.time.sleep') as sleep:
+            self.assertTrue(run_job(claimed))
+        sleep.assert_called_once_with(WRITE_RETRY_BASE)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+    @override_settings(JOB_LOCK_TIMEOUT=timedelta(0))
+    def test_lock_that_outlasts_the_retries_is_raised(self):
+        write = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            retry_locked(write, 'a write')
+        write.assert_called_once_with()
+
+    def test_stale_running_jobs_are_requeued(self):
+        def stuck():
+            pass
+
+        job = self.register(stuck).delay()
+        claim_job('w')
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(claim_job('w').id, job.id)
+
+
+class WorkerTests(TransactionTestCase):
+    def test_run_once_drains_the_queue(self):
+        seen = []
+
+        def record(n):
+            seen.append(n)
+
+        registered = register_task(record)
+        self.addCleanup(registry.pop, registered.name)
+        for n in range(5):
+            registered.delay(n)
+
+        # One thread, so claims and outcome writes never contend for the lock
+        Worker(concurrency=1, poll_interval=0.01).run(once=True)
+        self.assertEqual(sorted(seen), list(range(5)))
+        self.assertEqual(Job.objects.filter(status='done').count(), 5)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        # Cached responses make no queries
+        cache.clear()
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+
+    def series(self, name, **labels):
+        return merge([metrics.registry.snapshot()]).get((name, tuple(sorted(labels.items()))))
+
+    def test_histograms_render_cumulative_buckets(self):
+        worker = MetricsRegistry()
+        for value in (0.003, 0.02, 60):
+            worker.observe('http_request_duration_seconds', {'view': 'v'}, value)
+        text = render_prometheus(merge([worker.snapshot()]))
+        self.assertIn('cityshield_http_request_duration_seconds_bucket{view="v",le="0.005"} 1\n', text)
+        self.assertIn('cityshield_http_request_duration_seconds_bucket{view="v",le="0.025"} 2\n', text)
+        self.assertIn('cityshield_http_request_duration_seconds_bucket{view="v",le="+Inf"} 3\n', text)
+        self.assertIn('cityshield_http_request_duration_seconds_count{view="v"} 3\n', text)
+
+    def test_merge_adds_counters_and_keeps_the_worst_gauge(self):
+        labels = [['service', 'overpass']]
+        merged = merge([
+            [['outbound_requests_total', labels, 2], ['outbound_circuit_state', labels, 0]],
+            [['outbound_requests_total', labels, 3], ['outbound_circuit_state', labels, 2]],
+        ])
+        key = (('service', 'overpass'),)
+        self.assertEqual(merged[('outbound_requests_total', key)], 5)
+        self.assertEqual(merged[('outbound_circuit_state', key)], 2)
+
+    def test_middleware_records_each_view(self):
+        self.client.get('/api/safety/police-stations/')
+        self.assertEqual(
+            self.series('http_requests_total', view='list_police_stations', method='GET', status='2xx'), 1
+        )
+        queries = self.series('db_queries_per_request', view='list_police_stations')
+        self.assertEqual(queries[-1], 1)
+        self.assertGreater(queries[-2], 0)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('core.metrics.slow', 'WARNING') as logs:
+            self.client.get('/api/safety/police-stations/')
+        self.assertIn('Slow request GET /api/safety/police-stations/ (list_police_stations) 200', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_scrape_needs_the_token(self):
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+        response = self.client.get('/api/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE cityshield_http_requests_total counter', response.content)
+
+    def test_scrape_adds_up_worker_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        labels = [['endpoint', 'a'], ['outcome', 'ok'], ['service', 'overpass']]
+        gauge = [['endpoint', 'a'], ['service', 'overpass']]
+        for pid, age in ((1, 0), (2, 3600)):
+            path = os.path.join(directory, f'{pid}.json')
+            with open(path, 'w') as f:
+                json.dump([['outbound_requests_total', labels, 2], ['outbound_circuit_state', gauge, pid]], f)
+            os.utime(path, (time.time() - age, time.time() - age))
+
+        worker = MetricsRegistry()
+        worker.inc('outbound_requests_total', dict(labels))
+        with override_settings(METRICS_DIR=directory):
+            merged = FileExporter(worker).collect()
+        self.assertEqual(merged[('outbound_requests_total', tuple(map(tuple, labels)))], 5)
+        # The exited worker's gauge is left out
+        self.assertEqual(merged[('outbound_circuit_state', tuple(map(tuple, gauge)))], 1)
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(PROFILER_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(self.finish)
+
+    def finish(self):
+        session = profiler.current()
+        if session is not None:
+            session.stop()
+            session._thread.join(5)
+
+    def serve(self, middleware, path):
+        return middleware(RequestFactory().get(path))
+
+    def test_views_match_by_any_name(self):
+        path = '/api/safety/police-stations/'
+        for view in ('list_police_stations', 'safety.views.list_police_stations'):
+            self.assertTrue(profiler.view_matches(view, path))
+        self.assertFalse(profiler.view_matches('get_hospital', path))
+        self.assertFalse(profiler.view_matches('list_police_stations', '/nowhere/'))
+
+    def test_samples_only_the_requested_view(self):
+        def slow_view(request):
+            time.sleep(0.05)
+            return HttpResponse()
+
+        middleware = profiler.ProfilerMiddleware(slow_view)
+        session = profiler.arm(10, view='list_police_stations', requests=2, interval_ms=1)
+        self.assertIsNone(profiler.arm(10))
+        self.serve(middleware, '/api/safety/hospitals/')
+        self.serve(middleware, '/api/safety/police-stations/')
+        self.serve(middleware, '/api/safety/police-stations/')
+        session._thread.join(5)
+
+        self.assertIsNone(profiler.current())
+        meta, stacks = profiler.load(session.id)
+        self.assertEqual((meta['status'], meta['profiled_requests']), ('done', 2))
+        self.assertGreater(meta['samples'], 0)
+        self.assertTrue(all('slow_view' in line for line in stacks.splitlines()))
+
+    def test_profile_api(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='citizen', email='citizen@example.com'))
+        self.assertEqual(client.post('/api/profile', {'seconds': 5}, format='json').status_code, 403)
+
+        client.force_authenticate(User.objects.create(username='admin', email='admin@example.com', role='admin'))
+        self.assertEqual(client.post('/api/profile', {}, format='json').status_code, 400)
+        self.assertEqual(client.post('/api/profile', {'seconds': 5, 'interval_ms': 0}, format='json').status_code, 400)
+
+        started = client.post('/api/profile', {'seconds': 5}, format='json')
+        self.assertEqual(started.status_code, 202)
+        self.assertEqual(client.post('/api/profile', {'seconds': 5}, format='json').status_code, 409)
+        result_url = f'/api/profile/{started.data["id"]}'
+        self.assertEqual(client.get(result_url).status_code, 202)
+        self.assertEqual(client.delete(result_url).status_code, 202)
+        self.finish()
+        self.assertEqual(client.get(result_url).status_code, 200)
+        self.assertEqual(client.get('/api/profile/not-an-id').status_code, 404)
+
+
+class MediaTests(SimpleTestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, MEDIA_ACCEL=None)
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(self.media, 'sos_videos'))
+        with open(os.path.join(self.media, 'sos_videos', 'clip one.webm'), 'wb') as f:
+            f.write(b'webm bytes')
+        self.name = 'sos_videos/clip one.webm'
+
+    def test_signed_url_serves_the_file(self):
+        response = self.client.get(signed_media_url(self.name))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'webm bytes')
+
+    def test_tampered_signature_is_rejected(self):
+        url = signed_media_url(self.name)
+        self.assertEqual(self.client.get(url[:-1] + ('0' if url[-1] != '0' else '1')).status_code, 403)
+        # A signature is only good for the file it was made for
+        self.assertEqual(self.client.get(url.replace('clip%20one', 'other')).status_code, 403)
+
+    def test_expired_signature_is_rejected(self):
+        url = signed_media_url(self.name)
+        with mock.patch('cityshield_backend.media.time.time', return_value=time.time() + 3600):
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+        expires = int(time.time()) - 1
+        query = urlencode({'expires': expires, 'sig': media._signature(self.name, expires)})
+        self.assertEqual(self.client.get(f"{reverse('protected_media', args=[self.name])}?{query}").status_code, 403)
+
+    def test_paths_outside_media_root_are_refused(self):
+        with open(os.path.join(os.path.dirname(self.media), 'secret.txt'), 'w') as f:
+            f.write('secret')
+        self.addCleanup(os.remove, os.path.join(os.path.dirname(self.media), 'secret.txt'))
+
+        name = 'sos_videos/../../secret.txt'
+        expires = int(time.time()) + 60
+        query = urlencode({'expires': expires, 'sig': media._signature('../secret.txt', expires)})
+        self.assertEqual(self.client.get(f'/api/media/{name}?{query}').status_code, 404)
+        with self.assertRaises(Http404):
+            serve_media(RequestFactory().get('/'), '../secret.txt')
+
+    def test_nginx_gets_the_file_through_x_accel_redirect(self):
+        with override_settings(MEDIA_ACCEL='nginx'):
+            response = self.client.get(signed_media_url(self.name))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/sos_videos/clip%20one.webm')
+        self.assertEqual(response['Content-Type'], 'video/webm')
+        self.assertEqual(response.content, b'')
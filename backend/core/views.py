@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from . import profiler
+from .metrics import CONTENT_TYPE, exporter, render_prometheus
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, summed over every worker sharing METRICS_DIR"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(exporter.collect()), content_type=CONTENT_TYPE)
+
+
+def _is_admin(user):
+    return user.role == 'admin' or user.is_superuser
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def start_profile(request):
+    """Arm the stack sampler in the worker serving this request.
+
+    Body: ``seconds`` to sample every request for that long, and/or
+    ``view`` plus ``requests`` to sample the next N requests to that view
+    (``seconds`` then caps the wait). Only this worker is sampled.
+    """
+    if not _is_admin(request.user):
+        return Response({'error': 'Admin access required'}, status=403)
+
+    try:
+        seconds = float(request.data['seconds']) if request.data.get('seconds') is not None else None
+        requests = int(request.data['requests']) if request.data.get('requests') is not None else None
+        interval_ms = float(request.data.get('interval_ms', profiler.DEFAULT_INTERVAL_MS))
+    except (TypeError, ValueError):
+        return Response({'error': 'seconds, requests and interval_ms must be numbers'}, status=400)
+    view = request.data.get('view') or None
+
+    if seconds is None and requests is None:
+        return Response({'error': 'Give seconds, or view and requests'}, status=400)
+    if seconds is not None and not 0 < seconds <= profiler.MAX_SECONDS:
+        return Response({'error': f'seconds must be between 0 and {profiler.MAX_SECONDS}'}, status=400)
+    if requests is not None and not 0 < requests <= profiler.MAX_REQUESTS:
+        return Response({'error': f'requests must be between 1 and {profiler.MAX_REQUESTS}'}, status=400)
+    if not profiler.MIN_INTERVAL_MS <= interval_ms <= profiler.MAX_INTERVAL_MS:
+        return Response({
+            'error': f'interval_ms must be between {profiler.MIN_INTERVAL_MS} and {profiler.MAX_INTERVAL_MS}'
+        }, status=400)
+
+    session = profiler.arm(
+        seconds or profiler.DEFAULT_REQUEST_TIMEOUT, view=view, requests=requests,
+        interval_ms=interval_ms, started_by=request.user.email
+    )
+    if session is None:
+        return Response({
+            'error': 'A profile is already running in this worker',
+            'id': profiler.current().id if profiler.current() else None,
+        }, status=409)
+    return Response({
+        **session.meta('running'),
+        'result_url': request.build_absolute_uri(reverse('profile_result', args=[session.id])),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def profile_result(request, profile_id):
+    """Collapsed stacks of a finished profile (202 while it runs); DELETE stops it early"""
+    if not _is_admin(request.user):
+        return Response({'error': 'Admin access required'}, status=403)
+
+    if request.method == 'DELETE':
+        session = profiler.current()
+        if session is None or session.id != profile_id:
+            return Response({'error': 'Profile is not running in this worker'}, status=404)
+        session.stop()
+        return Response({'id': profile_id, 'status': 'stopping'}, status=status.HTTP_202_ACCEPTED)
+
+    saved = profiler.load(profile_id)
+    if saved is None:
+        return Response({'error': 'Profile not found'}, status=404)
+    meta, stacks = saved
+    if stacks is None:
+        return Response(meta, status=status.HTTP_202_ACCEPTED)
+    response = HttpResponse(stacks, content_type='text/plain; charset=utf-8')
+    response['X-Profile-Samples'] = meta['samples']
+    response['X-Profile-Requests'] = meta['profiled_requests']
+    return response
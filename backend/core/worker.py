@@ -0,0 +1,203 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+from .tasks import registry
+
+logger = logging.getLogger(__name__)
+
+# Retry delay is BACKOFF_BASE * 2**(attempt - 1) seconds, capped, plus jitter
+BACKOFF_BASE = 5
+BACKOFF_CAP = 3600
+# A running job whose worker hasn't finished it in this long is requeued
+DEFAULT_LOCK_TIMEOUT = timedelta(minutes=15)
+# Finished jobs are deleted after this long
+DEFAULT_JOB_RETENTION = timedelta(days=7)
+MAINTENANCE_INTERVAL = 60  # seconds
+# Recording a job's outcome is retried while the database is locked, with
+# this backoff, for up to half the lock timeout so it lands before the
+# stale-job sweep would run the job again
+WRITE_RETRY_BASE = 0.05
+WRITE_RETRY_CAP = 5
+
+
+def retry_delay(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_CAP)
+    return delay + random.uniform(0, delay / 4)
+
+
+def lock_timeout():
+    return getattr(settings, 'JOB_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+
+
+def retry_locked(write, what):
+    """Run a small write, retrying with backoff while the database is locked"""
+    deadline = time.monotonic() + lock_timeout().total_seconds() / 2
+    delay = WRITE_RETRY_BASE
+    while True:
+        try:
+            return write()
+        except OperationalError as e:
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.info(f"Retrying {what} in {delay:.2f}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, WRITE_RETRY_CAP)
+
+
+def _runnable(queues):
+    jobs = Job.objects.filter(status='queued', run_at__lte=timezone.now())
+    if queues:
+        jobs = jobs.filter(queue__in=queues)
+    return jobs.order_by('-priority', 'run_at', 'id')
+
+
+def claim_job(worker_id, queues=None):
+    """Atomically take the next runnable job, or return None.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED where the database supports it;
+    on SQLite, a conditional UPDATE on status does the claim instead and
+    the loser of a race simply tries the next candidate.
+    """
+    claim = {
+        'status': 'running',
+        'locked_by': worker_id,
+        'locked_at': timezone.now(),
+        'attempts': F('attempts') + 1
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _runnable(queues).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.filter(id=job.id).update(**claim)
+    else:
+        for job_id in _runnable(queues).values_list('id', flat=True)[:10]:
+            if Job.objects.filter(id=job_id, status='queued').update(**claim):
+                break
+        else:
+            return None
+        job = Job(id=job_id)
+
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome"""
+    task = registry.get(job.task_name)
+    try:
+        if task is None:
+            raise LookupError(f'No task registered as {job.task_name}')
+        task(*job.args, **job.kwargs)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}\n{traceback.format_exc()}'
+        if job.attempts < job.max_attempts and task is not None:
+            delay = retry_delay(job.attempts)
+            _record(
+                job,
+                status='queued',
+                run_at=timezone.now() + timedelta(seconds=delay),
+                locked_by='',
+                locked_at=None,
+                last_error=error
+            )
+            logger.warning(f"Job {job.id} ({job.task_name}) failed, retry {job.attempts}/{job.max_attempts} in {delay:.0f}s: {e}")
+        else:
+            _record(job, status='failed', finished_at=timezone.now(), last_error=error)
+            logger.error(f"Job {job.id} ({job.task_name}) failed permanently: {e}")
+        return False
+
+    _record(job, status='done', finished_at=timezone.now())
+    return True
+
+
+def _record(job, **fields):
+    # The task has run by now; losing this write would leave the job
+    # 'running' until the stale-job sweep runs it a second time
+    retry_locked(lambda: Job.objects.filter(id=job.id).update(**fields), f'recording job {job.id}')
+
+
+def requeue_stale_jobs():
+    """Requeue jobs left running by a worker that died"""
+    return Job.objects.filter(
+        status='running',
+        locked_at__lt=timezone.now() - lock_timeout()
+    ).update(status='queued', locked_by='', locked_at=None)
+
+
+def purge_finished_jobs():
+    retention = getattr(settings, 'JOB_RETENTION', DEFAULT_JOB_RETENTION)
+    deleted, _ = Job.objects.filter(
+        status__in=['done', 'failed'],
+        finished_at__lt=timezone.now() - retention
+    ).delete()
+    return deleted
+
+
+class Worker:
+    """Polls the Job table and runs jobs on a thread pool"""
+
+    def __init__(self, concurrency=4, queues=None, poll_interval=1.0):
+        self.concurrency = concurrency
+        self.queues = queues
+        self.poll_interval = poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._slots = threading.Semaphore(concurrency)
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run_and_release(self, job):
+        try:
+            run_job(job)
+        except Exception as e:
+            logger.error(f"Error recording outcome of job {job.id}: {str(e)}")
+        finally:
+            close_old_connections()
+            self._slots.release()
+
+    def _maintenance(self):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale jobs")
+        purge_finished_jobs()
+
+    def run(self, once=False):
+        """Work until stop() (or, with once, until no job is runnable)"""
+        autodiscover_modules('tasks')
+        logger.info(f"Worker {self.worker_id} started: {self.concurrency} threads, queues {self.queues or 'all'}")
+
+        last_maintenance = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job') as pool:
+            while not self._stopping.is_set():
+                if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                    self._maintenance()
+                    last_maintenance = time.monotonic()
+
+                self._slots.acquire()
+                job = retry_locked(lambda: claim_job(self.worker_id, self.queues), 'claiming a job')
+                if job is None:
+                    self._slots.release()
+                    if once:
+                        break
+                    self._stopping.wait(self.poll_interval)
+                    continue
+                pool.submit(self._run_and_release, job)
+        close_old_connections()
+        logger.info(f"Worker {self.worker_id} stopped")
@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from sos.models import SOSAlert
+from sos.spatial import GridIndex
+from .models import PatrolTeam, SOSResponse
+
+logger = logging.getLogger(__name__)
+
+# Teams still pointing at a resolved SOS (e.g. resolved with a bulk update,
+# which sends no signal) count as free
+FREE = Q(current_sos__isnull=True) | Q(current_sos__is_active=False)
+
+
+class SOSNotActive(Exception):
+    """The SOS was resolved before a team could be assigned to it"""
+
+
+def is_free(team):
+    return team.current_sos_id is None or not team.current_sos.is_active
+
+
+class TeamIndex:
+    """Positions of active patrol teams not assigned to an active SOS.
+
+    Team saves update the index through model signals (see police/signals.py)
+    and claims made with a conditional UPDATE remove the team directly. Like
+    the volunteer index it is per-process, so it is re-synced from the DB
+    every PATROL_TEAM_INDEX_RESYNC_SECONDS.
+    """
+
+    def __init__(self):
+        self.grid = GridIndex(cell_size=getattr(settings, 'PATROL_TEAM_INDEX_CELL_SIZE', 0.02))
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def resync_interval(self):
+        return getattr(settings, 'PATROL_TEAM_INDEX_RESYNC_SECONDS', 30)
+
+    def warm(self):
+        """Rebuild the index from PatrolTeam rows"""
+        with self._lock:
+            rows = PatrolTeam.objects.filter(
+                FREE,
+                is_active=True,
+                current_latitude__isnull=False,
+                current_longitude__isnull=False
+            ).values_list('id', 'current_latitude', 'current_longitude')
+
+            now = time.time()
+            self.grid.replace_all((team_id, lat, lng, now) for team_id, lat, lng in rows)
+            self._synced_at = time.monotonic()
+        logger.info(f"Patrol team index warmed with {len(self.grid)} free teams")
+
+    def ensure_warm(self):
+        synced_at = self._synced_at
+        if synced_at is None or time.monotonic() - synced_at > self.resync_interval:
+            self.warm()
+
+    def update(self, team):
+        """Reflect a saved PatrolTeam in the index"""
+        if (team.is_active
+                and team.current_sos_id is None
+                and team.current_latitude is not None
+                and team.current_longitude is not None):
+            self.grid.upsert(team.id, team.current_latitude, team.current_longitude)
+        else:
+            self.grid.remove(team.id)
+
+    def remove(self, team_id):
+        self.grid.remove(team_id)
+
+    def nearest(self, latitude, longitude, k, max_radius=50000):
+        """Up to k (team_id, distance) pairs, nearest first"""
+        self.ensure_warm()
+        return self.grid.nearest(latitude, longitude, k, max_radius=max_radius)
+
+
+team_index = TeamIndex()
+
+
+def suggest_teams(latitude, longitude, k=5):
+    """The k nearest free teams as (team, distance) pairs, nearest first"""
+    matches = team_index.nearest(latitude, longitude, k)
+    teams = PatrolTeam.objects.select_related('station', 'current_sos').in_bulk([team_id for team_id, _ in matches])
+
+    suggestions = []
+    for team_id, distance in matches:
+        team = teams.get(team_id)
+        if team is None:
+            team_index.remove(team_id)
+            continue
+        if not team.is_active or not is_free(team):
+            # Claimed or deactivated by another worker since the last sync
+            team_index.update(team)
+            continue
+        suggestions.append((team, distance))
+    return suggestions
+
+
+def assign_team(sos_alert, team):
+    """Atomically claim a team for an SOS and record the assignment.
+
+    The claim is a conditional UPDATE that only succeeds while the team is
+    active and free (or already on this SOS), so two dispatchers can't both
+    get the same team. Returns the SOSResponse, or None if the team was
+    taken; raises SOSNotActive if the SOS has been resolved, since nothing
+    would free a team assigned to it.
+    """
+    with transaction.atomic():
+        if not SOSAlert.objects.filter(id=sos_alert.id, is_active=True).exists():
+            raise SOSNotActive(f'SOS {sos_alert.id} is no longer active')
+        claimed = PatrolTeam.objects.filter(
+            FREE | Q(current_sos=sos_alert),
+            id=team.id,
+            is_active=True
+        ).update(current_sos=sos_alert)
+        if not claimed:
+            return None
+        team.current_sos = sos_alert
+
+        sos_response, created = SOSResponse.objects.select_for_update().get_or_create(
+            sos_alert=sos_alert,
+            defaults={
+                'assigned_team': team,
+                'status': 'assigned'
+            }
+        )
+        if not created and sos_response.assigned_team_id != team.id:
+            previous_team_id = sos_response.assigned_team_id
+            sos_response.assigned_team = team
+            sos_response.save()
+            release_team(previous_team_id, sos_alert.id)
+
+        transaction.on_commit(lambda: team_index.remove(team.id))
+    return sos_response
+
+
+def auto_assign_team(sos_alert, candidates=5):
+    """Assign the nearest free team; returns (team, distance, response) or None"""
+    for team, distance in suggest_teams(sos_alert.latitude, sos_alert.longitude, candidates):
+        sos_response = assign_team(sos_alert, team)
+        if sos_response is not None:
+            return team, distance, sos_response
+        logger.info(f"Team {team.team_id} was claimed concurrently, trying next nearest for SOS {sos_alert.id}")
+    return None
+
+
+def release_team(team_id, sos_id):
+    """Free a team if it's still on the given SOS"""
+    team = PatrolTeam.objects.filter(id=team_id, current_sos_id=sos_id).first()
+    if team is not None:
+        team.current_sos = None
+        team.save(update_fields=['current_sos'])
+
+
+def release_teams_for_sos(sos_id):
+    """Free every team still assigned to an SOS (after it is resolved)"""
+    for team in PatrolTeam.objects.filter(current_sos_id=sos_id):
+        team.current_sos = None
+        team.save(update_fields=['current_sos'])
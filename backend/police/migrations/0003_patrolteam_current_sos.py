@@ -0,0 +1,31 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_busy_teams(apps, schema_editor):
+    """Carry over existing assignments to still-active SOS alerts"""
+    PatrolTeam = apps.get_model('police', 'PatrolTeam')
+    SOSResponse = apps.get_model('police', 'SOSResponse')
+
+    assignments = SOSResponse.objects.filter(
+        sos_alert__is_active=True
+    ).order_by('created_at').values_list('assigned_team_id', 'sos_alert_id')
+    for team_id, sos_id in assignments:
+        PatrolTeam.objects.filter(id=team_id).update(current_sos_id=sos_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('police', '0002_patrolteam_members'),
+        ('sos', '0007_soslocationupdate_sos_alert_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patrolteam',
+            name='current_sos',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='busy_teams', to='sos.sosalert'),
+        ),
+        migrations.RunPython(mark_busy_teams, migrations.RunPython.noop),
+    ]
@@ -23,6 +23,14 @@ class PatrolTeam(models.Model):
     is_active = models.BooleanField(default=True)
     current_latitude = models.FloatField(null=True, blank=True)
     current_longitude = models.FloatField(null=True, blank=True)
+    # Active SOS the team is handling; null means free for dispatch
+    current_sos = models.ForeignKey(
+        SOSAlert,
+        on_delete=models.SET_NULL,
+        related_name='busy_teams',
+        null=True,
+        blank=True
+    )
     
     def __str__(self):
         return f"{self.team_id} - {self.station.name}"
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from sos.models import SOSAlert
+from .dispatch import release_teams_for_sos, team_index
+from .models import PatrolTeam
+
+
+@receiver(post_save, sender=PatrolTeam)
+def update_team_index(sender, instance, **kwargs):
+    """Keep the free-team index in step with status/location/assignment writes"""
+    team_index.update(instance)
+
+
+@receiver(post_delete, sender=PatrolTeam)
+def remove_from_team_index(sender, instance, **kwargs):
+    team_index.remove(instance.id)
+
+
+@receiver(post_save, sender=SOSAlert)
+def free_teams_on_resolve(sender, instance, created, **kwargs):
+    """Make teams dispatchable again once their SOS is no longer active"""
+    if not created and not instance.is_active:
+        release_teams_for_sos(instance.id)
@@ -1,3 +1,68 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from safety.models import PoliceStation
+from sos.models import SOSAlert
+from users.models import User
+from .dispatch import SOSNotActive, assign_team, auto_assign_team, suggest_teams, team_index
+from .models import PatrolTeam, SOSResponse
+
+
+class DispatchTests(TestCase):
+    def setUp(self):
+        self.officer = User.objects.create(username='cop@x.com', email='cop@x.com', role='police')
+        station = PoliceStation.objects.create(name='Colaba', latitude=18.9067, longitude=72.8147)
+        self.near = PatrolTeam.objects.create(
+            team_id='PT-1', station=station, team_leader=self.officer, current_latitude=19.0761, current_longitude=72.8777
+        )
+        self.far = PatrolTeam.objects.create(
+            team_id='PT-2', station=station, team_leader=self.officer, current_latitude=19.1200, current_longitude=72.8777
+        )
+        self.sos = SOSAlert.objects.create(latitude=19.0760, longitude=72.8777)
+        team_index.warm()
+
+    def test_suggest_teams_nearest_first(self):
+        self.assertEqual([team.team_id for team, _ in suggest_teams(19.0760, 72.8777)], ['PT-1', 'PT-2'])
+
+    def test_claimed_team_cannot_be_taken_by_another_sos(self):
+        self.assertIsNotNone(assign_team(self.sos, self.near))
+        other = SOSAlert.objects.create(latitude=19.0760, longitude=72.8777)
+        self.assertIsNone(assign_team(other, PatrolTeam.objects.get(id=self.near.id)))
+        team, _, _ = auto_assign_team(other)
+        self.assertEqual(team.team_id, 'PT-2')
+
+    def test_reassignment_releases_previous_team(self):
+        assign_team(self.sos, self.near)
+        assign_team(self.sos, self.far)
+        self.near.refresh_from_db()
+        self.assertIsNone(self.near.current_sos_id)
+        self.assertEqual(SOSResponse.objects.get(sos_alert=self.sos).assigned_team_id, self.far.id)
+
+    def test_resolving_frees_teams(self):
+        assign_team(self.sos, self.near)
+        self.sos.is_active = False
+        self.sos.save()
+        self.near.refresh_from_db()
+        self.assertIsNone(self.near.current_sos_id)
+
+    def test_inactive_sos_is_rejected(self):
+        SOSAlert.objects.filter(id=self.sos.id).update(is_active=False)
+        with self.assertRaises(SOSNotActive):
+            assign_team(self.sos, self.near)
+        self.near.refresh_from_db()
+        self.assertIsNone(self.near.current_sos_id)
+
+    def test_team_left_on_resolved_sos_is_claimable(self):
+        assign_team(self.sos, self.near)
+        SOSAlert.objects.filter(id=self.sos.id).update(is_active=False)
+        other = SOSAlert.objects.create(latitude=19.0760, longitude=72.8777)
+        team_index.warm()
+        self.assertEqual(suggest_teams(19.0760, 72.8777)[0][0].team_id, 'PT-1')
+        self.assertIsNotNone(assign_team(other, PatrolTeam.objects.get(id=self.near.id)))
+
+    def test_assign_view_rejects_resolved_sos(self):
+        SOSAlert.objects.filter(id=self.sos.id).update(is_active=False)
+        client = APIClient()
+        client.force_authenticate(self.officer)
+        response = client.post(f'/api/police/sos-alerts/{self.sos.id}/assign-team/', {'team_id': self.near.id}, format='json')
+        self.assertEqual(response.status_code, 400)
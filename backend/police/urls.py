@@ -9,6 +9,7 @@ urlpatterns = [
     path('sos-alerts/', views.police_sos_alerts, name='police_sos_alerts'),
     path('all-reports/', views.all_reports_combined, name='all_reports_combined'),
     path('sos-alerts/<int:sos_id>/assign-team/', views.assign_team_to_sos, name='assign_team_to_sos'),
+    path('sos-alerts/<int:sos_id>/suggested-teams/', views.suggested_teams_for_sos, name='suggested_teams_for_sos'),
     path('volunteers/', views.police_volunteers, name='police_volunteers'),
     path('official-alerts/', views.release_official_alert, name='release_official_alert'),
     
@@ -45,7 +45,7 @@ def filter_reports_nearby(latitude, longitude, radius_km=5):
     """Filter incident reports within specified radius"""
     bbox = get_bounding_box(latitude, longitude, radius_km)
     
-    return Report.objects.filter(
+    return Report.objects.for_area(latitude, longitude, radius_km * 1000).filter(
         latitude__gte=bbox['min_lat'],
         latitude__lte=bbox['max_lat'],
         longitude__gte=bbox['min_lon'],
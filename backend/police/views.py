@@ -6,10 +6,13 @@ from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.db.models import Count, Avg
+from core.db import write_lane
+from core.routing import replica_reads
 from .utils import filter_emergencies_nearby, filter_reports_nearby
 from reports.models import Report
 from sos.models import SOSAlert, Volunteer, VolunteerAlert
 from .models import PatrolTeam, OfficialAlert, SOSResponse
+from .dispatch import SOSNotActive, assign_team, auto_assign_team, suggest_teams
 from .serializers import *
 import math
 
@@ -294,6 +297,7 @@ def police_sos_alerts(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def all_reports_combined(request):
     """Get all SOS alerts and incident reports combined with location filtering"""
     if request.user.role != 'police':
@@ -478,7 +482,7 @@ def update_team_location(request, team_id):
     try:
         team.current_latitude = float(latitude)
         team.current_longitude = float(longitude)
-        team.save()
+        write_lane.run(team.save, update_fields=['current_latitude', 'current_longitude'])
         
         return Response({
             'message': f'Location updated for team {team.team_id}',
@@ -532,45 +536,84 @@ def patrol_teams_list(request):
         'total_count': teams.count()
     })
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def suggested_teams_for_sos(request, sos_id):
+    """Nearest free patrol teams for an SOS alert"""
+    if request.user.role != 'police':
+        return Response({'error': 'Police access required'}, status=403)
+
+    sos_alert = get_object_or_404(SOSAlert, id=sos_id)
+
+    try:
+        k = min(max(int(request.GET.get('k', 5)), 1), 20)
+    except (ValueError, TypeError):
+        return Response({'error': 'k must be an integer'}, status=400)
+
+    suggestions = suggest_teams(sos_alert.latitude, sos_alert.longitude, k)
+
+    return Response({
+        'sos_id': sos_alert.id,
+        'results': [
+            {
+                'id': team.id,
+                'team_id': team.team_id,
+                'station_name': team.station.name,
+                'vehicle_number': team.vehicle_number,
+                'current_latitude': team.current_latitude,
+                'current_longitude': team.current_longitude,
+                'distance': round(distance, 1)
+            }
+            for team, distance in suggestions
+        ]
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def assign_team_to_sos(request, sos_id):
-    """Assign patrol team to SOS alert with availability check"""
+    """Assign patrol team to SOS alert, or the nearest free team with auto_assign"""
     if request.user.role != 'police':
         return Response({'error': 'Police access required'}, status=403)
 
     sos_alert = get_object_or_404(SOSAlert, id=sos_id)
     team_id = request.data.get('team_id')
 
+    if not sos_alert.is_active:
+        return Response({'error': 'SOS alert is no longer active'}, status=400)
+
+    if not team_id and request.data.get('auto_assign'):
+        try:
+            assignment = auto_assign_team(sos_alert)
+        except SOSNotActive:
+            return Response({'error': 'SOS alert is no longer active'}, status=400)
+        if assignment is None:
+            return Response({'error': 'No free patrol teams nearby'}, status=409)
+
+        team, distance, sos_response = assignment
+        return Response({
+            'message': f'Team {team.team_id} assigned successfully',
+            'team_id': team.team_id,
+            'response_id': sos_response.id,
+            'distance': round(distance, 1)
+        })
+
     if not team_id:
         return Response({'error': 'Team ID required'}, status=400)
 
     team = get_object_or_404(PatrolTeam, id=team_id)
-    
-    # **NEW: Check if team is already assigned to another active SOS**
-    existing_assignment = SOSResponse.objects.filter(
-        assigned_team=team,
-        sos_alert__is_active=True  # Only check active SOS alerts
-    ).exclude(sos_alert=sos_alert).first()  # Exclude current SOS
-    
-    if existing_assignment:
+
+    try:
+        sos_response = assign_team(sos_alert, team)
+    except SOSNotActive:
+        return Response({'error': 'SOS alert is no longer active'}, status=400)
+    if sos_response is None:
+        team.refresh_from_db(fields=['is_active', 'current_sos'])
+        if not team.is_active:
+            return Response({'error': f'Team {team.team_id} is not active'}, status=400)
         return Response({
-            'error': f'Team {team.team_id} is already assigned to active SOS #{existing_assignment.sos_alert.id}. Please resolve that emergency first.'
+            'error': f'Team {team.team_id} is already assigned to active SOS #{team.current_sos_id}. Please resolve that emergency first.'
         }, status=400)
 
-    # Create or update assignment
-    sos_response, created = SOSResponse.objects.get_or_create(
-        sos_alert=sos_alert,
-        defaults={
-            'assigned_team': team,
-            'status': 'assigned'
-        }
-    )
-
-    if not created:
-        sos_response.assigned_team = team
-        sos_response.save()
-
     return Response({
         'message': f'Team {team.team_id} assigned successfully',
         'team_id': team.team_id,
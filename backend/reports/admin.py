@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Report, Media
+from .models import GeocodeCacheEntry, Report, Media
 
 # Register your models here.
 admin.site.register(Report)
-admin.site.register(Media)
\ No newline at end of file
+admin.site.register(Media)
+admin.site.register(GeocodeCacheEntry)
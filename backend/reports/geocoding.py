@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils.module_loading import import_string
+
+from core import outbound
+
+from .models import GeocodeCacheEntry
+from .offline_geocoder import offline_geocoder
+
+logger = logging.getLogger(__name__)
+
+# Cell size in degrees for cache keys: ~22 m of latitude
+GEOCODE_PRECISION = 0.0002
+GEOCODE_LRU_SIZE = 4096
+
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/reverse'
+USER_AGENT = 'CityShield/1.0 (cityshield.mern@gmail.com)'
+
+
+class GeocodingError(Exception):
+    pass
+
+
+class GeocodingUnavailable(GeocodingError):
+    """The upstream can't be called right now (rate limit); retry later"""
+
+
+def offline_mode():
+    """How the offline geocoder is used: 'fallback' (default), 'first' or 'off'"""
+    return getattr(settings, 'GEOCODER_OFFLINE_MODE', 'fallback')
+
+
+def cell_key(latitude, longitude):
+    return (round(latitude / GEOCODE_PRECISION), round(longitude / GEOCODE_PRECISION))
+
+
+# No mirrors or hedging: Nominatim's usage policy allows one request a second
+outbound.register('nominatim', [NOMINATIM_URL], timeout=(3, 10), headers={'User-Agent': USER_AGENT})
+
+
+class NominatimUpstream:
+    """OpenStreetMap Nominatim reverse geocoding"""
+
+    @property
+    def timeout(self):
+        return outbound.upstream('nominatim').timeout
+
+    def reverse(self, latitude, longitude):
+        return outbound.client.get_json('nominatim', params={
+            'format': 'json',
+            'lat': latitude,
+            'lon': longitude,
+            'addressdetails': 1,
+            'accept-language': 'en'
+        })
+
+
+class FakeUpstream:
+    """Offline stand-in for tests and local development"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def reverse(self, latitude, longitude):
+        self.calls += 1
+        return {
+            'lat': str(latitude),
+            'lon': str(longitude),
+            'display_name': f'{latitude:.4f}, {longitude:.4f}',
+            'address': {}
+        }
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, up to ``capacity``"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """Take a token, waiting up to ``timeout`` seconds; False if none came"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Geocoder:
+    """Reverse geocoder: LRU -> cache table -> rate-limited upstream.
+
+    Results are cached per ~20 m cell, forever (addresses rarely change).
+    Concurrent misses for the same cell share one upstream call, and
+    upstream calls go through a token bucket (GEOCODER_RATE per second,
+    per process, 1 by default to respect Nominatim's usage policy).
+    The offline geocoder answers before the upstream or when it fails,
+    depending on GEOCODER_OFFLINE_MODE; its answers aren't cached.
+    """
+
+    def __init__(self, upstream=None, rate=None, lru_size=GEOCODE_LRU_SIZE):
+        self._upstream = upstream
+        self.bucket = TokenBucket(rate or getattr(settings, 'GEOCODER_RATE', 1.0))
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    @property
+    def upstream(self):
+        if self._upstream is None:
+            self._upstream = import_string(
+                getattr(settings, 'GEOCODER_UPSTREAM', 'reports.geocoding.NominatimUpstream')
+            )()
+        return self._upstream
+
+    def _remember(self, key, payload):
+        with self._lock:
+            self._lru[key] = payload
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def cached(self, latitude, longitude):
+        """Cached payload for a point, without calling upstream"""
+        key = cell_key(latitude, longitude)
+        with self._lock:
+            payload = self._lru.get(key)
+            if payload is not None:
+                self._lru.move_to_end(key)
+                return payload
+
+        entry = GeocodeCacheEntry.objects.filter(lat_key=key[0], lng_key=key[1]).only('payload').first()
+        if entry is None:
+            return None
+        self._remember(key, entry.payload)
+        return entry.payload
+
+    def reverse(self, latitude, longitude, wait=5.0, fallback=True):
+        """Nominatim-style payload for a point.
+
+        Waits up to ``wait`` seconds for the rate limiter; raises
+        GeocodingUnavailable if it can't get a slot, GeocodingError if the
+        upstream fails and (with ``fallback``) the offline geocoder has no
+        answer either.
+        """
+        payload = self.cached(latitude, longitude)
+        if payload is not None:
+            return payload
+
+        mode = offline_mode()
+        if mode == 'first':
+            payload = offline_geocoder.reverse(latitude, longitude)
+            if payload is not None:
+                return payload
+
+        try:
+            return self._reverse_upstream(latitude, longitude, wait)
+        except GeocodingError as e:
+            if not fallback or mode != 'fallback':
+                raise
+            payload = offline_geocoder.reverse(latitude, longitude)
+            if payload is None:
+                raise
+            logger.info(f"Answered ({latitude}, {longitude}) offline: {e}")
+            return payload
+
+    def _reverse_upstream(self, latitude, longitude, wait):
+        key = cell_key(latitude, longitude)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if not flight.done.wait(wait + self.upstream_timeout):
+                raise GeocodingUnavailable('Timed out waiting for a concurrent lookup')
+            if flight.error:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._fetch(key, latitude, longitude, wait)
+            return flight.result
+        except GeocodingError as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    @property
+    def upstream_timeout(self):
+        timeout = getattr(self.upstream, 'timeout', 10)
+        return sum(timeout) if isinstance(timeout, tuple) else timeout
+
+    def _fetch(self, key, latitude, longitude, wait):
+        if not self.bucket.acquire(wait):
+            raise GeocodingUnavailable('Geocoding rate limit reached')
+        try:
+            payload = self.upstream.reverse(latitude, longitude)
+        except (requests.RequestException, ValueError) as e:
+            raise GeocodingError(f'Upstream geocoder failed: {e}') from e
+
+        try:
+            GeocodeCacheEntry.objects.update_or_create(
+                lat_key=key[0],
+                lng_key=key[1],
+                defaults={
+                    'display_name': (payload.get('display_name') or '')[:500],
+                    'payload': payload
+                }
+            )
+        except IntegrityError:
+            pass  # Another process stored the same cell
+        self._remember(key, payload)
+        return payload
+
+
+geocoder = Geocoder()
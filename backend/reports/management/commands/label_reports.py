@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from reports.models import Report
+from reports.offline_geocoder import offline_geocoder
+
+
+class Command(BaseCommand):
+    help = 'Fill missing report locations from the offline geocoder datasets (no outbound HTTP)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Reports updated per query')
+        parser.add_argument('--max-distance', type=int, help='Meters beyond which a report is left unlabelled')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        offline_geocoder.load()
+
+        pending = Report.objects.filter(Q(location__isnull=True) | Q(location='')).order_by('id')
+        labelled = skipped = 0
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id).only('id', 'latitude', 'longitude')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            updated = []
+            for report in batch:
+                payload = offline_geocoder.reverse(report.latitude, report.longitude, options['max_distance'])
+                if payload is None or not payload['display_name']:
+                    skipped += 1
+                    continue
+                report.location = payload['display_name'][:200]
+                updated.append(report)
+            Report.objects.bulk_update(updated, ['location'])
+            labelled += len(updated)
+
+        self.stdout.write(f'Labelled {labelled} reports, {skipped} too far from any known place')
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.2f}s'))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fts import fts_available
+from core.sharding import shard_aliases
+from reports.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the report full-text search index from the report table'
+
+    def handle(self, *args, **options):
+        # Every region shard keeps its own index (just 'default' when unsharded)
+        for alias in shard_aliases():
+            if not fts_available(alias):
+                raise CommandError(f'Report search uses FTS5, which is only set up on SQLite ({alias})')
+
+            started = time.monotonic()
+            count = rebuild_index(alias)
+            self.stdout.write(self.style.SUCCESS(f'{alias}: indexed {count} reports in {time.monotonic() - started:.2f}s'))
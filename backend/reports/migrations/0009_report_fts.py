@@ -0,0 +1,80 @@
+from django.db import migrations
+
+# FTS5 index over report text, kept in sync by triggers; rowid is the
+# report id, and facet fields are read from reports_report by that id.
+# cells holds grid cell tokens (see core/fts.py) for bbox filters. Only
+# created on SQLite.
+
+REPORT_COLUMNS = 'rowid, title, description, location, cells'
+
+CELLS = (
+    "'ca' || CAST((new.latitude + 90) / 10 AS INTEGER) || 'x' || CAST((new.longitude + 180) / 10 AS INTEGER)"
+    " || ' cb' || CAST(new.latitude + 90 AS INTEGER) || 'x' || CAST(new.longitude + 180 AS INTEGER)"
+    " || ' cc' || CAST((new.latitude + 90) * 10 AS INTEGER) || 'x' || CAST((new.longitude + 180) * 10 AS INTEGER)"
+)
+
+REPORT_VALUES = f"new.id, new.title, new.description, new.location, {CELLS}"
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE reports_report_fts USING fts5(
+        title, description, location, cells,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+    """,
+    f"""
+    CREATE TRIGGER reports_report_fts_insert AFTER INSERT ON reports_report BEGIN
+        INSERT INTO reports_report_fts({REPORT_COLUMNS}) VALUES ({REPORT_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER reports_report_fts_update
+    AFTER UPDATE OF title, description, location, latitude, longitude ON reports_report
+    BEGIN
+        DELETE FROM reports_report_fts WHERE rowid = old.id;
+        INSERT INTO reports_report_fts({REPORT_COLUMNS}) VALUES ({REPORT_VALUES});
+    END
+    """,
+    """
+    CREATE TRIGGER reports_report_fts_delete AFTER DELETE ON reports_report BEGIN
+        DELETE FROM reports_report_fts WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    INSERT INTO reports_report_fts({REPORT_COLUMNS})
+    SELECT {REPORT_VALUES.replace('new.', '')} FROM reports_report
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS reports_report_fts_insert',
+    'DROP TRIGGER IF EXISTS reports_report_fts_update',
+    'DROP TRIGGER IF EXISTS reports_report_fts_delete',
+    'DROP TABLE IF EXISTS reports_report_fts',
+]
+
+
+def create_report_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_report_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0008_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_report_fts, drop_report_fts),
+    ]
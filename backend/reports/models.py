@@ -2,6 +2,8 @@
 from django.db import models
 from django.conf import settings
 
+from core.sharding import ShardedManager
+
 class Media(models.Model):
     file = models.FileField(upload_to='report_media/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -9,6 +11,20 @@ class Media(models.Model):
     def __str__(self):
         return f"Media {self.id}"
 
+class GeocodeCacheEntry(models.Model):
+    """Reverse geocoding result for a ~20 m cell (see reports/geocoding.py)"""
+    lat_key = models.IntegerField()
+    lng_key = models.IntegerField()
+    display_name = models.CharField(max_length=500, blank=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['lat_key', 'lng_key']
+
+    def __str__(self):
+        return f"({self.lat_key}, {self.lng_key}) {self.display_name[:50]}"
+
 class Report(models.Model):
     REPORT_TYPES = [
         ('infrastructure', 'Infrastructure Issue'),
@@ -35,7 +51,7 @@ class Report(models.Model):
     # Location data
     latitude = models.FloatField()
     longitude = models.FloatField()
-    # add a field for location (String) which calls reverse_geocode function from views.py, passing lat,lon and getting the location string directly
+    # Address string, filled in the background by reports.tasks.fill_report_location
     location = models.CharField(max_length=200, blank=True, null=True)
 
     # Media files
@@ -44,6 +60,9 @@ class Report(models.Model):
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Spans every region shard (core/sharding.py)
+    objects = ShardedManager()
     
     class Meta:
         ordering = ['-created_at']
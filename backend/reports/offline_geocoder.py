@@ -0,0 +1,230 @@
+import csv
+import logging
+import math
+import os
+
+from django.conf import settings
+
+from sos.spatial import EARTH_RADIUS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DISTANCE = 25000  # meters
+
+# Accepted column names, so other admin-boundary CSVs load without reshaping
+COLUMN_ALIASES = {
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lng', 'lon'),
+    'locality': ('officename', 'locality', 'name', 'village', 'city'),
+    'division': ('divisionname', 'division', 'subdistrict', 'taluk'),
+    'district': ('district', 'districtname'),
+    'state': ('statename', 'state'),
+    'pincode': ('pincode', 'postcode', 'pin'),
+}
+
+# Suffixes the post office dataset adds to office names
+OFFICE_SUFFIXES = (' BO', ' SO', ' HO', ' B.O', ' S.O', ' H.O')
+# Placeholders the datasets use for unknown values ("NA" for the state of
+# thousands of rows); read as empty
+MISSING_VALUES = {'na', 'n/a', 'null', 'none', '-'}
+
+
+def default_datasets():
+    return getattr(settings, 'OFFLINE_GEOCODER_DATASETS', [
+        os.path.join(settings.BASE_DIR, 'police_station_data.csv')
+    ])
+
+
+def _column(fieldnames, field):
+    lowered = {name.strip().lower(): name for name in fieldnames}
+    for alias in COLUMN_ALIASES[field]:
+        if alias in lowered:
+            return lowered[alias]
+    return None
+
+
+def _locality(name):
+    name = name.strip()
+    for suffix in OFFICE_SUFFIXES:
+        if name.upper().endswith(suffix):
+            return name[:-len(suffix)].strip()
+    return name
+
+
+def _unit_vector(lat, lng):
+    phi, lam = math.radians(lat), math.radians(lng)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+class KDTree:
+    """Static 3-d tree over points on the unit sphere.
+
+    Nearest by straight-line (chord) distance between unit vectors is
+    nearest by great-circle distance, so this answers geographic nearest
+    neighbour queries exactly, typically in O(log n).
+    """
+
+    def __init__(self, points):
+        # points: list of (key, (x, y, z)); nodes are (key, vector, axis, left, right)
+        self.root = self._build(list(points), 0)
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda point: point[1][axis])
+        middle = len(points) // 2
+        key, vector = points[middle]
+        return (
+            key, vector, axis,
+            self._build(points[:middle], depth + 1),
+            self._build(points[middle + 1:], depth + 1)
+        )
+
+    def nearest(self, vector, max_chord=math.inf):
+        """(key, chord distance) of the point nearest to a unit vector.
+
+        Points farther than ``max_chord`` are ignored, which also prunes
+        the search; returns (None, max_chord) if there are none.
+        """
+        best_key, best = None, max_chord * max_chord  # squared distance
+        # (node, squared distance from the query to the node's region bound)
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if node is None or bound >= best:
+                continue
+            key, point, axis, left, right = node
+            squared = (point[0] - vector[0]) ** 2 + (point[1] - vector[1]) ** 2 + (point[2] - vector[2]) ** 2
+            if squared < best:
+                best_key, best = key, squared
+            delta = vector[axis] - point[axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            # Far side is pushed first so the near side is searched first,
+            # and skipped on pop if the best found by then is closer
+            stack.append((far, delta * delta))
+            stack.append((near, bound))
+        return best_key, math.sqrt(best)
+
+
+def _title(value):
+    # The dataset is upper-case ("AHMADABAD", "GUJARAT")
+    value = value.strip()
+    return value.title() if value.isupper() else value
+
+
+class OfflineGeocoder:
+    """Nearest-place reverse geocoder over local CSV datasets.
+
+    Rows (latitude, longitude plus locality/district/state/pincode columns)
+    are loaded once into a KDTree, so a lookup is a few dozen comparisons
+    in memory, with no outbound HTTP. Answers are
+    the nearest labelled point, not a true address, so results farther than
+    OFFLINE_GEOCODER_MAX_DISTANCE meters are treated as no answer.
+    """
+
+    def __init__(self, paths=None):
+        self._paths = paths
+        # (tree, places) swapped as one reference so a reload never pairs
+        # a new tree with the old place list
+        self._index = None
+
+    @property
+    def paths(self):
+        return self._paths if self._paths is not None else default_datasets()
+
+    @property
+    def max_distance(self):
+        return getattr(settings, 'OFFLINE_GEOCODER_MAX_DISTANCE', DEFAULT_MAX_DISTANCE)
+
+    def load(self):
+        """(Re)build the index from the configured datasets"""
+        places = []
+        for path in self.paths:
+            try:
+                places.extend(self._read(path))
+            except (OSError, csv.Error) as e:
+                logger.warning(f"Skipping offline geocoder dataset {path}: {e}")
+
+        tree = KDTree((i, _unit_vector(place['lat'], place['lng'])) for i, place in enumerate(places))
+        self._index = (tree, places)
+        logger.info(f"Offline geocoder loaded {len(places)} places")
+
+    def _read(self, path):
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            columns = {field: _column(reader.fieldnames or [], field) for field in COLUMN_ALIASES}
+            if not columns['latitude'] or not columns['longitude']:
+                raise csv.Error('no latitude/longitude columns')
+
+            for row in reader:
+                try:
+                    lat = float(row[columns['latitude']])
+                    lng = float(row[columns['longitude']])
+                except (TypeError, ValueError):
+                    continue
+                if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                    continue
+
+                place = {'lat': lat, 'lng': lng}
+                for field in ('locality', 'division', 'district', 'state', 'pincode'):
+                    value = (row.get(columns[field]) if columns[field] else None) or ''
+                    place[field] = '' if value.strip().lower() in MISSING_VALUES else value.strip()
+                place['locality'] = _locality(place['locality'])
+                place['district'] = _title(place['district'])
+                place['state'] = _title(place['state'])
+                yield place
+
+    def ensure_loaded(self):
+        if self._index is None:
+            self.load()
+
+    def __len__(self):
+        self.ensure_loaded()
+        return len(self._index[1])
+
+    def state_bounds(self):
+        """(min_lat, min_lng, max_lat, max_lng) of each state's places; places without a state are left out"""
+        self.ensure_loaded()
+        bounds = {}
+        for place in self._index[1]:
+            if not place['state']:
+                continue
+            lat, lng = place['lat'], place['lng']
+            box = bounds.get(place['state'])
+            bounds[place['state']] = (
+                (lat, lng, lat, lng) if box is None
+                else (min(box[0], lat), min(box[1], lng), max(box[2], lat), max(box[3], lng))
+            )
+        return bounds
+
+    def reverse(self, latitude, longitude, max_distance=None):
+        """Nominatim-style payload for the nearest known place, or None"""
+        self.ensure_loaded()
+        max_distance = self.max_distance if max_distance is None else max_distance
+        tree, places = self._index
+        max_chord = 2 * math.sin(min(max_distance / (2 * EARTH_RADIUS), math.pi / 2))
+        index, chord = tree.nearest(_unit_vector(latitude, longitude), max_chord)
+        if index is None:
+            return None
+
+        distance = 2 * EARTH_RADIUS * math.asin(min(1.0, chord / 2))
+        place = places[index]
+        parts = [place['locality'], place['district'], place['state'], place['pincode']]
+        return {
+            'lat': str(place['lat']),
+            'lon': str(place['lng']),
+            'display_name': ', '.join(part for part in parts if part),
+            'address': {
+                'suburb': place['locality'],
+                'county': place['division'],
+                'state_district': place['district'],
+                'state': place['state'],
+                'postcode': place['pincode']
+            },
+            'source': 'offline',
+            'distance': round(distance)
+        }
+
+
+offline_geocoder = OfflineGeocoder()
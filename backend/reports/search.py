@@ -0,0 +1,208 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Q
+
+from core.fts import cover_cells, fts_available, match_expression
+from core.sharding import region_map, shard_aliases, sharding_active
+from .models import Report
+
+TEXT_COLUMNS = ('title', 'description', 'location')
+# bm25 weights for title, description, location and cells
+COLUMN_WEIGHTS = (5.0, 1.0, 2.0, 0.0)
+SORTS = ('relevance', 'newest')
+MAX_PAGE_SIZE = 100
+# Relevance ranking scores at most this many matches (after filters), the
+# newest first, so broad terms stay cheap; counts and facets always cover
+# every match
+DEFAULT_CANDIDATE_LIMIT = 2000
+
+# Same row the migration's triggers write; used to rebuild the index
+INDEX_COLUMNS = 'rowid, title, description, location, cells'
+INDEX_VALUES = (
+    "id, title, description, location,"
+    " 'ca' || CAST((latitude + 90) / 10 AS INTEGER) || 'x' || CAST((longitude + 180) / 10 AS INTEGER)"
+    " || ' cb' || CAST(latitude + 90 AS INTEGER) || 'x' || CAST(longitude + 180 AS INTEGER)"
+    " || ' cc' || CAST((latitude + 90) * 10 AS INTEGER) || 'x' || CAST((longitude + 180) * 10 AS INTEGER)"
+)
+
+
+def _in(column, values, params):
+    params.extend(values)
+    return f'{column} IN ({", ".join(["%s"] * len(values))})'
+
+
+def search_reports(query=None, report_types=None, statuses=None, since=None, until=None,
+                   bbox=None, sort='relevance', page=1, page_size=20):
+    """One page of matching report ids plus facet counts.
+
+    Text, time range and bbox narrow the hits; type and status filter the
+    page and the total, while each facet's counts ignore its own filter so
+    a client can show the alternatives. On SQLite everything comes from one
+    statement over the FTS index (or the report table when there is no
+    text); other databases get an ORM fallback. With region shards, each
+    shard the bbox touches is searched for the first ``page`` pages, and
+    the hits are merged and counts added up. Returns
+    {'ids': [...], 'total': n, 'facets': {'report_type': {...}, 'status': {...}}}.
+    """
+    match = match_expression(query, columns=TEXT_COLUMNS) if query else None
+    if query and match is None:
+        return {'ids': [], 'total': 0, 'facets': {'report_type': {}, 'status': {}}}
+
+    if not sharding_active():
+        aliases = ['default']
+    else:
+        aliases = region_map.aliases_for_bbox(bbox) if bbox else shard_aliases()
+    offset = (page - 1) * page_size
+    if len(aliases) == 1:
+        result = _search_database(aliases[0], query, match, report_types, statuses, since, until,
+                                  bbox, sort, offset, page_size)
+        return {'ids': [hit[0] for hit in result['hits']], 'total': result['total'], 'facets': result['facets']}
+
+    merged = {'ids': [], 'total': 0, 'facets': {'report_type': {}, 'status': {}}}
+    hits = []
+    for alias in aliases:
+        result = _search_database(alias, query, match, report_types, statuses, since, until,
+                                  bbox, sort, 0, offset + page_size)
+        hits.extend(result['hits'])
+        merged['total'] += result['total']
+        for facet, counts in result['facets'].items():
+            for label, count in counts.items():
+                merged['facets'][facet][label] = merged['facets'][facet].get(label, 0) + count
+
+    # hits are (id, score, created_at); same order as the SQL
+    hits.sort(key=lambda hit: (hit[2], hit[0]), reverse=True)
+    if sort == 'relevance' and match is not None:
+        hits.sort(key=lambda hit: hit[1])
+    merged['ids'] = [hit[0] for hit in hits[offset:offset + page_size]]
+    return merged
+
+
+def _search_database(using, query, match, report_types, statuses, since, until, bbox, sort, offset, limit):
+    """search_reports against one database; hits are (id, score, created_at)"""
+    if not fts_available(using):
+        return _search_without_fts(using, query, report_types, statuses, since, until, bbox, offset, limit)
+    connection = connections[using]
+
+    params = []
+    conditions = []
+    if match is not None:
+        if bbox:
+            cells = cover_cells(bbox)
+            if cells:
+                match = f'{match} AND {cells}'
+        source = 'reports_report_fts JOIN reports_report r ON r.id = reports_report_fts.rowid'
+        conditions.append('reports_report_fts MATCH %s')
+        params.append(match)
+    else:
+        source = 'reports_report r'
+
+    if since:
+        conditions.append('r.created_at >= %s')
+        params.append(connection.ops.adapt_datetimefield_value(since))
+    if until:
+        conditions.append('r.created_at < %s')
+        params.append(connection.ops.adapt_datetimefield_value(until))
+    if bbox:
+        conditions.append('r.latitude BETWEEN %s AND %s AND r.longitude BETWEEN %s AND %s')
+        params.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+    where = ' AND '.join(conditions) or '1'
+    base_params = list(params)
+
+    type_params, status_params = [], []
+    type_filter = _in('report_type', report_types, type_params) if report_types else '1'
+    status_filter = _in('status', statuses, status_params) if statuses else '1'
+
+    materialized = 'MATERIALIZED' if connection.Database.sqlite_version_info >= (3, 35) else ''
+    if sort == 'relevance' and match is not None:
+        # bm25 is only available inside the MATCH query, so the page is
+        # ranked by a second, capped walk of the index in the same statement.
+        # FTS5 walks rowids backwards natively, so the cap keeps the newest
+        # matches rather than whichever the index yields first
+        page_sql = f'''
+            SELECT id, score, created_at FROM (
+                SELECT r.id, bm25(reports_report_fts, {", ".join(str(weight) for weight in COLUMN_WEIGHTS)}) AS score, r.created_at
+                FROM {source} WHERE {where} AND {type_filter} AND {status_filter}
+                ORDER BY reports_report_fts.rowid DESC LIMIT %s
+            ) ORDER BY score, created_at DESC LIMIT %s OFFSET %s
+        '''
+        page_params = base_params + type_params + status_params + [
+            getattr(settings, 'REPORT_SEARCH_CANDIDATES', DEFAULT_CANDIDATE_LIMIT), limit, offset
+        ]
+    else:
+        page_sql = f'''
+            SELECT id, NULL AS score, created_at FROM hits WHERE {type_filter} AND {status_filter}
+            ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s
+        '''
+        page_params = type_params + status_params + [limit, offset]
+
+    # One statement: the hits are materialized once and the total and both
+    # facets are counted from them
+    sql = f'''
+        WITH hits AS {materialized} (
+            SELECT r.id, r.report_type, r.status, r.created_at FROM {source} WHERE {where}
+        )
+        SELECT 'hit' AS kind, score AS label, id AS value, created_at FROM ({page_sql})
+        UNION ALL
+        SELECT 'total', NULL, COUNT(*), NULL FROM hits WHERE {type_filter} AND {status_filter}
+        UNION ALL
+        SELECT 'report_type', report_type, COUNT(*), NULL FROM hits WHERE {status_filter} GROUP BY report_type
+        UNION ALL
+        SELECT 'status', status, COUNT(*), NULL FROM hits WHERE {type_filter} GROUP BY status
+    '''
+    params = (
+        base_params
+        + page_params
+        + type_params + status_params
+        + status_params
+        + type_params
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    result = {'hits': [], 'total': 0, 'facets': {'report_type': {}, 'status': {}}}
+    for kind, label, value, created_at in rows:
+        if kind == 'hit':
+            result['hits'].append((value, label, created_at))
+        elif kind == 'total':
+            result['total'] = value
+        else:
+            result['facets'][kind][label] = value
+    return result
+
+
+def _search_without_fts(using, query, report_types, statuses, since, until, bbox, offset, limit):
+    """ORM fallback for databases without the FTS5 table (newest first)"""
+    hits = Report.objects.using(using)
+    for term in (query or '').split():
+        hits = hits.filter(Q(title__icontains=term) | Q(description__icontains=term) | Q(location__icontains=term))
+    if since:
+        hits = hits.filter(created_at__gte=since)
+    if until:
+        hits = hits.filter(created_at__lt=until)
+    if bbox:
+        hits = hits.filter(latitude__range=(bbox[0], bbox[2]), longitude__range=(bbox[1], bbox[3]))
+
+    by_type = hits.filter(status__in=statuses) if statuses else hits
+    by_status = hits.filter(report_type__in=report_types) if report_types else hits
+    matching = by_status.filter(status__in=statuses) if statuses else by_status
+    page = matching.order_by('-created_at', '-id').values_list('id', 'created_at')[offset:offset + limit]
+    return {
+        'hits': [(report_id, None, created_at) for report_id, created_at in page],
+        'total': matching.count(),
+        'facets': {
+            'report_type': dict(by_type.values_list('report_type').annotate(count=Count('id')).order_by()),
+            'status': dict(by_status.values_list('status').annotate(count=Count('id')).order_by())
+        }
+    }
+
+
+def rebuild_index(using='default'):
+    """Rebuild reports_report_fts from the report table; returns the row count"""
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute('DELETE FROM reports_report_fts')
+        cursor.execute(f'INSERT INTO reports_report_fts({INDEX_COLUMNS}) SELECT {INDEX_VALUES} FROM reports_report')
+        count = cursor.rowcount
+        cursor.execute("INSERT INTO reports_report_fts(reports_report_fts) VALUES ('optimize')")
+    return count
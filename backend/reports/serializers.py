@@ -1,14 +1,21 @@
 # serializers.py
 from rest_framework import serializers
+from cityshield_backend.media import report_media_visible, signed_media_url
 from .models import Report, Media
 
 class ReportMediaSerializer(serializers.ModelSerializer):
+    file = serializers.SerializerMethodField()
+
     class Meta:
         model = Media
         fields = ['id', 'file']
 
+    def get_file(self, obj):
+        """Short-lived signed URL served through the protected media view"""
+        return signed_media_url(obj.file.name, self.context.get('request')) if obj.file else None
+
 class ReportSerializer(serializers.ModelSerializer):
-    media = ReportMediaSerializer(many=True, read_only=True)
+    media = serializers.SerializerMethodField()
     reported_by_name = serializers.SerializerMethodField()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     report_type_display = serializers.CharField(source='get_report_type_display', read_only=True)
@@ -22,6 +29,13 @@ class ReportSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'reported_by', 'status', 'created_at', 'updated_at']
     
+    def get_media(self, obj):
+        """Attachments, only for viewers the report's media rules allow"""
+        request = self.context.get('request')
+        if not report_media_visible(getattr(request, 'user', None), obj):
+            return []
+        return ReportMediaSerializer(obj.media.all(), many=True, context=self.context).data
+
     def get_reported_by_name(self, obj):
         if obj.reported_by:
             return obj.reported_by.name
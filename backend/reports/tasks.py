@@ -0,0 +1,27 @@
+import logging
+
+from django.db.models import Q
+
+from core.tasks import task
+from .geocoding import geocoder
+from .models import Report
+
+logger = logging.getLogger(__name__)
+
+
+@task(max_attempts=8)
+def fill_report_location(report_id):
+    """Background task to fill a report's location from its coordinates"""
+    report = Report.objects.filter(id=report_id).only('latitude', 'longitude', 'location').first()
+    if report is None or report.location:
+        return
+
+    # Rather than settle for the offline label, let GeocodingError propagate
+    # so the worker retries; reports still unlabelled after the last attempt
+    # are picked up by `manage.py label_reports`
+    payload = geocoder.reverse(report.latitude, report.longitude, fallback=False)
+    display_name = (payload.get('display_name') or '')[:200]
+    if display_name:
+        # Don't overwrite a location set meanwhile
+        Report.objects.filter(Q(location__isnull=True) | Q(location=''), id=report_id).update(location=display_name)
+        logger.info(f"Filled location for report {report_id}")
@@ -1,3 +1,221 @@
-from django.test import TestCase
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.models import Job
+from users.models import User
+from sos.spatial import haversine
+from .geocoding import FakeUpstream, Geocoder, GeocodingError, GeocodingUnavailable, TokenBucket
+from .models import GeocodeCacheEntry, Report
+from .offline_geocoder import KDTree, OfflineGeocoder, _unit_vector, offline_geocoder
+from .search import search_reports
+from .tasks import fill_report_location
+
+
+class SearchTests(TestCase):
+    def report(self, title, report_type='crime', status='pending', latitude=19.07, longitude=72.87):
+        return Report.objects.create(
+            title=title, description='', report_type=report_type, status=status,
+            latitude=latitude, longitude=longitude, location='Mumbai'
+        )
+
+    def test_text_match_with_facets(self):
+        theft = self.report('Bike theft near station')
+        self.report('Broken streetlight', report_type='infrastructure')
+        self.report('Phone theft', report_type='harassment', status='resolved')
+
+        result = search_reports('theft', statuses=['pending'])
+        self.assertEqual(result['ids'], [theft.id])
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(result['facets']['report_type'], {'crime': 1})
+        self.assertEqual(result['facets']['status'], {'pending': 1, 'resolved': 1})
+
+    def test_bbox_and_pages(self):
+        inside = [self.report(f'Pothole {n}') for n in range(3)]
+        self.report('Pothole far away', latitude=28.6, longitude=77.2)
+
+        first = search_reports('pothole', bbox=(19.0, 72.8, 19.1, 72.9), sort='newest', page_size=2)
+        second = search_reports('pothole', bbox=(19.0, 72.8, 19.1, 72.9), sort='newest', page=2, page_size=2)
+        self.assertEqual(first['total'], 3)
+        self.assertEqual(first['ids'] + second['ids'], [report.id for report in reversed(inside)])
+
+    @override_settings(REPORT_SEARCH_CANDIDATES=2)
+    def test_capped_relevance_ranks_the_newest_matches(self):
+        reports = [self.report(f'Flooding {n}') for n in range(5)]
+        result = search_reports('flooding')
+        self.assertEqual(result['total'], 5)
+        self.assertEqual(set(result['ids']), {reports[-1].id, reports[-2].id})
+
+    def test_operators_in_input_are_plain_text(self):
+        self.report('Fight AND brawl')
+        self.assertEqual(search_reports('fight OR "')['total'], 0)
+        self.assertEqual(search_reports('"fight"')['total'], 1)
+
+
+POST_OFFICES = (
+    'officename,district,statename,pincode,latitude,longitude\n'
+    'Navrangpura SO,AHMADABAD,GUJARAT,380009,23.0365,72.5611\n'
+    'Unknown BO,NA,NA,000000,10.0,90.0\n'
+)
+
+
+def write_dataset(test, text):
+    """Path of a temporary CSV holding text, removed after the test"""
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    test.addCleanup(os.remove, path)
+    with os.fdopen(handle, 'w') as f:
+        f.write(text)
+    return path
+
+
+class OfflineGeocoderTests(SimpleTestCase):
+    def setUp(self):
+        self.path = write_dataset(self, POST_OFFICES)
+        self.geocoder = OfflineGeocoder(paths=[self.path])
+
+    def test_placeholder_states_are_missing(self):
+        self.assertEqual(self.geocoder.state_bounds(), {'Gujarat': (23.0365, 72.5611, 23.0365, 72.5611)})
+        place = self.geocoder.reverse(10.0, 90.0)
+        self.assertEqual(place['address']['state'], '')
+        self.assertEqual(place['display_name'], 'Unknown, 000000')
+
+    def test_reverse_names_the_nearest_place(self):
+        place = self.geocoder.reverse(23.0360, 72.5610)
+        self.assertEqual(place['display_name'], 'Navrangpura, Ahmadabad, Gujarat, 380009')
+        self.assertIsNone(self.geocoder.reverse(28.6, 77.2))
+
+    def test_other_column_names_load(self):
+        path = write_dataset(self, 'name,state,lat,lng\nConnaught Place,Delhi,28.6315,77.2167\n')
+        place = OfflineGeocoder(paths=[self.path, path]).reverse(28.63, 77.21)
+        self.assertEqual(place['display_name'], 'Connaught Place, Delhi')
+
+    def test_tree_finds_the_true_nearest_point(self):
+        rng = random.Random(7)
+        points = [(rng.uniform(8, 35), rng.uniform(68, 97)) for _ in range(500)]
+        tree = KDTree((i, _unit_vector(*point)) for i, point in enumerate(points))
+        for _ in range(100):
+            query = (rng.uniform(8, 35), rng.uniform(68, 97))
+            nearest, _ = tree.nearest(_unit_vector(*query))
+            self.assertEqual(nearest, min(range(len(points)), key=lambda i: haversine(*query, *points[i])))
+
+
+@override_settings(GEOCODER_OFFLINE_MODE='fallback')
+class OfflineTierTests(TestCase):
+    def setUp(self):
+        self.offline = OfflineGeocoder(paths=[write_dataset(self, POST_OFFICES)])
+        patcher = mock.patch('reports.geocoding.offline_geocoder', self.offline)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def failing_geocoder(self):
+        upstream = mock.Mock(timeout=1)
+        upstream.reverse.side_effect = requests.ConnectionError('down')
+        return Geocoder(upstream=upstream, rate=100), upstream
+
+    def test_answers_offline_when_the_upstream_fails(self):
+        geocoder, _ = self.failing_geocoder()
+        with self.assertLogs('reports.geocoding', 'INFO'):
+            place = geocoder.reverse(23.0365, 72.5611)
+        self.assertEqual(place['source'], 'offline')
+        with self.assertRaises(GeocodingError):
+            geocoder.reverse(23.0365, 72.5611, fallback=False)
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    @override_settings(GEOCODER_OFFLINE_MODE='first')
+    def test_first_mode_skips_the_upstream(self):
+        geocoder, upstream = self.failing_geocoder()
+        self.assertEqual(geocoder.reverse(23.0365, 72.5611)['source'], 'offline')
+        upstream.reverse.assert_not_called()
+
+    def test_label_reports_fills_only_nearby_reports(self):
+        near = Report.objects.create(title='a', description='', report_type='crime', latitude=23.036, longitude=72.561)
+        far = Report.objects.create(title='b', description='', report_type='crime', latitude=28.6, longitude=77.2)
+        with override_settings(OFFLINE_GEOCODER_DATASETS=self.offline.paths):
+            self.addCleanup(setattr, offline_geocoder, '_index', None)
+            out = io.StringIO()
+            call_command('label_reports', batch_size=1, stdout=out)
+        self.assertIn('Labelled 1 reports, 1 too far', out.getvalue())
+        self.assertEqual(Report.objects.get(id=near.id).location, 'Navrangpura, Ahmadabad, Gujarat, 380009')
+        self.assertIsNone(Report.objects.get(id=far.id).location)
+
+
+class GeocoderTests(TestCase):
+    def setUp(self):
+        self.upstream = FakeUpstream()
+        self.geocoder = Geocoder(upstream=self.upstream, rate=100)
+
+    def test_nearby_points_share_a_cached_cell(self):
+        first = self.geocoder.reverse(19.07620, 72.87760)
+        self.assertEqual(self.geocoder.reverse(19.07621, 72.87761), first)
+        self.assertEqual(self.upstream.calls, 1)
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 1)
+
+        # A fresh process finds the cell in the table
+        cold = Geocoder(upstream=self.upstream, rate=100)
+        self.assertEqual(cold.reverse(19.0762, 72.8776), first)
+        self.assertEqual(self.upstream.calls, 1)
+
+    def test_rate_limit_refuses_rather_than_queues(self):
+        geocoder = Geocoder(upstream=self.upstream, rate=0.01)
+        geocoder.reverse(19.076, 72.8777, wait=0)
+        with self.assertRaises(GeocodingUnavailable):
+            geocoder.reverse(28.6139, 77.209, wait=0, fallback=False)
+        self.assertEqual(self.upstream.calls, 1)
+
+    def test_new_reports_are_labelled_in_the_background(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='reporter', email='reporter@example.com'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/reports/', {
+                'title': 'Broken signal', 'description': 'Dark since Monday', 'report_type': 'infrastructure',
+                'latitude': 19.076, 'longitude': 72.8777
+            })
+        self.assertEqual(response.status_code, 201)
+        job = Job.objects.get()
+        self.assertEqual((job.task_name, job.args), ('reports.tasks.fill_report_location', [response.data['id']]))
+
+        with mock.patch('reports.tasks.geocoder', self.geocoder):
+            fill_report_location(*job.args)
+        self.assertEqual(Report.objects.get(id=response.data['id']).location, '19.0760, 72.8777')
+
+
+class GeocoderFlightTests(SimpleTestCase):
+    def test_concurrent_misses_share_one_upstream_call(self):
+        geocoder = Geocoder(upstream=FakeUpstream(), rate=100)
+        release = threading.Event()
+        calls = []
+
+        def fetch(key, latitude, longitude, wait):
+            calls.append(key)
+            release.wait(5)
+            return {'display_name': 'Fort'}
+
+        results = []
+        with mock.patch.object(geocoder, '_fetch', fetch):
+            threads = [
+                threading.Thread(target=lambda: results.append(geocoder._reverse_upstream(18.93, 72.83, 1)))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.2)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'display_name': 'Fort'}] * 4)
+
+    def test_token_bucket_refills_at_its_rate(self):
+        bucket = TokenBucket(rate=20)
+        self.assertTrue(bucket.acquire(0))
+        self.assertFalse(bucket.acquire(0))
+        self.assertTrue(bucket.acquire(0.2))
@@ -5,6 +5,7 @@ urlpatterns = [
     # Report Management
     path('', views.create_report, name='create_report'),
     path('list/', views.list_reports, name='list_reports'),
+    path('search/', views.search_reports_view, name='search_reports'),
     path('<int:report_id>/', views.get_report, name='get_report'),
     
     # Utility
@@ -3,11 +3,20 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework import status
+from core.fts import parse_bbox
+from core.idempotency import idempotent
+from core.routing import replica_reads
+from .geocoding import GeocodingError, GeocodingUnavailable, geocoder
 from .models import Report, Media
+from .search import MAX_PAGE_SIZE, SORTS, search_reports
 from .serializers import ReportSerializer
+from .tasks import fill_report_location
+from django.db import transaction
 from django.http import JsonResponse
 from django.conf import settings
-import requests
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
 import math
 import json
 
@@ -16,6 +25,7 @@ import json
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser])
+@idempotent
 def create_report(request):
     """Create a new incident report"""
     data = request.data.copy()
@@ -31,10 +41,13 @@ def create_report(request):
 
         # Save each file and attach to the report
         for file in media_files:
-            media_instance = Media.objects.create(file=file)
+            media_instance = Media.objects.using(report._state.db).create(file=file)
             report.media.add(media_instance)
 
-        return Response(ReportSerializer(report).data, status=status.HTTP_201_CREATED)
+        if not report.location:
+            transaction.on_commit(lambda: fill_report_location.delay(report.id))
+
+        return Response(ReportSerializer(report, context={'request': request}).data, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -59,6 +72,74 @@ def list_reports(request):
         'reports': serializer.data
     })
 
+def _parse_search_time(value, end_of_day=False):
+    """ISO datetime or date (a date means its start, or with end_of_day, the next midnight)"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value}')
+        parsed = datetime.combine(day, time.min)
+        if end_of_day:
+            parsed += timedelta(days=1)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_reports_view(request):
+    """Full-text report search with type/status/time/bbox filters and facet counts"""
+    valid_types = {choice for choice, _ in Report.REPORT_TYPES}
+    valid_statuses = {choice for choice, _ in Report.STATUS_CHOICES}
+    report_types = [value for value in request.GET.get('type', '').split(',') if value]
+    statuses = [value for value in request.GET.get('status', '').split(',') if value]
+    sort = request.GET.get('sort', 'relevance')
+
+    if not set(report_types) <= valid_types:
+        return Response({'error': f'Unknown report type: {", ".join(sorted(set(report_types) - valid_types))}'}, status=status.HTTP_400_BAD_REQUEST)
+    if not set(statuses) <= valid_statuses:
+        return Response({'error': f'Unknown status: {", ".join(sorted(set(statuses) - valid_statuses))}'}, status=status.HTTP_400_BAD_REQUEST)
+    if sort not in SORTS:
+        return Response({'error': f'sort must be one of {", ".join(SORTS)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        since = _parse_search_time(request.GET['since']) if request.GET.get('since') else None
+        until = _parse_search_time(request.GET['until'], end_of_day=True) if request.GET.get('until') else None
+        bbox = parse_bbox(request.GET['bbox']) if request.GET.get('bbox') else None
+        page = max(1, int(request.GET.get('page', 1)))
+        page_size = max(1, min(int(request.GET.get('page_size', 20)), MAX_PAGE_SIZE))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        result = search_reports(
+            query=request.GET.get('q', '').strip() or None,
+            report_types=report_types,
+            statuses=statuses,
+            since=since,
+            until=until,
+            bbox=bbox,
+            sort=sort,
+            page=page,
+            page_size=page_size
+        )
+
+        reports = Report.objects.filter(id__in=result['ids']).select_related('reported_by').prefetch_related('media')
+        by_id = {report.id: report for report in reports}
+        page_reports = [by_id[report_id] for report_id in result['ids'] if report_id in by_id]
+
+        return Response({
+            'count': result['total'],
+            'page': page,
+            'page_size': page_size,
+            'reports': ReportSerializer(page_reports, many=True, context={'request': request}).data,
+            'facets': result['facets']
+        })
+
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_report(request, report_id):
@@ -103,6 +184,7 @@ def get_bounding_box(lat, lng, radius):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@replica_reads
 def nearby_reports(request):
     """Get reports within specified radius"""
     try:
@@ -117,7 +199,7 @@ def nearby_reports(request):
         bbox = get_bounding_box(user_lat, user_lng, radius)
 
         # Get nearby reports
-        nearby_reports = Report.objects.filter(
+        nearby_reports = Report.objects.for_area(user_lat, user_lng, radius).filter(
             latitude__gte=bbox['min_lat'],
             latitude__lte=bbox['max_lat'],
             longitude__gte=bbox['min_lng'],
@@ -147,6 +229,7 @@ def nearby_reports(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@replica_reads
 def safety_map_reports(request):
     """Get all reports for safety map visualization"""
     try:
@@ -174,16 +257,20 @@ def reverse_geocode(request):
         return JsonResponse({"error": "Missing lat/lon"}, status=400)
 
     try:
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&addressdetails=1&accept-language=en"
-        headers = {
-            "User-Agent": "CityShield/1.0 (cityshield.mern@gmail.com)"
-        }
+        lat, lon = float(lat), float(lon)
+    except ValueError:
+        return JsonResponse({"error": "Invalid lat/lon"}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return JsonResponse({"error": "Invalid lat/lon"}, status=400)
 
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-
-        return JsonResponse(data)
+    try:
+        return JsonResponse(geocoder.reverse(lat, lon, wait=1.0))
 
+    except GeocodingUnavailable as e:
+        response = JsonResponse({"error": str(e)}, status=503)
+        response["Retry-After"] = "1"
+        return response
+    except GeocodingError as e:
+        return JsonResponse({"error": str(e)}, status=502)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -0,0 +1,105 @@
+from django.db import migrations
+
+# FTS5 index over police stations and hospitals, kept in sync by triggers.
+# rowid is id * 2 for police stations and id * 2 + 1 for hospitals so both
+# tables share one index without collisions. The cells column holds grid
+# cell tokens at 10, 1 and 0.1 degrees (see core/fts.py) so bbox
+# searches are narrowed inside the index. Only created on SQLite; other
+# databases fall back to LIKE queries in safety/search.py.
+
+FACILITY_COLUMNS = 'rowid, name, city, state, address, category, cells, kind, facility_id, latitude, longitude'
+
+CELLS = (
+    "'ca' || CAST((new.latitude + 90) / 10 AS INTEGER) || 'x' || CAST((new.longitude + 180) / 10 AS INTEGER)"
+    " || ' cb' || CAST(new.latitude + 90 AS INTEGER) || 'x' || CAST(new.longitude + 180 AS INTEGER)"
+    " || ' cc' || CAST((new.latitude + 90) * 10 AS INTEGER) || 'x' || CAST((new.longitude + 180) * 10 AS INTEGER)"
+)
+
+POLICE_VALUES = f"new.id * 2, new.name, new.city, new.state, new.address, 'police station', {CELLS}, 'police', new.id, new.latitude, new.longitude"
+HOSPITAL_VALUES = f"new.id * 2 + 1, new.name, new.city, new.state, new.address, new.hospital_type, {CELLS}, 'hospital', new.id, new.latitude, new.longitude"
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE safety_facility_fts USING fts5(
+        name, city, state, address, category, cells,
+        kind UNINDEXED, facility_id UNINDEXED, latitude UNINDEXED, longitude UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4 5 6'
+    )
+    """,
+    f"""
+    CREATE TRIGGER safety_policestation_fts_insert AFTER INSERT ON safety_policestation BEGIN
+        INSERT INTO safety_facility_fts({FACILITY_COLUMNS}) VALUES ({POLICE_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER safety_policestation_fts_update AFTER UPDATE ON safety_policestation BEGIN
+        DELETE FROM safety_facility_fts WHERE rowid = old.id * 2;
+        INSERT INTO safety_facility_fts({FACILITY_COLUMNS}) VALUES ({POLICE_VALUES});
+    END
+    """,
+    """
+    CREATE TRIGGER safety_policestation_fts_delete AFTER DELETE ON safety_policestation BEGIN
+        DELETE FROM safety_facility_fts WHERE rowid = old.id * 2;
+    END
+    """,
+    f"""
+    CREATE TRIGGER safety_hospital_fts_insert AFTER INSERT ON safety_hospital BEGIN
+        INSERT INTO safety_facility_fts({FACILITY_COLUMNS}) VALUES ({HOSPITAL_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER safety_hospital_fts_update AFTER UPDATE ON safety_hospital BEGIN
+        DELETE FROM safety_facility_fts WHERE rowid = old.id * 2 + 1;
+        INSERT INTO safety_facility_fts({FACILITY_COLUMNS}) VALUES ({HOSPITAL_VALUES});
+    END
+    """,
+    """
+    CREATE TRIGGER safety_hospital_fts_delete AFTER DELETE ON safety_hospital BEGIN
+        DELETE FROM safety_facility_fts WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    f"""
+    INSERT INTO safety_facility_fts({FACILITY_COLUMNS})
+    SELECT {POLICE_VALUES.replace('new.', '')} FROM safety_policestation
+    """,
+    f"""
+    INSERT INTO safety_facility_fts({FACILITY_COLUMNS})
+    SELECT {HOSPITAL_VALUES.replace('new.', '')} FROM safety_hospital
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS safety_policestation_fts_insert',
+    'DROP TRIGGER IF EXISTS safety_policestation_fts_update',
+    'DROP TRIGGER IF EXISTS safety_policestation_fts_delete',
+    'DROP TRIGGER IF EXISTS safety_hospital_fts_insert',
+    'DROP TRIGGER IF EXISTS safety_hospital_fts_update',
+    'DROP TRIGGER IF EXISTS safety_hospital_fts_delete',
+    'DROP TABLE IF EXISTS safety_facility_fts',
+]
+
+
+def create_facility_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_facility_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_facility_fts, drop_facility_fts),
+    ]
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from core.fts import cover_cells, fts_available, match_expression
+from .models import Hospital, PoliceStation
+
+FACILITY_KINDS = ('police', 'hospital')
+TEXT_COLUMNS = ('name', 'city', 'state', 'address', 'category')
+# bm25 weights for name, city, state, address, category and cells
+COLUMN_WEIGHTS = (10.0, 4.0, 2.0, 1.0, 3.0, 0.0)
+MAX_RESULTS = 100
+# At most this many matches are scored, so broad queries ("police") cost
+# the same as narrow ones; past it, ranking is among the most recently
+# indexed matches
+DEFAULT_CANDIDATE_LIMIT = 500
+
+RESULT_FIELDS = ('type', 'id', 'name', 'city', 'state', 'address', 'category', 'latitude', 'longitude')
+
+
+def search_facilities(query, kind=None, bbox=None, limit=20):
+    """Facilities matching ``query``, best match first.
+
+    Words are ANDed and the last one matches as a prefix. ``kind`` limits
+    results to 'police' or 'hospital' and ``bbox`` to
+    (min_lat, min_lng, max_lat, max_lng); the bbox is first matched as
+    grid cell tokens inside the index, then checked exactly. Returns dicts
+    with RESULT_FIELDS and a ``score`` (lower is better) straight from the
+    FTS index, so it's one query with no join back to the facility tables.
+    """
+    match = match_expression(query, columns=TEXT_COLUMNS)
+    if match is None:
+        return []
+    limit = max(1, min(limit, MAX_RESULTS))
+
+    if not fts_available():
+        return _search_without_fts(query, kind, bbox, limit)
+
+    filters = []
+    params = []
+    if bbox:
+        cells = cover_cells(bbox)
+        if cells:
+            match = f'{match} AND {cells}'
+        filters.append('AND latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s')
+        params.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+    if kind:
+        filters.append('AND kind = %s')
+        params.append(kind)
+
+    # Score the capped candidates once (MATERIALIZED, or SQLite re-runs
+    # bm25 for every reference), then read the stored columns of only the
+    # rows returned
+    materialized = 'MATERIALIZED' if connection.Database.sqlite_version_info >= (3, 35) else ''
+    sql = [
+        f'WITH candidates AS {materialized} (',
+        f'SELECT rowid, bm25(safety_facility_fts, {", ".join(str(weight) for weight in COLUMN_WEIGHTS)}) AS score',
+        'FROM safety_facility_fts WHERE safety_facility_fts MATCH %s',
+        *filters,
+        # FTS5 walks rowids backwards natively; the cap keeps the newest
+        'ORDER BY rowid DESC LIMIT %s',
+        f'), best AS {materialized} (SELECT rowid, score FROM candidates ORDER BY score LIMIT %s)',
+        'SELECT f.kind, f.facility_id, f.name, f.city, f.state, f.address, f.category, f.latitude, f.longitude, best.score',
+        'FROM best JOIN safety_facility_fts f ON f.rowid = best.rowid',
+        'ORDER BY best.score'
+    ]
+    params = [match, *params, getattr(settings, 'FACILITY_SEARCH_CANDIDATES', DEFAULT_CANDIDATE_LIMIT), limit]
+
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        rows = cursor.fetchall()
+
+    return [
+        dict(zip(RESULT_FIELDS, row[:-1]), score=round(row[-1], 4))
+        for row in rows
+    ]
+
+
+def _search_without_fts(query, kind, bbox, limit):
+    """LIKE-based fallback for databases without the FTS5 table"""
+    results = []
+    for facility_kind, model in (('police', PoliceStation), ('hospital', Hospital)):
+        if kind and kind != facility_kind:
+            continue
+        facilities = model.objects.all()
+        for term in query.split():
+            facilities = facilities.filter(
+                Q(name__icontains=term) | Q(city__icontains=term) | Q(state__icontains=term)
+            )
+        if bbox:
+            facilities = facilities.filter(
+                latitude__range=(bbox[0], bbox[2]),
+                longitude__range=(bbox[1], bbox[3])
+            )
+        for facility in facilities[:limit]:
+            results.append({
+                'type': facility_kind,
+                'id': facility.id,
+                'name': facility.name,
+                'city': facility.city,
+                'state': facility.state,
+                'address': facility.address,
+                'category': getattr(facility, 'hospital_type', 'police station'),
+                'latitude': facility.latitude,
+                'longitude': facility.longitude,
+                'score': None
+            })
+    return results[:limit]
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.response_cache import bump_namespace
+from .models import Hospital, PoliceStation, SafetyZone
+
+# Response cache namespace of each model's public views (see safety/views.py)
+CACHE_NAMESPACES = {
+    PoliceStation: 'police_stations',
+    Hospital: 'hospitals',
+    SafetyZone: 'safety_zones',
+}
+
+
+@receiver(post_save, sender=PoliceStation)
+@receiver(post_save, sender=Hospital)
+@receiver(post_save, sender=SafetyZone)
+@receiver(post_delete, sender=PoliceStation)
+@receiver(post_delete, sender=Hospital)
+@receiver(post_delete, sender=SafetyZone)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_namespace(CACHE_NAMESPACES[sender])
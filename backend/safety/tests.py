@@ -1,3 +1,114 @@
-from django.test import TestCase
+import contextlib
+import io
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from core import outbound
+from core.response_cache import normalized_query
+from .models import Hospital, PoliceStation
+from .search import _search_without_fts, search_facilities
+from .views import fetch_overpass_data, overpass_query_timeout
+
+
+class OverpassTests(TestCase):
+    def test_query_timeout_is_under_the_read_timeout(self):
+        self.assertLess(overpass_query_timeout(), outbound.upstream('overpass').timeout[1])
+        with mock.patch.object(outbound.client, 'post_json', return_value={'elements': []}) as post:
+            fetch_overpass_data(19.076, 72.8777)
+        self.assertIn(f'[timeout:{overpass_query_timeout()}]', post.call_args.kwargs['data']['data'])
+
+    def test_upstream_failure_gives_empty_results(self):
+        with mock.patch.object(outbound.client, 'post_json', side_effect=outbound.CircuitOpen('open')), \
+                contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(fetch_overpass_data(19.076, 72.8777), {'hospitals': [], 'police_stations': []})
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        PoliceStation.objects.create(name='Colaba Police Station', latitude=18.9067, longitude=72.8147, city='Mumbai', state='Maharashtra')
+
+    def test_repeat_requests_hit_with_any_parameter_order(self):
+        first = self.client.get('/api/safety/police-stations/?state=Maharashtra&city=Mumbai')
+        second = self.client.get('/api/safety/police-stations/?city=Mumbai&state=Maharashtra')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.client.get('/api/safety/police-stations/?city=Pune')['X-Cache'], 'MISS')
+
+    def test_saves_invalidate_only_their_namespace(self):
+        self.client.get('/api/safety/police-stations/')
+        self.client.get('/api/safety/hospitals/')
+        PoliceStation.objects.create(name='Fort Police Station', latitude=18.93, longitude=72.83)
+
+        response = self.client.get('/api/safety/police-stations/')
+        self.assertEqual((response['X-Cache'], response.json()['count']), ('MISS', 2))
+        self.assertEqual(self.client.get('/api/safety/hospitals/')['X-Cache'], 'HIT')
+
+        PoliceStation.objects.get(name='Fort Police Station').delete()
+        self.assertEqual(self.client.get('/api/safety/police-stations/').json()['count'], 1)
+
+    def test_cache_outage_serves_uncached(self):
+        with mock.patch.object(cache, 'get', side_effect=ConnectionError('down')), \
+                self.assertLogs('core.response_cache', 'WARNING'):
+            response = self.client.get('/api/safety/police-stations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Cache', response)
+
+    def test_normalized_query_sorts_keys_and_values(self):
+        request = RequestFactory().get('/?b=2&a=3&a=1')
+        self.assertEqual(normalized_query(request), 'a=1,3&b=2')
+
+
+class FacilitySearchTests(TestCase):
+    def setUp(self):
+        self.colaba = PoliceStation.objects.create(
+            name='Colaba Police Station', latitude=18.9067, longitude=72.8147, city='Mumbai', state='Maharashtra'
+        )
+        self.near_colaba = Hospital.objects.create(
+            name='St George Hospital', latitude=18.9406, longitude=72.8386, city='Mumbai', state='Maharashtra',
+            address='Near Colaba Causeway', hospital_type='hospital'
+        )
+        self.pune = PoliceStation.objects.create(
+            name='Shivajinagar Police Station', latitude=18.5308, longitude=73.8475, city='Pune', state='Maharashtra'
+        )
+
+    def ids(self, results):
+        return [(result['type'], result['id']) for result in results]
+
+    def test_prefix_match_ranks_names_first(self):
+        self.assertEqual(self.ids(search_facilities('cola')), [('police', self.colaba.id), ('hospital', self.near_colaba.id)])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.colaba.name = 'Cuffe Parade Police Station'
+        self.colaba.save()
+        self.assertEqual(self.ids(search_facilities('cuffe')), [('police', self.colaba.id)])
+        self.assertEqual(self.ids(search_facilities('colaba')), [('hospital', self.near_colaba.id)])
+        self.near_colaba.delete()
+        self.assertEqual(search_facilities('colaba'), [])
+
+    def test_kind_and_bbox_filters(self):
+        self.assertEqual(self.ids(search_facilities('maharashtra', kind='hospital')), [('hospital', self.near_colaba.id)])
+        in_mumbai = search_facilities('police', bbox=(18.85, 72.75, 19.0, 72.9))
+        self.assertEqual(self.ids(in_mumbai), [('police', self.colaba.id)])
+        # The bbox is checked exactly, not just by grid cell
+        self.assertEqual(search_facilities('police', bbox=(18.91, 72.75, 19.0, 72.9)), [])
+
+    def test_candidate_cap_keeps_the_newest_matches(self):
+        with override_settings(FACILITY_SEARCH_CANDIDATES=1):
+            self.assertEqual(self.ids(search_facilities('police')), [('police', self.pune.id)])
+
+    def test_fallback_finds_the_same_facilities(self):
+        for query in ('police station', 'mumbai'):
+            self.assertEqual(
+                set(self.ids(_search_without_fts(query, None, None, 20))), set(self.ids(search_facilities(query)))
+            )
+
+    def test_view_validates_input(self):
+        self.assertEqual(self.client.get('/api/safety/facilities/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/safety/facilities/search/?q=x&type=fire').status_code, 400)
+        self.assertEqual(self.client.get('/api/safety/facilities/search/?q=x&bbox=1,2').status_code, 400)
+        response = self.client.get('/api/safety/facilities/search/?q=shivaji&type=police')
+        self.assertEqual(response.json()['results'][0]['id'], self.pune.id)
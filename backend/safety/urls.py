@@ -7,6 +7,7 @@ urlpatterns = [
     path('police-stations/<int:station_id>/', views.get_police_station, name='get_police_station'),
     path('hospitals/', views.list_hospitals, name='list_hospitals'),
     path('hospitals/<int:hospital_id>/', views.get_hospital, name='get_hospital'),
+    path('facilities/search/', views.facility_search, name='facility_search'),
     path('safety-zones/', views.list_safety_zones, name='list_safety_zones'),
     path('safety-zones/<int:zone_id>/', views.get_safety_zone, name='get_safety_zone'),
     
@@ -8,15 +8,19 @@ from django.conf import settings
 from django.shortcuts import get_object_or_404
 from datetime import datetime, timedelta
 import json
-import requests
 import math
 import os
 import pandas as pd
 import numpy as np
 
+from core.fts import parse_bbox
+from core import outbound
+from core.response_cache import cache_response
+from core.routing import replica_reads
 from reports.serializers import ReportSerializer
 from .models import PoliceStation, Hospital, SafetyZone
 from .serializers import PoliceStationSerializer, HospitalSerializer, SafetyZoneSerializer
+from .search import FACILITY_KINDS, MAX_RESULTS, search_facilities
 from reports.models import Report
 from sos.models import SOSAlert
 
@@ -25,8 +29,25 @@ import csv
 from io import StringIO
 from django.http import HttpResponse
 
+OVERPASS_URL = 'https://overpass-api.de/api/interpreter'
+# The public instance is often overloaded: after 2 s without an answer the
+# next OVERPASS_MIRRORS entry is asked too, and the first answer is used
+outbound.register(
+    'overpass', [OVERPASS_URL, *getattr(settings, 'OVERPASS_MIRRORS', [])],
+    timeout=(3.05, 10), hedge_after=2, failure_threshold=3, open_seconds=60
+)
+
+
+def overpass_query_timeout():
+    """Seconds for a query's [timeout:], under our read timeout so Overpass gives up before we do"""
+    timeout = outbound.upstream('overpass').timeout
+    read = timeout[1] if isinstance(timeout, tuple) else timeout
+    return max(1, int(read) - 2)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_response('police_stations')
 def list_police_stations(request):
     """Get all police stations with optional filtering"""
     try:
@@ -52,6 +73,7 @@ def list_police_stations(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_response('police_stations')
 def get_police_station(request, station_id):
     """Get specific police station details"""
     try:
@@ -127,6 +149,7 @@ def nearby_police_stations(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_response('hospitals')
 def list_hospitals(request):
     """Get all hospitals with optional filtering"""
     try:
@@ -155,6 +178,7 @@ def list_hospitals(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_response('hospitals')
 def get_hospital(request, hospital_id):
     """Get specific hospital details"""
     try:
@@ -165,6 +189,34 @@ def get_hospital(request, hospital_id):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def facility_search(request):
+    """Full-text search over police stations and hospitals"""
+    query = request.GET.get('q', '').strip()
+    facility_type = request.GET.get('type')
+
+    if not query:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if facility_type and facility_type not in FACILITY_KINDS:
+        return Response({'error': f'type must be one of {", ".join(FACILITY_KINDS)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        bbox = parse_bbox(request.GET['bbox']) if request.GET.get('bbox') else None
+        limit = int(request.GET.get('limit', 20))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        results = search_facilities(query, kind=facility_type, bbox=bbox, limit=min(limit, MAX_RESULTS))
+        return Response({
+            'count': len(results),
+            'results': results
+        })
+
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def nearby_hospitals(request):
@@ -251,9 +303,8 @@ def analyze_area_risk(request):
 
 def fetch_overpass_hospitals(latitude, longitude, radius=5000):
     """Fetch nearby hospitals from Overpass API"""
-    overpass_url = 'https://overpass-api.de/api/interpreter'
     query = f"""
-    [out:json][timeout:25];
+    [out:json][timeout:{overpass_query_timeout()}];
     (
       node["amenity"="hospital"](around:{radius},{latitude},{longitude});
       way["amenity"="hospital"](around:{radius},{latitude},{longitude});
@@ -262,12 +313,8 @@ def fetch_overpass_hospitals(latitude, longitude, radius=5000):
     """
 
     try:
-        response = requests.post(overpass_url, data={'data': query}, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            return process_overpass_hospitals(data, latitude, longitude)
-        else:
-            return []
+        data = outbound.client.post_json('overpass', data={'data': query}, stale=True)
+        return process_overpass_hospitals(data, latitude, longitude)
     except Exception as e:
         print(f"Overpass API error: {e}")
         return []
@@ -327,7 +374,7 @@ def calculate_comprehensive_risk_analysis(user_lat, user_lng, radius):
         bbox = get_bounding_box(user_lat, user_lng, radius)
 
         # Get all relevant data
-        reports = Report.objects.filter(
+        reports = Report.objects.for_area(user_lat, user_lng, radius).filter(
             latitude__gte=bbox['min_lat'],
             latitude__lte=bbox['max_lat'],
             longitude__gte=bbox['min_lng'],
@@ -406,6 +453,7 @@ def calculate_comprehensive_risk_analysis(user_lat, user_lng, radius):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_response('safety_zones')
 def list_safety_zones(request):
     """Get all safety zones"""
     try:
@@ -700,10 +748,8 @@ def get_bounding_box(lat, lng, radius):
 
 def fetch_overpass_data(latitude, longitude, radius=5000):
     """Fetch nearby POIs from Overpass API"""
-    overpass_url = 'https://overpass-api.de/api/interpreter'
-    
     query = f"""
-    [out:json][timeout:25];
+    [out:json][timeout:{overpass_query_timeout()}];
     (
       node["amenity"="police"](around:{radius},{latitude},{longitude});
       way["amenity"="police"](around:{radius},{latitude},{longitude});
@@ -714,12 +760,8 @@ def fetch_overpass_data(latitude, longitude, radius=5000):
     """
     
     try:
-        response = requests.post(overpass_url, data={'data': query}, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            return process_overpass_data(data)
-        else:
-            return {'hospitals': [], 'police_stations': []}
+        data = outbound.client.post_json('overpass', data={'data': query}, stale=True)
+        return process_overpass_data(data)
     except Exception as e:
         print(f"Overpass API error: {e}")
         return {'hospitals': [], 'police_stations': []}
@@ -794,7 +836,7 @@ def calculate_manual_safety_zones(user_lat, user_lng, radius=3000):
         bbox = get_bounding_box(user_lat, user_lng, radius)
         
         # Get reports in the area
-        nearby_reports = Report.objects.filter(
+        nearby_reports = Report.objects.for_area(user_lat, user_lng, radius).filter(
             latitude__gte=bbox['min_lat'],
             latitude__lte=bbox['max_lat'],
             longitude__gte=bbox['min_lng'],
@@ -1018,7 +1060,7 @@ def calculate_grid_risk(lat, lng):
     # Count incidents within radius
     bbox = get_bounding_box(lat, lng, search_radius)
     
-    nearby_reports = Report.objects.filter(
+    nearby_reports = Report.objects.for_area(lat, lng, search_radius).filter(
         latitude__gte=bbox['min_lat'],
         latitude__lte=bbox['max_lat'],
         longitude__gte=bbox['min_lng'],
@@ -1083,6 +1125,7 @@ def calculate_grid_risk(lat, lng):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@replica_reads
 def safety_map_reports(request):
     """Get all reports including SOS alerts for safety map"""
     # Get regular reports
@@ -1449,8 +1492,16 @@ def nearby_facilities(request):
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # Add a new API endpoint to get CSV statistics
+def police_csv_mtime(request):
+    """Cache key part for views reading police_station_data.csv, so edits to the file show up"""
+    try:
+        return os.path.getmtime(os.path.join(settings.BASE_DIR, 'police_station_data.csv'))
+    except OSError:
+        return None
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_response(vary_on=police_csv_mtime)
 def csv_statistics(request):
     """Get statistics about the CSV police station data"""
     try:
@@ -1509,6 +1560,7 @@ def predict_safety_zones(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@replica_reads
 def nearby_reports(request):
     """Get reports and SOS alerts within specified radius with stats"""
     try:
@@ -1523,7 +1575,7 @@ def nearby_reports(request):
         bbox = get_bounding_box(user_lat, user_lng, radius)
         
         # Get nearby reports
-        nearby_reports = Report.objects.filter(
+        nearby_reports = Report.objects.for_area(user_lat, user_lng, radius).filter(
             latitude__gte=bbox['min_lat'],
             latitude__lte=bbox['max_lat'],
             longitude__gte=bbox['min_lng'],
@@ -1603,7 +1655,7 @@ def calculate_enhanced_grid_risk(lat, lng, user_lat, user_lng, radius):
     # Count incidents within radius with distance weighting
     bbox = get_bounding_box(lat, lng, search_radius)
     
-    nearby_reports = Report.objects.filter(
+    nearby_reports = Report.objects.for_area(lat, lng, search_radius).filter(
         latitude__gte=bbox['min_lat'],
         latitude__lte=bbox['max_lat'],
         longitude__gte=bbox['min_lng'],
@@ -1666,6 +1718,7 @@ def calculate_enhanced_grid_risk(lat, lng, user_lat, user_lng, radius):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@replica_reads
 def get_chloropleth_data(request):
     """Get enhanced chloropleth data with better resolution and smooth gradients"""
     try:
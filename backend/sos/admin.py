@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SOSAlert, Volunteer, VolunteerAlert, SOSLocationUpdate, SOSVideoFeed, PoliceVideoView
+from .models import SOSAlert, Volunteer, VolunteerAlert, SOSLocationUpdate, SOSVideoFeed, PoliceVideoView, VideoUploadSession
 
 @admin.register(SOSAlert)
 class SOSAlertAdmin(admin.ModelAdmin):
@@ -26,3 +26,4 @@ class VolunteerAlertAdmin(admin.ModelAdmin):
 admin.site.register(SOSLocationUpdate)
 admin.site.register(SOSVideoFeed)
 admin.site.register(PoliceVideoView)
+admin.site.register(VideoUploadSession)
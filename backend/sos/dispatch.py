@@ -0,0 +1,54 @@
+import logging
+
+from django.db import IntegrityError, transaction
+
+from .models import VolunteerAlert
+from .volunteer_index import volunteer_index
+
+logger = logging.getLogger(__name__)
+
+
+def dispatch_volunteer_alerts(sos_alert, latitude, longitude, radius_meters):
+    """Alert every live volunteer within radius of an SOS.
+
+    Candidates and their distances come from the volunteer index in one
+    vectorized pass, and all alerts are written with a single bulk insert
+    inside one transaction, so the number of queries doesn't grow with the
+    number of volunteers. Volunteers already alerted for this SOS are
+    skipped (the unique_together on VolunteerAlert also guards against
+    concurrent dispatches).
+
+    Returns {volunteer_id: distance} for the volunteers alerted by this call.
+    """
+    matches = volunteer_index.within_radius(latitude, longitude, radius_meters)
+    if not matches:
+        return {}
+
+    try:
+        return _create_alerts(sos_alert, matches)
+    except IntegrityError:
+        # A volunteer was deleted by another worker since the index last
+        # synced; refresh the index and retry once.
+        logger.warning(f"Stale volunteer index while alerting for SOS {sos_alert.id}, re-syncing")
+        volunteer_index.warm()
+        matches = volunteer_index.within_radius(latitude, longitude, radius_meters)
+        return _create_alerts(sos_alert, matches)
+
+
+def _create_alerts(sos_alert, matches):
+    with transaction.atomic():
+        already_alerted = set(
+            VolunteerAlert.objects.filter(sos_alert=sos_alert).values_list('volunteer_id', flat=True)
+        )
+        new_alerts = [
+            VolunteerAlert(
+                sos_alert=sos_alert,
+                volunteer_id=volunteer_id,
+                distance=round(distance, 1)
+            )
+            for volunteer_id, distance in matches
+            if volunteer_id not in already_alerted
+        ]
+        VolunteerAlert.objects.bulk_create(new_alerts, batch_size=500, ignore_conflicts=True)
+
+    return {alert.volunteer_id: alert.distance for alert in new_alerts}
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .dispatch import dispatch_volunteer_alerts
+from .models import SOSAlert, VolunteerAlert
+from .timing_wheel import HierarchicalTimingWheel
+
+logger = logging.getLogger(__name__)
+
+# Search radii (meters) tried in order while nobody responds
+DEFAULT_ESCALATION_RINGS = [2000, 5000, 10000]
+# Seconds to wait for a response before widening to the next ring
+DEFAULT_ESCALATION_TIMEOUT = 60
+
+
+class EscalationScheduler:
+    """Widens the volunteer search for SOS alerts nobody has responded to.
+
+    Each active alert has at most one timer in a hierarchical timing wheel,
+    carrying the index of the ring to alert next. When it fires and the
+    alert is still active with no responded VolunteerAlert, that ring is
+    alerted and the following one is scheduled. A daemon thread turns the
+    wheel once per second.
+
+    Timers live in the worker that dispatched the first ring; a resolve
+    handled by another worker won't cancel them, but the is_active check
+    when the timer fires makes that harmless.
+    """
+
+    def __init__(self, tick=1.0):
+        self.tick = tick
+        self.wheel = HierarchicalTimingWheel(tick=tick, now=time.monotonic())
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def rings(self):
+        return getattr(settings, 'SOS_ESCALATION_RINGS', DEFAULT_ESCALATION_RINGS)
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'SOS_ESCALATION_TIMEOUT_SECONDS', DEFAULT_ESCALATION_TIMEOUT)
+
+    def start_escalation(self, sos_id, alerted_radius):
+        """Schedule the ring after ``alerted_radius``; returns its radius or None"""
+        for ring_index, radius in enumerate(self.rings):
+            if radius > alerted_radius:
+                self._schedule(sos_id, ring_index)
+                return radius
+        self.cancel(sos_id)
+        return None
+
+    def cancel(self, sos_id):
+        with self._lock:
+            return self.wheel.cancel(sos_id)
+
+    def pending(self):
+        with self._lock:
+            return len(self.wheel)
+
+    def _schedule(self, sos_id, ring_index):
+        with self._lock:
+            self.wheel.schedule(sos_id, self.timeout, ring_index, now=time.monotonic())
+        self._ensure_running()
+
+    def _ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='sos-escalation', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            with self._lock:
+                expired = self.wheel.advance(time.monotonic())
+            if not expired:
+                continue
+            try:
+                for sos_id, ring_index in expired:
+                    self.escalate(sos_id, ring_index)
+            finally:
+                close_old_connections()
+
+    def escalate(self, sos_id, ring_index):
+        """Alert ring ``ring_index`` for an SOS if it's still unanswered"""
+        try:
+            sos_alert = SOSAlert.objects.filter(id=sos_id, is_active=True).first()
+            if sos_alert is None:
+                return
+            if VolunteerAlert.objects.filter(sos_alert_id=sos_id, responded=True).exists():
+                return
+
+            radius = self.rings[ring_index]
+            alerted = dispatch_volunteer_alerts(sos_alert, sos_alert.latitude, sos_alert.longitude, radius)
+            logger.info(f"Escalated SOS {sos_id} to {radius}m ring: alerted {len(alerted)} more volunteers")
+
+            if ring_index + 1 < len(self.rings):
+                self._schedule(sos_id, ring_index + 1)
+        except Exception as e:
+            logger.error(f"Error escalating SOS {sos_id}: {str(e)}")
+
+
+escalation_scheduler = EscalationScheduler()
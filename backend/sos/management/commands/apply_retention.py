@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from sos.retention import retention_policy, run_retention
+
+
+class Command(BaseCommand):
+    help = 'Compact, expire and evict data of resolved emergencies per SOS_RETENTION_POLICY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Emergencies to compact in this run')
+        parser.add_argument('--max-video-bytes', type=int, help='Override the sos_videos/ high-water mark')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['batch_size']:
+            overrides['batch_size'] = options['batch_size']
+        if options['max_video_bytes']:
+            overrides['max_video_bytes'] = options['max_video_bytes']
+
+        stats = run_retention(retention_policy(overrides))
+        for key, value in stats.items():
+            self.stdout.write(f'{key}: {value}')
+        self.stdout.write(self.style.SUCCESS('Retention applied'))
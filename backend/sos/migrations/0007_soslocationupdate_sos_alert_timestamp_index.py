@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sos', '0006_remove_sosvideofeed_viewed_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='soslocationupdate',
+            index=models.Index(fields=['sos_alert', 'timestamp'], name='sos_sosloca_sos_ale_792e3d_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:51
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sos', '0007_soslocationupdate_sos_alert_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoUploadSession',
+            fields=[
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('emergency_id', models.CharField(db_index=True, max_length=50)),
+                ('chunk_sequence', models.IntegerField(default=0)),
+                ('filename', models.CharField(max_length=100)),
+                ('total_size', models.BigIntegerField(blank=True, null=True)),
+                ('received_bytes', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('video_feed', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='sos.sosvideofeed')),
+            ],
+        ),
+    ]
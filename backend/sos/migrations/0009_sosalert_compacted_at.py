@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sos', '0008_videouploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sosalert',
+            name='compacted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sos', '0009_sosalert_compacted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sosvideofeed',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='videouploadsession',
+            name='video_feed',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='sos.sosvideofeed'),
+        ),
+        migrations.AddIndex(
+            model_name='sosvideofeed',
+            index=models.Index(fields=['emergency_id', 'content_hash'], name='sos_sosvide_emergen_63f346_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sos', '0010_sosvideofeed_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sosalert',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sos', '0011_sosalert_shard'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='policevideoview',
+            name='viewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
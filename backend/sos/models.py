@@ -1,7 +1,11 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from core.sharding import ID_BLOCK, ShardedManager, alias_for_id, shard_id_for_point, sharding_active
+
 User = get_user_model()
 
 class SOSAlert(models.Model):
@@ -29,6 +33,18 @@ class SOSAlert(models.Model):
     total_video_duration = models.IntegerField(default=0)  # in seconds
     video_chunks_count = models.IntegerField(default=0)
 
+    # Set once retention has archived the chunks and simplified the track
+    compacted_at = models.DateTimeField(null=True, blank=True)
+
+    # shard_id of the region shard holding its location updates, fixed by
+    # where the alert was raised (core/sharding.py)
+    shard = models.PositiveSmallIntegerField(default=0)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and sharding_active():
+            self.shard = shard_id_for_point(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         status = "ACTIVE" if self.is_active else "RESOLVED"
         return f"SOS #{self.id} - {self.emergency_type} ({status})"
@@ -40,6 +56,19 @@ class SOSLocationUpdate(models.Model):
     accuracy = models.FloatField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    # Spans every region shard (core/sharding.py)
+    objects = ShardedManager()
+
+    def shard_alias(self):
+        # The whole track stays on its alert's shard, even past a state
+        # border, so its ids keep growing for the id__gt readers
+        return alias_for_id(self.sos_alert.shard * ID_BLOCK)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sos_alert', 'timestamp']),
+        ]
+
 # class SOSVideoFeed(models.Model):
 #     sos_alert = models.ForeignKey(SOSAlert, on_delete=models.CASCADE, related_name='video_feeds')
 #     video_file = models.FileField(upload_to='sos_videos/')
@@ -68,22 +97,40 @@ class SOSVideoFeed(models.Model):
     file_size = models.BigIntegerField(null=True, blank=True)  # in bytes
     duration = models.FloatField(null=True, blank=True)  # in seconds
     chunk_sequence = models.IntegerField(default=0)  # sequence number
+    content_hash = models.CharField(max_length=64, blank=True)  # sha256 of the chunk bytes
     
     class Meta:
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['emergency_id', '-timestamp']),
+            models.Index(fields=['emergency_id', 'content_hash']),
         ]
 
     def __str__(self):
         return f"Video Feed {self.chunk_sequence} for Emergency {self.emergency_id}"
 
 
+class VideoUploadSession(models.Model):
+    """Resumable upload of one video chunk, streamed to a partial file"""
+    upload_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    emergency_id = models.CharField(max_length=50, db_index=True)
+    chunk_sequence = models.IntegerField(default=0)
+    filename = models.CharField(max_length=100)
+    total_size = models.BigIntegerField(null=True, blank=True)  # in bytes, if known up front
+    received_bytes = models.BigIntegerField(default=0)
+    video_feed = models.ForeignKey(SOSVideoFeed, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.upload_id} for Emergency {self.emergency_id} ({self.received_bytes} bytes)"
+
+
 # NEW: Track which police officers have viewed the feeds
 class PoliceVideoView(models.Model):
     video_feed = models.ForeignKey(SOSVideoFeed, on_delete=models.CASCADE, related_name='police_views')
     police_officer = models.ForeignKey(User, on_delete=models.CASCADE)
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    viewed_at = models.DateTimeField(default=timezone.now)
     viewing_duration = models.IntegerField(null=True, blank=True)  # in seconds
     
     class Meta:
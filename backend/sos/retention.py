@@ -0,0 +1,221 @@
+import logging
+import os
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.sharding import alias_for_id
+from .models import SOSAlert, SOSLocationUpdate, SOSVideoFeed
+from .segments import RECORDINGS_DIR, SegmentStore
+from .tracking import douglas_peucker, track_cache
+from .uploads import purge_stale_uploads
+
+logger = logging.getLogger(__name__)
+
+# Override any of these with the SOS_RETENTION_POLICY setting
+DEFAULT_RETENTION_POLICY = {
+    # Days after resolved_at before raw chunks are folded into the
+    # emergency's recording and its track is simplified
+    'compact_after_days': 7,
+    # Douglas-Peucker tolerance (meters) of the track that is kept forever
+    'track_tolerance': 5,
+    # Days after resolved_at to keep recordings; None keeps them forever
+    'delete_recordings_after_days': None,
+    # High-water mark for sos_videos/ in bytes; None disables eviction
+    'max_video_bytes': None,
+    # Eviction frees space down to this fraction of max_video_bytes
+    'low_water_ratio': 0.8,
+    # Unfinished resumable uploads idle this long are removed
+    'stale_upload_hours': 24,
+    # Emergencies compacted per run
+    'batch_size': 50,
+}
+
+DELETE_BATCH_SIZE = 500
+
+
+def retention_policy(overrides=None):
+    policy = dict(DEFAULT_RETENTION_POLICY)
+    policy.update(getattr(settings, 'SOS_RETENTION_POLICY', {}))
+    policy.update(overrides or {})
+    return policy
+
+
+def _video_feeds(sos_id):
+    return SOSVideoFeed.objects.filter(
+        Q(sos_alert_id=sos_id) | Q(emergency_id=str(sos_id))
+    ).exclude(video_file='')
+
+
+def _delete_media(names):
+    """Delete files under MEDIA_ROOT; returns bytes freed"""
+    freed = 0
+    for name in names:
+        try:
+            freed += default_storage.size(name)
+            default_storage.delete(name)
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def archive_video_chunks(sos_id):
+    """Fold an emergency's chunk files into its recording and delete them.
+
+    Chunks are appended through the segment store (most already are), and
+    only chunks the recording index holds are deleted. Their SOSVideoFeed
+    rows stay, with an empty video_file. Returns bytes freed.
+    """
+    feeds = list(_video_feeds(sos_id).order_by('chunk_sequence', 'id'))
+    if not feeds:
+        return 0
+
+    store = SegmentStore(sos_id)
+    archived = {segment['feed_id'] for segment in store.load_index()['segments']}
+    for feed in feeds:
+        if feed.id not in archived:
+            store.add_chunk(feed.chunk_sequence, feed.video_file.name, duration=feed.duration, feed_id=feed.id)
+    index = store.flush()
+    archived = {segment['feed_id'] for segment in index['segments']} if index else set()
+
+    archived_feeds = [feed for feed in feeds if feed.id in archived]
+    SOSVideoFeed.objects.filter(id__in=[feed.id for feed in archived_feeds]).update(video_file='')
+    return _delete_media(feed.video_file.name for feed in archived_feeds)
+
+
+def simplify_stored_track(sos_id, tolerance):
+    """Replace an emergency's location updates with its simplified track.
+
+    The deletes run in one transaction per database holding the track, as
+    region shards aren't covered by a default-database transaction.
+    Returns the number of rows deleted.
+    """
+    rows = list(
+        SOSLocationUpdate.objects.filter(sos_alert_id=sos_id)
+        .order_by('timestamp', 'id')
+        .values('id', 'latitude', 'longitude')
+    )
+    kept = {rows[i]['id'] for i in douglas_peucker(rows, tolerance)}
+    dropped = {}
+    for row in rows:
+        if row['id'] not in kept:
+            dropped.setdefault(alias_for_id(row['id']), []).append(row['id'])
+
+    for alias, ids in dropped.items():
+        with transaction.atomic(using=alias):
+            for start in range(0, len(ids), DELETE_BATCH_SIZE):
+                SOSLocationUpdate.objects.using(alias).filter(id__in=ids[start:start + DELETE_BATCH_SIZE]).delete()
+    if dropped:
+        track_cache.evict(sos_id)
+    return sum(len(ids) for ids in dropped.values())
+
+
+def compact_resolved_emergencies(policy, now):
+    cutoff = now - timedelta(days=policy['compact_after_days'])
+    alert_ids = list(
+        SOSAlert.objects.filter(
+            is_active=False,
+            resolved_at__lt=cutoff,
+            compacted_at__isnull=True
+        ).order_by('resolved_at').values_list('id', flat=True)[:policy['batch_size']]
+    )
+
+    stats = {'compacted': 0, 'chunk_bytes_freed': 0, 'track_points_deleted': 0}
+    for sos_id in alert_ids:
+        stats['chunk_bytes_freed'] += archive_video_chunks(sos_id)
+        stats['track_points_deleted'] += simplify_stored_track(sos_id, policy['track_tolerance'])
+        # Only once the deletes have committed; a failed run simplifies again.
+        # update() rather than save() so SOSAlert signals don't fire
+        SOSAlert.objects.filter(id=sos_id).update(compacted_at=now)
+        stats['compacted'] += 1
+    return stats
+
+
+def _recorded_emergency_ids():
+    root = os.path.join(settings.MEDIA_ROOT, RECORDINGS_DIR)
+    if not os.path.isdir(root):
+        return set()
+    return {int(entry.name) for entry in os.scandir(root) if entry.is_dir() and entry.name.isdigit()}
+
+
+def evict_emergency_video(sos_id):
+    """Delete every video file of an emergency; returns bytes freed"""
+    feeds = list(_video_feeds(sos_id).only('id', 'video_file'))
+    freed = _delete_media(feed.video_file.name for feed in feeds)
+    SOSVideoFeed.objects.filter(id__in=[feed.id for feed in feeds]).update(video_file='')
+
+    store = SegmentStore(sos_id)
+    if os.path.isdir(store.directory):
+        freed += directory_size(store.directory)
+        shutil.rmtree(store.directory, ignore_errors=True)
+    return freed
+
+
+def delete_expired_recordings(policy, now):
+    if policy['delete_recordings_after_days'] is None:
+        return 0
+    cutoff = now - timedelta(days=policy['delete_recordings_after_days'])
+    expired = SOSAlert.objects.filter(
+        id__in=_recorded_emergency_ids(),
+        is_active=False,
+        resolved_at__lt=cutoff
+    ).values_list('id', flat=True)
+    return sum(evict_emergency_video(sos_id) for sos_id in expired)
+
+
+def evict_for_disk_quota(policy):
+    """Evict the oldest resolved emergencies' video until under the low-water mark"""
+    if not policy['max_video_bytes']:
+        return 0
+    usage = directory_size(os.path.join(settings.MEDIA_ROOT, 'sos_videos'))
+    if usage <= policy['max_video_bytes']:
+        return 0
+
+    target = policy['max_video_bytes'] * policy['low_water_ratio']
+    logger.warning(f"sos_videos/ uses {usage} bytes (limit {policy['max_video_bytes']}), evicting down to {int(target)}")
+
+    with_video = _recorded_emergency_ids() | set(
+        SOSVideoFeed.objects.exclude(video_file='').exclude(sos_alert__isnull=True)
+        .values_list('sos_alert_id', flat=True).distinct()
+    )
+    candidates = SOSAlert.objects.filter(
+        id__in=with_video,
+        is_active=False,
+        resolved_at__isnull=False
+    ).order_by('resolved_at').values_list('id', flat=True)
+
+    freed = 0
+    for sos_id in candidates.iterator():
+        if usage - freed <= target:
+            break
+        freed += evict_emergency_video(sos_id)
+        logger.info(f"Evicted video for resolved SOS {sos_id}")
+    return freed
+
+
+def run_retention(policy=None):
+    """Apply the retention policy once; returns a summary dict"""
+    policy = policy or retention_policy()
+    now = timezone.now()
+
+    stats = compact_resolved_emergencies(policy, now)
+    stats['expired_bytes_freed'] = delete_expired_recordings(policy, now)
+    stats['evicted_bytes_freed'] = evict_for_disk_quota(policy)
+    stats['stale_uploads_removed'] = purge_stale_uploads(timedelta(hours=policy['stale_upload_hours']))
+    return stats
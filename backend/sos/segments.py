@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.text import get_valid_filename
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RECORDINGS_DIR = 'sos_videos/recordings'
+RECORDING_NAME = 'recording.webm'
+INDEX_NAME = 'index.json'
+
+# The client records discrete ~10 s chunks; used when a feed has no duration
+DEFAULT_SEGMENT_DURATION = 10.0
+# Out-of-order chunks held back before a missing one is given up on
+DEFAULT_MAX_PENDING = 3
+
+COPY_BUFFER_SIZE = 256 * 1024
+
+_process_lock = threading.Lock()
+
+
+class SegmentStore:
+    """Append-only recording of one emergency's video chunks.
+
+    Chunks are appended to a single file in chunk_sequence order, with a
+    JSON index of each segment's byte offset, length and start time. Every
+    chunk is a complete WebM file of its own, so the recording is a
+    playlist rather than one stream: a player fetches each segment with an
+    HTTP Range request and plays them in turn, which keeps working once
+    retention has deleted the chunk files. Chunks that arrive early wait
+    in the index until the gap before them is filled; after
+    SOS_SEGMENT_MAX_PENDING of them the missing sequence is skipped.
+    """
+
+    def __init__(self, emergency_id):
+        self.emergency_id = str(emergency_id)
+        # Relative to MEDIA_ROOT, as stored in FileFields
+        self.recording_name = '/'.join([RECORDINGS_DIR, get_valid_filename(self.emergency_id), RECORDING_NAME])
+        self.directory = os.path.join(
+            settings.MEDIA_ROOT, RECORDINGS_DIR, get_valid_filename(self.emergency_id)
+        )
+        self.recording_path = os.path.join(self.directory, RECORDING_NAME)
+        self.index_path = os.path.join(self.directory, INDEX_NAME)
+
+    @property
+    def max_pending(self):
+        return getattr(settings, 'SOS_SEGMENT_MAX_PENDING', DEFAULT_MAX_PENDING)
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            with _process_lock:
+                yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {
+                'emergency_id': self.emergency_id,
+                'next_sequence': None,
+                'size': 0,
+                'duration': 0.0,
+                'segments': [],
+                'pending': {},
+                'skipped': []
+            }
+
+    def _save_index(self, index):
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def add_chunk(self, sequence, chunk_name, duration=None, feed_id=None):
+        """Queue a chunk file (path relative to MEDIA_ROOT) and append what's in order"""
+        with self._locked():
+            index = self.load_index()
+            key = str(sequence)
+            if index['next_sequence'] is None:
+                # Chunks number from 0; a client counting from 1 waits out
+                # max_pending once and chunk 0 is recorded as skipped
+                index['next_sequence'] = 0
+            if sequence < index['next_sequence'] or key in index['pending']:
+                logger.info(f"Ignoring duplicate chunk {sequence} for emergency {self.emergency_id}")
+                return index
+
+            index['pending'][key] = {
+                'chunk': chunk_name,
+                'duration': duration,
+                'feed_id': feed_id
+            }
+            self._drain(index)
+            while len(index['pending']) > self.max_pending:
+                self._skip_gap(index)
+                self._drain(index)
+
+            self._save_index(index)
+            return index
+
+    def flush(self):
+        """Append everything still pending, skipping gaps (e.g. once the SOS ends)"""
+        if not self.exists():
+            return None
+        with self._locked():
+            index = self.load_index()
+            while index['pending']:
+                self._skip_gap(index)
+                self._drain(index)
+            self._save_index(index)
+            return index
+
+    def _skip_gap(self, index):
+        next_sequence = min(int(key) for key in index['pending'])
+        index['skipped'].extend(range(index['next_sequence'], next_sequence))
+        logger.warning(
+            f"Skipping missing chunks {index['next_sequence']}-{next_sequence - 1} "
+            f"for emergency {self.emergency_id}"
+        )
+        index['next_sequence'] = next_sequence
+
+    def _drain(self, index):
+        while str(index['next_sequence']) in index['pending']:
+            sequence = index['next_sequence']
+            entry = index['pending'].pop(str(sequence))
+            try:
+                self._append(index, sequence, entry)
+            except FileNotFoundError:
+                logger.warning(f"Chunk {sequence} for emergency {self.emergency_id} is missing on disk")
+                index['skipped'].append(sequence)
+            index['next_sequence'] = sequence + 1
+
+    def _append(self, index, sequence, entry):
+        offset = index['size']
+        with open(os.path.join(settings.MEDIA_ROOT, entry['chunk']), 'rb') as source:
+            with open(self.recording_path, 'ab') as recording:
+                # Drop bytes from an append that crashed before the index was saved
+                recording.truncate(offset)
+                shutil.copyfileobj(source, recording, COPY_BUFFER_SIZE)
+                length = recording.tell() - offset
+
+        duration = entry['duration'] or DEFAULT_SEGMENT_DURATION
+        index['segments'].append({
+            'sequence': sequence,
+            'offset': offset,
+            'length': length,
+            'start_time': index['duration'],
+            'duration': duration,
+            'feed_id': entry['feed_id']
+        })
+        index['size'] = offset + length
+        index['duration'] = round(index['duration'] + duration, 3)
+
+
+def add_video_feed(video_feed):
+    """Append a saved SOSVideoFeed chunk to its emergency's recording"""
+    emergency_id = video_feed.emergency_id or video_feed.sos_alert_id
+    if not emergency_id or not video_feed.video_file:
+        return None
+    return SegmentStore(emergency_id).add_chunk(
+        int(video_feed.chunk_sequence),
+        video_feed.video_file.name,
+        duration=video_feed.duration,
+        feed_id=video_feed.id
+    )
+
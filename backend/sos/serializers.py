@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from cityshield_backend.media import signed_media_url
 from .models import SOSAlert, Volunteer, VolunteerAlert, SOSLocationUpdate, SOSVideoFeed
 
 User = get_user_model()
@@ -377,10 +378,10 @@ class SOSVideoFeedSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = SOSVideoFeed
+        # No raw video_file: its URL is the unsigned /media/ path; video_url is the signed one
         fields = [
-            'id', 'sos_alert', 'video_file', 'video_url', 'file_size', 'file_size_formatted',
-            'sent_to_police', 'timestamp', 'time_since_upload', 'chunk_sequence',
-            'viewed_by_police', 'viewed_at'  # ADDED: Include new fields
+            'id', 'sos_alert', 'video_url', 'file_size', 'file_size_formatted',
+            'sent_to_police', 'timestamp', 'time_since_upload', 'chunk_sequence'
         ]
         read_only_fields = ['id', 'video_url', 'file_size_formatted', 'time_since_upload']
     
@@ -423,10 +424,7 @@ class SOSVideoFeedSerializer(serializers.ModelSerializer):
     def get_video_url(self, obj):
         """Get full video URL"""
         if obj.video_file:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.video_file.url)
-            return obj.video_file.url
+            return signed_media_url(obj.video_file.name, self.context.get('request'))
         return None
 
 class SOSVideoFeedCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.sharding import sharding_active
+from .models import SOSAlert, SOSLocationUpdate, SOSVideoFeed, Volunteer
+from .tasks import append_video_feed
+from .volunteer_index import volunteer_index
+
+
+@receiver(post_save, sender=Volunteer)
+def update_volunteer_index(sender, instance, **kwargs):
+    """Keep the live volunteer index in step with availability/location writes"""
+    volunteer_index.update(instance)
+
+
+@receiver(post_delete, sender=Volunteer)
+def remove_from_volunteer_index(sender, instance, **kwargs):
+    volunteer_index.remove(instance.id)
+
+
+@receiver(post_save, sender=SOSVideoFeed)
+def append_to_recording(sender, instance, created, **kwargs):
+    """Queue new chunks for the emergency's segmented recording once committed"""
+    if created:
+        transaction.on_commit(lambda: append_video_feed.delay(instance.id))
+
+
+@receiver(post_delete, sender=SOSAlert)
+def delete_sharded_location_updates(sender, instance, **kwargs):
+    """The cascade only reaches updates in the default database, not region shards"""
+    if sharding_active():
+        SOSLocationUpdate.objects.filter(sos_alert_id=instance.id).delete()
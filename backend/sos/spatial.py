@@ -0,0 +1,159 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+EARTH_RADIUS = 6371000  # meters
+METERS_PER_DEGREE = 111320
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Distance in meters between two points"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lng2 - lng1)
+
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_many(lat, lng, lats, lngs):
+    """Distances in meters from one point to arrays of points, in one vectorized pass"""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=float))
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(np.asarray(lngs, dtype=float) - lng)
+
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+class GridIndex:
+    """In-memory grid bucket map of point positions keyed by id.
+
+    Points are bucketed into cells of ``cell_size`` degrees so radius and
+    k-nearest queries only look at the cells overlapping the search circle.
+    If ``ttl`` (seconds) is set, entries older than that are dropped lazily
+    when a query runs into them.
+    """
+
+    def __init__(self, cell_size=0.01, ttl=None):
+        self.cell_size = cell_size
+        self.ttl = ttl
+        self._cells = {}
+        self._entries = {}  # key -> (lat, lng, updated_at, cell)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def upsert(self, key, lat, lng, updated_at=None):
+        """Insert or move a point; ``updated_at`` is an epoch timestamp"""
+        if updated_at is None:
+            updated_at = time.time()
+        cell = self._cell(lat, lng)
+        with self._lock:
+            self._discard(key)
+            self._cells.setdefault(cell, {})[key] = (lat, lng)
+            self._entries[key] = (lat, lng, updated_at, cell)
+
+    def remove(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        bucket = self._cells.get(entry[3])
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[entry[3]]
+
+    def get(self, key):
+        """Return (lat, lng, updated_at) for a key, or None"""
+        entry = self._entries.get(key)
+        return entry[:3] if entry else None
+
+    def _candidates(self, lat, lng, radius):
+        """Points in the cells overlapping the search circle as (key, lat, lng)"""
+        lat_offset = radius / METERS_PER_DEGREE
+        lng_offset = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        min_cell = self._cell(lat - lat_offset, lng - lng_offset)
+        max_cell = self._cell(lat + lat_offset, lng + lng_offset)
+        expire_before = time.time() - self.ttl if self.ttl else None
+
+        candidates = []
+        expired = []
+        with self._lock:
+            box_cells = (max_cell[0] - min_cell[0] + 1) * (max_cell[1] - min_cell[1] + 1)
+            if box_cells > len(self._cells):
+                # Wide search over a sparse index: walk the occupied cells
+                # instead, so the cost doesn't grow with radius squared
+                buckets = [
+                    bucket for (cell_lat, cell_lng), bucket in self._cells.items()
+                    if min_cell[0] <= cell_lat <= max_cell[0] and min_cell[1] <= cell_lng <= max_cell[1]
+                ]
+            else:
+                buckets = [
+                    self._cells.get((cell_lat, cell_lng))
+                    for cell_lat in range(min_cell[0], max_cell[0] + 1)
+                    for cell_lng in range(min_cell[1], max_cell[1] + 1)
+                ]
+            for bucket in buckets:
+                if not bucket:
+                    continue
+                for key, (point_lat, point_lng) in bucket.items():
+                    if expire_before is not None and self._entries[key][2] < expire_before:
+                        expired.append(key)
+                        continue
+                    candidates.append((key, point_lat, point_lng))
+            for key in expired:
+                self._discard(key)
+        return candidates
+
+    def within_radius(self, lat, lng, radius):
+        """(key, distance) pairs within ``radius`` meters, nearest first"""
+        candidates = self._candidates(lat, lng, radius)
+        if not candidates:
+            return []
+
+        keys, lats, lngs = zip(*candidates)
+        distances = haversine_many(lat, lng, lats, lngs)
+        order = np.argsort(distances, kind='stable')
+        return [
+            (keys[i], float(distances[i]))
+            for i in order
+            if distances[i] <= radius
+        ]
+
+    def nearest(self, lat, lng, k, max_radius=50000):
+        """Up to ``k`` (key, distance) pairs nearest to a point"""
+        radius = self.cell_size * METERS_PER_DEGREE
+        while True:
+            radius = min(radius, max_radius)
+            matches = self.within_radius(lat, lng, radius)
+            if len(matches) >= k or radius >= max_radius:
+                return matches[:k]
+            radius *= 2
+
+    def replace_all(self, points):
+        """Atomically rebuild the index from (key, lat, lng, updated_at) rows"""
+        cells = {}
+        entries = {}
+        for key, lat, lng, updated_at in points:
+            cell = self._cell(lat, lng)
+            cells.setdefault(cell, {})[key] = (lat, lng)
+            entries[key] = (lat, lng, updated_at, cell)
+        with self._lock:
+            self._cells = cells
+            self._entries = entries
@@ -0,0 +1,44 @@
+import logging
+
+from django.contrib.auth import get_user_model
+
+from core.tasks import task
+from .models import SOSVideoFeed
+from .segments import SegmentStore, add_video_feed
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+@task(queue='sos')
+def notify_police_about_video_feed(video_feed_id):
+    """Background task to notify police about new video feed"""
+    video_feed = SOSVideoFeed.objects.filter(id=video_feed_id).first()
+    if video_feed is None:
+        return
+
+    police_count = User.objects.filter(role='police').count()
+
+    # Here you would send push notifications, emails, etc.
+    # For now, just log
+    logger.info(f"New video feed available for emergency {video_feed.emergency_id} - notifying {police_count} officers")
+
+
+@task(queue='sos')
+def append_video_feed(video_feed_id):
+    """Background task to append a saved chunk to its emergency's recording"""
+    video_feed = SOSVideoFeed.objects.filter(id=video_feed_id).first()
+    if video_feed is None:
+        return
+    # An OSError fails the job and the worker retries it; chunks that are
+    # already in the index are ignored
+    add_video_feed(video_feed)
+
+
+# Below the appends on the same queue, so chunks queued before the SOS
+# ended are in the recording before what is left is flushed
+@task(queue='sos', priority=-1)
+def flush_emergency_recording(emergency_id):
+    """Background task to append an ended emergency's pending chunks"""
+    SegmentStore(emergency_id).flush()
@@ -1,3 +1,626 @@
-from django.test import TestCase
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Job
+from core.sharding import ShardedQuerySet
+from core.worker import claim_job, run_job
+from users.models import User
+from .dispatch import dispatch_volunteer_alerts
+from .escalation import EscalationScheduler
+from .models import (
+    PoliceVideoView, SOSAlert, SOSLocationUpdate, SOSVideoFeed, VideoUploadSession, Volunteer, VolunteerAlert
+)
+from .retention import retention_policy, run_retention
+from .segments import SegmentStore
+from .serializers import SOSVideoFeedSerializer
+from .spatial import GridIndex, haversine, haversine_many
+from .streaming import parse_range, ranged_file_response
+from .tasks import append_video_feed
+from .timing_wheel import HierarchicalTimingWheel
+from .tracking import SimplifiedTrack, _segment_distance, _to_xy, douglas_peucker, normalize_tolerance
+from .uploads import UploadError, _locked_partial, append_chunk, finalize_upload
+from .view_tracking import VideoViewRecorder, video_view_recorder
+from .volunteer_index import MAX_VOLUNTEER_RADIUS, VolunteerIndex, clamp_radius, volunteer_index
+
+
+def volunteer(email, latitude):
+    """An available volunteer on the 72.8777 meridian, located just now"""
+    user = User.objects.create(username=email, email=email, role='volunteer')
+    return Volunteer.objects.create(
+        user=user, phone_number='9000000000', is_available=True,
+        current_latitude=latitude, current_longitude=72.8777, last_location_update=timezone.now()
+    )
+
+
+def line(count, wobble=0.0):
+    """Points heading north, every other one nudged east by ``wobble`` degrees"""
+    return [
+        {'id': n + 1, 'latitude': 19.0 + n * 0.001, 'longitude': 72.8 + (wobble if n % 2 else 0)}
+        for n in range(count)
+    ]
+
+
+class TrackSimplificationTests(SimpleTestCase):
+    def test_straight_line_keeps_its_ends(self):
+        self.assertEqual(douglas_peucker(line(50), 5), [0, 49])
+
+    def test_wobble_past_the_tolerance_is_kept(self):
+        self.assertEqual(len(douglas_peucker(line(10, wobble=0.001), 5)), 10)
+        self.assertEqual(douglas_peucker(line(10, wobble=0.00001), 5), [0, 9])
+
+    def test_extended_track_stays_within_tolerance(self):
+        points = line(40, wobble=0.00003) + line(40)[-1:]
+        track = SimplifiedTrack(5)
+        for start in range(0, len(points), 7):
+            track.extend(points[start:start + 7])
+        kept = track.points()
+        self.assertEqual((kept[0]['id'], kept[-1]['id']), (points[0]['id'], points[-1]['id']))
+        self.assertLess(len(kept), len(points))
+
+        xy = _to_xy(points + kept)
+        raw, polyline = xy[:len(points)], xy[len(points):]
+        for point in raw:
+            distance = min(_segment_distance(point, a, b) for a, b in zip(polyline, polyline[1:]))
+            self.assertLessEqual(distance, 5 + 1e-6)
+
+    def test_normalize_tolerance(self):
+        self.assertEqual(normalize_tolerance('12.4'), 12)
+        self.assertEqual(normalize_tolerance('0'), 1)
+        self.assertEqual(normalize_tolerance('1e9'), 1000)
+        for bad in ('inf', '-inf', 'nan', 'abc'):
+            with self.assertRaises(ValueError):
+                normalize_tolerance(bad)
+
+
+class LocationUpdatesViewTests(TestCase):
+    def test_infinite_tolerance_is_rejected(self):
+        sos = SOSAlert.objects.create(latitude=19.0760, longitude=72.8777)
+        url = f'/api/sos/{sos.id}/location-updates/'
+        self.assertEqual(self.client.get(url, {'tolerance': 'inf'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'tolerance': '10'}).status_code, 200)
+
+
+class GridIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.grid = GridIndex(cell_size=0.01)
+        self.grid.upsert('near', 19.0760, 72.8777)
+        self.grid.upsert('mid', 19.0900, 72.8777)
+        self.grid.upsert('far', 19.3000, 72.8777)
+
+    def test_within_radius_is_nearest_first_and_exact(self):
+        matches = self.grid.within_radius(19.0760, 72.8777, 2000)
+        self.assertEqual([key for key, _ in matches], ['near', 'mid'])
+        self.assertAlmostEqual(matches[1][1], haversine(19.0760, 72.8777, 19.0900, 72.8777), places=3)
+
+    def test_wide_radius_over_sparse_index(self):
+        grid = GridIndex(cell_size=0.01)
+        grid.upsert('only', 19.0760, 72.8777)
+        started = time.perf_counter()
+        matches = grid.within_radius(19.0, 72.8, 2_000_000)
+        self.assertLess(time.perf_counter() - started, 0.1)
+        self.assertEqual([key for key, _ in matches], ['only'])
+
+    def test_upsert_moves_and_remove_drops(self):
+        self.grid.upsert('far', 19.0761, 72.8777)
+        self.assertIn('far', [key for key, _ in self.grid.within_radius(19.0760, 72.8777, 500)])
+        self.grid.remove('far')
+        self.assertNotIn('far', self.grid)
+        self.assertEqual(len(self.grid), 2)
+
+    def test_nearest_widens_until_k(self):
+        self.assertEqual([key for key, _ in self.grid.nearest(19.0760, 72.8777, 3)], ['near', 'mid', 'far'])
+        self.assertEqual([key for key, _ in self.grid.nearest(19.0760, 72.8777, 3, max_radius=5000)], ['near', 'mid'])
+
+    def test_ttl_drops_stale_points(self):
+        grid = GridIndex(ttl=60)
+        grid.upsert('stale', 19.0760, 72.8777, updated_at=time.time() - 120)
+        grid.upsert('fresh', 19.0760, 72.8777)
+        self.assertEqual([key for key, _ in grid.within_radius(19.0760, 72.8777, 100)], ['fresh'])
+        self.assertNotIn('stale', grid)
+
+
+class VolunteerDispatchTests(TestCase):
+    def setUp(self):
+        self.volunteers = [
+            volunteer(f'v{n}@x.com', latitude) for n, latitude in enumerate((19.0761, 19.0800, 19.3000))
+        ]
+        volunteer_index.warm()
+        self.sos = SOSAlert.objects.create(latitude=19.0760, longitude=72.8777)
+
+    def test_haversine_many_matches_haversine(self):
+        distances = haversine_many(19.0760, 72.8777, [19.0761, 28.6139], [72.8777, 77.2090])
+        self.assertAlmostEqual(distances[0], haversine(19.0760, 72.8777, 19.0761, 72.8777), places=6)
+        self.assertAlmostEqual(distances[1], haversine(19.0760, 72.8777, 28.6139, 77.2090), places=3)
+
+    def test_alerts_volunteers_in_radius_once(self):
+        # savepoint, already-alerted lookup, one bulk insert, release
+        with self.assertNumQueries(4):
+            alerted = dispatch_volunteer_alerts(self.sos, 19.0760, 72.8777, 1000)
+        self.assertEqual(set(alerted), {self.volunteers[0].id, self.volunteers[1].id})
+        self.assertEqual(dispatch_volunteer_alerts(self.sos, 19.0760, 72.8777, 1000), {})
+        self.assertEqual(VolunteerAlert.objects.filter(sos_alert=self.sos).count(), 2)
+
+    def test_widening_alerts_only_new_volunteers(self):
+        dispatch_volunteer_alerts(self.sos, 19.0760, 72.8777, 1000)
+        alerted = dispatch_volunteer_alerts(self.sos, 19.0760, 72.8777, 30000)
+        self.assertEqual(list(alerted), [self.volunteers[2].id])
+
+
+class TimingWheelTests(SimpleTestCase):
+    def run_until(self, wheel, end):
+        fired = {}
+        for now in range(1, end + 1):
+            for key, payload in wheel.advance(now):
+                fired[key] = (now, payload)
+        return fired
+
+    def test_timers_fire_on_their_tick_across_levels(self):
+        wheel = HierarchicalTimingWheel(wheel_size=8, levels=3)
+        rng = random.Random(7)
+        delays = {key: rng.randint(1, 600) for key in range(300)}
+        for key, delay in delays.items():
+            wheel.schedule(key, delay, payload=delay, now=0)
+        fired = self.run_until(wheel, 700)
+        self.assertEqual(fired, {key: (delay, delay) for key, delay in delays.items()})
+        self.assertEqual(len(wheel), 0)
+
+    def test_reschedule_replaces_and_cancel_removes(self):
+        wheel = HierarchicalTimingWheel()
+        wheel.schedule('a', 5, payload=1, now=0)
+        wheel.schedule('a', 10, payload=2, now=0)
+        wheel.schedule('b', 3, now=0)
+        self.assertTrue(wheel.cancel('b'))
+        self.assertFalse(wheel.cancel('b'))
+        self.assertEqual(self.run_until(wheel, 20), {'a': (10, 2)})
+
+    def test_idle_wheel_jumps_to_the_present(self):
+        wheel = HierarchicalTimingWheel(now=0)
+        wheel.schedule('a', 2, now=10_000)
+        self.assertEqual(wheel.advance(10_001), [])
+        self.assertEqual(wheel.advance(10_002), [('a', None)])
+
+
+@override_settings(SOS_ESCALATION_RINGS=[1000, 30000], SOS_ESCALATION_TIMEOUT_SECONDS=60)
+class EscalationTests(TestCase):
+    def setUp(self):
+        near = volunteer('near@x.com', 19.0800)
+        self.far = volunteer('far@x.com', 19.3000)
+        volunteer_index.warm()
+        self.sos = SOSAlert.objects.create(latitude=19.0760, longitude=72.8777)
+        VolunteerAlert.objects.create(sos_alert=self.sos, volunteer=near, distance=450)
+        self.scheduler = EscalationScheduler()
+        patcher = mock.patch.object(self.scheduler, '_ensure_running')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fire(self):
+        expired = self.scheduler.wheel.advance(time.monotonic() + 61)
+        for sos_id, ring_index in expired:
+            self.scheduler.escalate(sos_id, ring_index)
+        return expired
+
+    def test_unanswered_alert_widens_to_the_next_ring(self):
+        self.assertEqual(self.scheduler.start_escalation(self.sos.id, 1000), 30000)
+        self.assertEqual(self.scheduler.wheel.advance(time.monotonic() + 30), [])
+        self.assertEqual(self.fire(), [(self.sos.id, 1)])
+        self.assertTrue(VolunteerAlert.objects.filter(sos_alert=self.sos, volunteer=self.far).exists())
+        self.assertEqual(self.scheduler.pending(), 0)  # no ring left
+
+    def test_first_ring_schedules_the_next(self):
+        self.scheduler.escalate(self.sos.id, 0)
+        self.assertIn(self.sos.id, self.scheduler.wheel)
+        self.assertFalse(VolunteerAlert.objects.filter(volunteer=self.far).exists())
+
+    def test_answered_or_resolved_alerts_stop(self):
+        VolunteerAlert.objects.filter(sos_alert=self.sos).update(responded=True)
+        self.scheduler.escalate(self.sos.id, 1)
+        self.assertFalse(VolunteerAlert.objects.filter(volunteer=self.far).exists())
+
+        VolunteerAlert.objects.filter(sos_alert=self.sos).update(responded=False)
+        SOSAlert.objects.filter(id=self.sos.id).update(is_active=False)
+        self.scheduler.escalate(self.sos.id, 1)
+        self.assertFalse(VolunteerAlert.objects.filter(volunteer=self.far).exists())
+
+    def test_nothing_past_the_widest_ring(self):
+        self.assertIsNone(self.scheduler.start_escalation(self.sos.id, 30000))
+        self.assertEqual(self.scheduler.pending(), 0)
+
+
+class VolunteerRadiusTests(TestCase):
+    def test_clamp_radius(self):
+        self.assertEqual(clamp_radius('2500'), 2500)
+        self.assertEqual(clamp_radius(10 ** 9), MAX_VOLUNTEER_RADIUS)
+        for bad in ('inf', 'nan', '-1', '0'):
+            with self.assertRaises(ValueError):
+                clamp_radius(bad)
+
+    def test_nearby_volunteers_rejects_bad_radius(self):
+        response = self.client.get('/api/sos/nearby-volunteers/', {'latitude': 19.07, 'longitude': 72.87, 'radius': 'inf'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/sos/nearby-volunteers/', {'latitude': 19.07, 'longitude': 72.87, 'radius': 2e9})
+        self.assertEqual(response.status_code, 200)
+
+
+class VolunteerIndexTests(TestCase):
+    def test_stale_index_resyncs_in_background(self):
+        index = VolunteerIndex()
+        index.warm()
+        index._synced_at -= index.resync_interval + 1
+        with mock.patch.object(index, 'warm') as warm, self.assertNumQueries(0):
+            index.within_radius(19.07, 72.87, 1000)
+            index._resync_thread.join()
+        warm.assert_called_once_with(max_age=index.resync_interval)
+
+    def test_warm_skips_when_recently_synced(self):
+        index = VolunteerIndex()
+        index.warm()
+        with self.assertNumQueries(0):
+            index.warm(max_age=60)
+
+
+class SegmentStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, SOS_SEGMENT_MAX_PENDING=2)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.store = SegmentStore('e1')
+        os.makedirs(os.path.join(self.media, 'sos_videos'))
+
+    def add(self, sequence, body):
+        name = f'sos_videos/chunk{sequence}.webm'
+        with open(os.path.join(self.media, 'sos_videos', f'chunk{sequence}.webm'), 'wb') as f:
+            f.write(body)
+        return self.store.add_chunk(sequence, name, duration=2.0)
+
+    def recording(self):
+        with open(self.store.recording_path, 'rb') as f:
+            return f.read()
+
+    def test_chunks_are_appended_in_sequence_order(self):
+        self.add(0, b'aaa')
+        index = self.add(2, b'cc')
+        self.assertEqual(list(index['pending']), ['2'])
+        index = self.add(1, b'bbbb')
+        self.assertEqual(self.recording(), b'aaabbbbcc')
+        self.assertEqual(
+            [(segment['sequence'], segment['offset'], segment['length'], segment['start_time']) for segment in index['segments']],
+            [(0, 0, 3, 0.0), (1, 3, 4, 2.0), (2, 7, 2, 4.0)]
+        )
+        self.assertEqual(self.add(1, b'dup')['size'], 9)
+
+    def test_first_chunk_waits_for_chunk_zero(self):
+        index = self.add(1, b'bb')
+        self.assertEqual((list(index['pending']), index['size']), (['1'], 0))
+        index = self.add(0, b'a')
+        self.assertEqual([segment['sequence'] for segment in index['segments']], [0, 1])
+        self.assertEqual(self.recording(), b'abb')
+
+    def test_missing_chunk_is_skipped_once_too_many_wait(self):
+        self.add(0, b'a')
+        with self.assertLogs('sos.segments', 'WARNING'):
+            for sequence in (2, 3, 4):
+                index = self.add(sequence, b'x')
+        self.assertEqual(index['skipped'], [1])
+        self.assertEqual(self.recording(), b'axxx')
+
+    def test_flush_appends_what_is_left(self):
+        self.add(0, b'a')
+        self.add(3, b'd')
+        with self.assertLogs('sos.segments', 'WARNING'):
+            index = self.store.flush()
+        self.assertEqual(index['skipped'], [1, 2])
+        self.assertEqual(self.recording(), b'ad')
+
+
+class RecordingJobTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.sos = SOSAlert.objects.create(latitude=19.0760, longitude=72.8777)
+        self.store = SegmentStore(self.sos.id)
+
+    def test_chunks_are_appended_by_a_worker_not_the_upload(self):
+        feed = SOSVideoFeed(sos_alert=self.sos, emergency_id=str(self.sos.id), chunk_sequence=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            feed.video_file.save('chunk0.webm', ContentFile(b'abc'))
+        self.assertFalse(self.store.exists())
+
+        self.assertTrue(run_job(claim_job('w')))
+        self.assertEqual(self.store.load_index()['size'], 3)
+
+    def test_resolving_queues_the_flush_behind_the_appends(self):
+        client = APIClient()
+        client.post(f'/api/sos/resolve/{self.sos.id}/')
+        flush = Job.objects.get()
+        self.assertEqual(flush.task_name, 'sos.tasks.flush_emergency_recording')
+        self.assertLess(flush.priority, append_video_feed.apply_async().priority)
+
+
+    def test_recording_is_served_as_a_playlist_of_segments(self):
+        for sequence, body in ((0, b'first'), (1, b'second')):
+            self.store.add_chunk(sequence, default_storage.save(f'sos_videos/c{sequence}.webm', ContentFile(body)))
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='cop@x.com', email='cop@x.com', role='police'))
+
+        playlist = client.get(f'/api/sos/emergency/{self.sos.id}/recording/').data
+        self.assertEqual([segment['range'] for segment in playlist['segments']], ['bytes=0-4', 'bytes=5-10'])
+        response = client.get(playlist['recording_url'], HTTP_RANGE=playlist['segments'][1]['range'])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'second')
+
+class RangeTests(SimpleTestCase):
+    def test_parse_range(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('bytes=-', 100))
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 19))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-500', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        for header in ('bytes=100-', 'bytes=20-10', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 100)
+
+    def test_ranged_file_response(self):
+        handle, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'wb') as f:
+            f.write(bytes(range(100)))
+        factory = RequestFactory()
+
+        response = ranged_file_response(factory.get('/', headers={'Range': 'bytes=10-14'}), path, 'video/webm')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-14/100')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 15)))
+
+        response = ranged_file_response(factory.get('/'), path, 'video/webm')
+        self.assertEqual((response.status_code, response['Content-Length']), (200, '100'))
+        response = ranged_file_response(factory.get('/', headers={'Range': 'bytes=200-'}), path, 'video/webm')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'))
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        response = self.client.post('/api/sos/video-uploads/', {'sos_id': 'e1', 'total_size': 10})
+        self.assertEqual(response.status_code, 201)
+        self.url = f'/api/sos/video-uploads/{response.json()["upload_id"]}/'
+        self.session = VideoUploadSession.objects.get(upload_id=response.json()['upload_id'])
+
+    def patch(self, body, content_range, **extra):
+        return self.client.generic(
+            'PATCH', self.url, body, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=content_range, **extra
+        )
+
+    def test_chunks_append_at_the_offset_and_finalize(self):
+        self.assertEqual(self.patch(b'01234', 'bytes 0-4/10').json()['offset'], 5)
+        wrong = self.patch(b'xx', 'bytes 2-3/10')
+        self.assertEqual(wrong.status_code, 409)
+        self.assertEqual(wrong['Upload-Offset'], '5')
+        self.assertEqual(self.patch(b'56789', 'bytes 5-9/10').json()['offset'], 10)
+
+        response = self.client.post(f'{self.url}complete/')
+        self.assertLess(response.status_code, 300)
+        self.session.refresh_from_db()
+        with self.session.video_feed.video_file.open('rb') as f:
+            self.assertEqual(f.read(), b'0123456789')
+
+    def test_failed_save_keeps_the_upload_for_a_retry(self):
+        self.patch(b'0123456789', 'bytes 0-9/10')
+        self.session.refresh_from_db()
+        with mock.patch.object(SOSVideoFeed, 'save', side_effect=DatabaseError('disk I/O error')):
+            with self.assertRaises(DatabaseError):
+                finalize_upload(self.session)
+        self.assertEqual(os.listdir(f'{self.media}/sos_videos'), ['.partial'])
+
+        video_feed = finalize_upload(self.session)
+        with video_feed.video_file.open('rb') as f:
+            self.assertEqual(f.read(), b'0123456789')
+
+    def test_incomplete_upload_cannot_finalize(self):
+        self.patch(b'01234', 'bytes 0-4/10')
+        self.assertEqual(self.client.post(f'{self.url}complete/').status_code, 409)
+
+    def test_concurrent_patch_is_rejected_without_writing(self):
+        self.patch(b'01234', 'bytes 0-4/10')
+        with _locked_partial(self.session):
+            self.assertEqual(self.patch(b'abcde', 'bytes 5-9/10').status_code, 409)
+        with open(f'{self.media}/sos_videos/.partial/{self.session.upload_id}.part', 'rb') as f:
+            self.assertEqual(f.read(), b'01234')
+
+    def test_missing_content_length(self):
+        self.assertEqual(self.patch(b'01234', 'bytes 0-4/10', CONTENT_LENGTH='').status_code, 411)
+        with self.assertRaises(UploadError) as raised:
+            append_chunk(self.session, None, 'bytes 0-4/10', None)
+        self.assertEqual(raised.exception.status_code, 411)
+
+    def test_content_length_must_match_range(self):
+        self.assertEqual(self.patch(b'012', 'bytes 0-4/10').status_code, 400)
+
+
+class VideoFeedSerializerTests(TestCase):
+    def test_only_the_signed_url_is_exposed(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media):
+            feed = SOSVideoFeed(emergency_id='e1', file_size=2048)
+            feed.video_file.save('chunk.webm', ContentFile(b'x' * 2048))
+            data = SOSVideoFeedSerializer(feed, context={'request': RequestFactory().get('/')}).data
+            self.assertNotIn('video_file', data)
+            self.assertEqual(data['file_size_formatted'], '2.0 KB')
+
+            response = self.client.get(data['video_url'], headers={'Range': 'bytes=0-9'})
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b''.join(response.streaming_content), b'x' * 10)
+            self.assertEqual(self.client.get(data['video_url'].replace('sig=', 'sig=0')).status_code, 403)
+            self.assertEqual(self.client.get(f'/api/media/{feed.video_file.name}').status_code, 403)
+
+
+class VideoViewRecorderTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.officer = User.objects.create(username='cop@x.com', email='cop@x.com', role='police')
+        self.sos = SOSAlert.objects.create(latitude=19.0760, longitude=72.8777, is_streaming=True)
+        self.feeds = []
+        for sequence in (1, 2):
+            feed = SOSVideoFeed(sos_alert=self.sos, emergency_id=str(self.sos.id), chunk_sequence=sequence, file_size=10)
+            feed.video_file.save(f'chunk{sequence}.webm', ContentFile(b'x' * 10))
+            self.feeds.append(feed)
+        # No flush thread; whatever a test leaves buffered is written before the rollback
+        patcher = mock.patch.object(video_view_recorder, '_ensure_running')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(video_view_recorder.flush)
+
+    def test_views_are_buffered_and_written_once(self):
+        recorder = VideoViewRecorder()
+        recorder._ensure_running = lambda: None
+        ids = [feed.id for feed in self.feeds]
+        recorder.record_views(self.officer.id, ids)
+        recorder.record_views(self.officer.id, ids)
+        self.assertEqual(recorder.pending_feed_ids(), set(ids))
+        self.assertEqual(PoliceVideoView.objects.count(), 0)
+
+        self.assertEqual(recorder.flush(), 2)
+        recorder.record_views(self.officer.id, ids)
+        recorder.flush()
+        self.assertEqual(PoliceVideoView.objects.count(), 2)
+        self.assertEqual(recorder.pending_feed_ids(), set())
+
+    def test_flushed_views_keep_the_time_they_were_seen(self):
+        recorder = VideoViewRecorder()
+        recorder._ensure_running = lambda: None
+        seen = timezone.now() - timedelta(seconds=30)
+        with mock.patch('sos.view_tracking.timezone.now', return_value=seen):
+            recorder.record_views(self.officer.id, [self.feeds[0].id])
+        recorder.flush()
+        self.assertEqual(PoliceVideoView.objects.get().viewed_at, seen)
+
+    def test_duration_updates_the_view_and_deleted_feeds_are_skipped(self):
+        recorder = VideoViewRecorder()
+        recorder._ensure_running = lambda: None
+        recorder.record_views(self.officer.id, [self.feeds[0].id])
+        recorder.flush()
+        recorder.record_duration(self.officer.id, self.feeds[0].id, 42)
+        recorder.record_views(self.officer.id, [self.feeds[1].id])
+        SOSVideoFeed.objects.filter(id=self.feeds[1].id).delete()
+        recorder.flush()
+        self.assertEqual(
+            list(PoliceVideoView.objects.values_list('video_feed_id', 'viewing_duration')), [(self.feeds[0].id, 42)]
+        )
+
+    def test_listing_reads_only_and_shows_pending_views(self):
+        client = APIClient()
+        client.force_authenticate(self.officer)
+        response = client.get('/api/sos/police/video-feeds/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PoliceVideoView.objects.count(), 0)
+
+        feeds = client.get('/api/sos/police/video-feeds/').json()['active_emergency_feeds'][0]['video_feeds']
+        self.assertTrue(all(feed['viewed_by_police'] for feed in feeds))
+        video_view_recorder.flush()
+        self.assertEqual(PoliceVideoView.objects.count(), 2)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.resolved = self.emergency(resolved_days_ago=10)
+        self.recent = self.emergency(resolved_days_ago=1)
+        self.active = self.emergency(resolved_days_ago=None)
+
+    def emergency(self, resolved_days_ago):
+        sos = SOSAlert.objects.create(latitude=19.0760, longitude=72.8777)
+        for n in range(20):
+            SOSLocationUpdate.objects.create(sos_alert=sos, latitude=19.0 + n * 0.001, longitude=72.8777)
+        for sequence in (0, 1):
+            feed = SOSVideoFeed(sos_alert=sos, emergency_id=str(sos.id), chunk_sequence=sequence)
+            feed.video_file.save(f'{sos.id}-{sequence}.webm', ContentFile(b'v' * 100))
+        if resolved_days_ago is not None:
+            SOSAlert.objects.filter(id=sos.id).update(
+                is_active=False, resolved_at=timezone.now() - timedelta(days=resolved_days_ago)
+            )
+        return sos
+
+    def chunk_files(self, sos):
+        return [feed.video_file.name for feed in SOSVideoFeed.objects.filter(sos_alert=sos) if feed.video_file]
+
+    def test_old_resolved_emergencies_are_compacted_once(self):
+        stats = run_retention()
+        self.assertEqual(stats['compacted'], 1)
+        self.assertEqual(stats['chunk_bytes_freed'], 200)
+        self.assertEqual(stats['track_points_deleted'], 18)
+
+        self.assertEqual(self.chunk_files(self.resolved), [])
+        self.assertEqual(SegmentStore(self.resolved.id).load_index()['size'], 200)
+        self.assertEqual(SOSLocationUpdate.objects.filter(sos_alert=self.resolved).count(), 2)
+        for sos in (self.recent, self.active):
+            self.assertEqual(len(self.chunk_files(sos)), 2)
+            self.assertEqual(SOSLocationUpdate.objects.filter(sos_alert=sos).count(), 20)
+
+        self.assertEqual(run_retention()['compacted'], 0)
+
+    def test_failed_track_delete_leaves_the_emergency_for_the_next_run(self):
+        deletes = []
+
+        def delete(queryset):
+            deletes.append(queryset)
+            if len(deletes) == 2:
+                raise DatabaseError('database is locked')
+            return QuerySet.delete(queryset)
+
+        with mock.patch('sos.retention.DELETE_BATCH_SIZE', 5), mock.patch.object(ShardedQuerySet, 'delete', delete):
+            with self.assertRaises(DatabaseError):
+                run_retention()
+        self.assertEqual(SOSLocationUpdate.objects.filter(sos_alert=self.resolved).count(), 20)
+        self.assertFalse(SOSAlert.objects.filter(compacted_at__isnull=False).exists())
+
+        self.assertEqual(run_retention()['track_points_deleted'], 18)
+
+    def test_expired_recordings_are_deleted(self):
+        run_retention()
+        store = SegmentStore(self.resolved.id)
+        self.assertTrue(store.exists())
+        stats = run_retention(retention_policy({'delete_recordings_after_days': 5}))
+        self.assertGreaterEqual(stats['expired_bytes_freed'], 200)
+        self.assertFalse(os.path.exists(store.directory))
+
+    def test_disk_quota_evicts_the_oldest_resolved_video_first(self):
+        with self.assertLogs('sos.retention', 'WARNING'):
+            stats = run_retention(retention_policy({'compact_after_days': 30, 'max_video_bytes': 500}))
+        self.assertGreater(stats['evicted_bytes_freed'], 0)
+        self.assertEqual(self.chunk_files(self.resolved), [])
+        self.assertEqual(len(self.chunk_files(self.recent)), 2)
+        self.assertEqual(len(self.chunk_files(self.active)), 2)
@@ -0,0 +1,91 @@
+import math
+
+
+class HierarchicalTimingWheel:
+    """Hierarchical timing wheel with O(1) timer insertion and cancellation.
+
+    Level 0 has ``wheel_size`` slots of one ``tick`` each; every higher
+    level's slot spans a full rotation of the level below it. Timers are
+    placed on the lowest level whose span covers their remaining delay and
+    cascade down as the wheel turns, so each tick only touches the timers
+    that are due (plus an amortized share of cascades).
+
+    Timers are keyed (e.g. by SOS id); scheduling an existing key replaces
+    its timer. Not thread-safe - callers hold their own lock.
+    """
+
+    def __init__(self, tick=1.0, wheel_size=64, levels=4, now=0.0):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.levels = levels
+        self._wheels = [[{} for _ in range(wheel_size)] for _ in range(levels)]
+        self._timers = {}  # key -> (level, slot)
+        self._current_tick = int(now / tick)
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def schedule(self, key, delay, payload=None, now=None):
+        """Fire ``key`` with ``payload`` ``delay`` seconds after ``now``"""
+        if now is not None and not self._timers:
+            # Nothing pending, so the wheel can jump straight to the present
+            self._current_tick = max(self._current_tick, int(now / self.tick))
+        start = now / self.tick if now is not None else self._current_tick
+        expires = max(self._current_tick + 1, math.ceil(start + delay / self.tick))
+
+        self.cancel(key)
+        self._place(key, expires, payload)
+
+    def cancel(self, key):
+        """Remove a pending timer; returns False if there was none"""
+        position = self._timers.pop(key, None)
+        if position is None:
+            return False
+        level, slot = position
+        del self._wheels[level][slot][key]
+        return True
+
+    def _place(self, key, expires, payload):
+        remaining = expires - self._current_tick
+        level = 0
+        span = self.wheel_size
+        while remaining >= span and level < self.levels - 1:
+            level += 1
+            span *= self.wheel_size
+        slot = (expires // (self.wheel_size ** level)) % self.wheel_size
+        self._wheels[level][slot][key] = (expires, payload)
+        self._timers[key] = (level, slot)
+
+    def advance(self, now):
+        """Move the wheel up to ``now`` and return expired (key, payload) pairs"""
+        target = int(now / self.tick)
+        expired = []
+        while self._current_tick < target:
+            self._current_tick += 1
+            tick = self._current_tick
+
+            # Cascade higher levels whose slot boundary we just crossed
+            for level in range(self.levels - 1, 0, -1):
+                level_span = self.wheel_size ** level
+                if tick % level_span:
+                    continue
+                slot = (tick // level_span) % self.wheel_size
+                bucket = self._wheels[level][slot]
+                if not bucket:
+                    continue
+                self._wheels[level][slot] = {}
+                for key, (expires, payload) in bucket.items():
+                    del self._timers[key]
+                    self._place(key, expires, payload)
+
+            slot = tick % self.wheel_size
+            bucket = self._wheels[0][slot]
+            if bucket:
+                self._wheels[0][slot] = {}
+                for key, (expires, payload) in bucket.items():
+                    del self._timers[key]
+                    expired.append((key, payload))
+        return expired
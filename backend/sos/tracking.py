@@ -0,0 +1,169 @@
+import math
+import threading
+from collections import OrderedDict
+
+from .models import SOSLocationUpdate
+
+EARTH_RADIUS = 6371000  # meters
+
+# Upper bound on raw points kept in the open (not yet committed) tail of a
+# simplified track. A victim standing still produces many points that all
+# fall inside the tolerance; forcing a vertex keeps each extend cheap.
+MAX_PENDING_POINTS = 500
+
+# Number of (alert, tolerance) tracks kept in memory
+TRACK_CACHE_SIZE = 256
+
+MIN_TOLERANCE = 1
+MAX_TOLERANCE = 1000
+
+
+def _to_xy(points):
+    """Project lat/lng points to local meters (equirectangular)"""
+    if not points:
+        return []
+    ref_lat = math.radians(points[0]['latitude'])
+    cos_lat = math.cos(ref_lat)
+    return [
+        (
+            math.radians(p['longitude']) * EARTH_RADIUS * cos_lat,
+            math.radians(p['latitude']) * EARTH_RADIUS
+        )
+        for p in points
+    ]
+
+
+def _segment_distance(p, a, b):
+    """Distance in meters from point p to segment a-b"""
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)
+    t = max(0.0, min(1.0, t))
+    return math.hypot(p[0] - (a[0] + t * dx), p[1] - (a[1] + t * dy))
+
+
+def douglas_peucker(points, tolerance):
+    """Return indices of points kept by Douglas-Peucker simplification"""
+    if len(points) < 3:
+        return list(range(len(points)))
+
+    xy = _to_xy(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+
+    # Iterative to avoid recursion limits on long tracks
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        max_distance = 0.0
+        index = None
+        for i in range(start + 1, end):
+            distance = _segment_distance(xy[i], xy[start], xy[end])
+            if distance > max_distance:
+                max_distance = distance
+                index = i
+        if index is not None and max_distance > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [i for i, kept in enumerate(keep) if kept]
+
+
+class SimplifiedTrack:
+    """Douglas-Peucker track that can be extended as new points arrive.
+
+    Vertices before the last split point are committed and never revisited;
+    only the open tail is re-simplified, so extending costs O(new points)
+    rather than O(whole track). Every raw point stays within ``tolerance``
+    of the resulting polyline.
+    """
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.last_id = 0
+        self._committed = []
+        self._pending = []
+        self.lock = threading.Lock()
+
+    def extend(self, new_points):
+        for point in new_points:
+            if not self._pending:
+                self._committed.append(point)
+            self._pending.append(point)
+            self.last_id = max(self.last_id, point['id'])
+
+        if len(self._pending) < 3:
+            return
+
+        kept = douglas_peucker(self._pending, self.tolerance)
+        if len(kept) > 2:
+            # Everything up to the second to last kept vertex is final
+            self._committed.extend(self._pending[i] for i in kept[1:-1])
+            self._pending = self._pending[kept[-2]:]
+
+        if len(self._pending) > MAX_PENDING_POINTS:
+            self._committed.append(self._pending[-1])
+            self._pending = self._pending[-1:]
+
+    def points(self):
+        """Simplified track in chronological order"""
+        if len(self._pending) > 1:
+            return self._committed + [self._pending[-1]]
+        return list(self._committed)
+
+
+class TrackCache:
+    """LRU of simplified tracks keyed by (sos_id, tolerance)"""
+
+    def __init__(self, max_size=TRACK_CACHE_SIZE):
+        self.max_size = max_size
+        self._tracks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sos_id, tolerance):
+        key = (sos_id, tolerance)
+        with self._lock:
+            track = self._tracks.get(key)
+            if track is None:
+                track = SimplifiedTrack(tolerance)
+                self._tracks[key] = track
+                if len(self._tracks) > self.max_size:
+                    self._tracks.popitem(last=False)
+            else:
+                self._tracks.move_to_end(key)
+            return track
+
+    def evict(self, sos_id):
+        """Drop cached tracks for an alert (e.g. after its rows are deleted)"""
+        with self._lock:
+            for key in [k for k in self._tracks if k[0] == sos_id]:
+                del self._tracks[key]
+
+
+track_cache = TrackCache()
+
+
+def normalize_tolerance(value):
+    """Parse a tolerance in meters, bucketed to whole meters; ValueError if it isn't a finite number"""
+    tolerance = float(value)
+    if not math.isfinite(tolerance):
+        raise ValueError('tolerance must be a finite number of meters')
+    return max(MIN_TOLERANCE, min(MAX_TOLERANCE, int(round(tolerance))))
+
+
+def get_simplified_track(sos_id, tolerance):
+    """Simplified track for an SOS alert, only loading rows not yet cached"""
+    track = track_cache.get(sos_id, tolerance)
+    with track.lock:
+        new_points = list(
+            SOSLocationUpdate.objects.filter(
+                sos_alert_id=sos_id,
+                id__gt=track.last_id
+            ).order_by('id').values('id', 'latitude', 'longitude', 'accuracy', 'timestamp')
+        )
+        if new_points:
+            track.extend(new_points)
+        return track.points()
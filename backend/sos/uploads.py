@@ -0,0 +1,283 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import SOSAlert, SOSVideoFeed, VideoUploadSession
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Request bodies are copied to disk in buffers of this size, so a worker
+# holds at most one buffer per upload in memory
+UPLOAD_BUFFER_SIZE = 256 * 1024
+# Same cap the multipart chunk upload enforces
+DEFAULT_MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+
+PARTIAL_DIR = os.path.join('sos_videos', '.partial')
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+_process_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    """Rejected upload request; carries the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def max_upload_size():
+    return getattr(settings, 'SOS_VIDEO_MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+
+
+def partial_path(session):
+    return os.path.join(settings.MEDIA_ROOT, PARTIAL_DIR, f"{session.upload_id}.part")
+
+
+def parse_content_range(header):
+    """Parse 'bytes start-end/total' into (start, end, total or None)"""
+    match = CONTENT_RANGE_RE.match((header or '').strip())
+    if not match:
+        raise UploadError('Content-Range must look like "bytes <start>-<end>/<total|*>"')
+
+    start, end = int(match.group(1)), int(match.group(2))
+    total = None if match.group(3) == '*' else int(match.group(3))
+    if end < start or (total is not None and end >= total):
+        raise UploadError('Invalid Content-Range')
+    return start, end, total
+
+
+@contextmanager
+def _locked_partial(session):
+    """The session's partial file, opened for writing under an exclusive lock.
+
+    Raises UploadError (409) straight away if another request holds it,
+    rather than parking a worker behind a slow upload.
+    """
+    try:
+        partial = open(partial_path(session), 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Upload data is missing', 410)
+    with partial:
+        if fcntl is None:
+            if not _process_lock.acquire(blocking=False):
+                raise UploadError('Another request is writing to this upload', 409)
+            try:
+                yield partial
+            finally:
+                _process_lock.release()
+            return
+        try:
+            fcntl.flock(partial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Another request is writing to this upload', 409)
+        try:
+            yield partial
+        finally:
+            fcntl.flock(partial, fcntl.LOCK_UN)
+
+
+def content_hash(chunks):
+    """sha256 hex digest of an iterable of byte blocks"""
+    digest = hashlib.sha256()
+    for block in chunks:
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_blocks(path):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(UPLOAD_BUFFER_SIZE), b''):
+            yield block
+
+
+def find_duplicate_chunk(emergency_id, chunk_hash):
+    """An existing feed of this emergency with identical bytes, if any"""
+    return SOSVideoFeed.objects.filter(
+        emergency_id=str(emergency_id),
+        content_hash=chunk_hash
+    ).order_by('id').first()
+
+
+def start_upload(emergency_id, chunk_sequence=0, filename=None, total_size=None):
+    """Create an upload session and its empty partial file"""
+    if total_size is not None and total_size > max_upload_size():
+        raise UploadError(f'Video chunk too large (max {max_upload_size() // (1024 * 1024)}MB)', 413)
+
+    session = VideoUploadSession.objects.create(
+        emergency_id=str(emergency_id),
+        chunk_sequence=chunk_sequence,
+        filename=get_valid_filename(filename or f'sos_{emergency_id}_{chunk_sequence}.webm')[:100],
+        total_size=total_size
+    )
+    path = partial_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return session
+
+
+def append_chunk(session, stream, content_range, content_length):
+    """Stream one PATCH body into the partial file at its Content-Range offset.
+
+    The body is read and written UPLOAD_BUFFER_SIZE bytes at a time. Only
+    appends at the current offset are accepted, one request at a time: the
+    partial file is locked for the whole write, so a racing PATCH gets 409
+    without touching it. If the connection drops mid-body, whatever arrived
+    is kept and the client resumes from the offset reported by HEAD.
+    Returns the new offset.
+    """
+    if content_length is None:
+        raise UploadError('Content-Length is required', 411)
+
+    start, end, total = parse_content_range(content_range)
+    length = end - start + 1
+    if content_length != length or stream is None:
+        raise UploadError('Content-Length does not match Content-Range')
+    if end + 1 > max_upload_size():
+        raise UploadError(f'Video chunk too large (max {max_upload_size() // (1024 * 1024)}MB)', 413)
+
+    with _locked_partial(session) as partial:
+        # Re-read under the lock; the offset may have moved while we waited
+        session.refresh_from_db(fields=['received_bytes', 'total_size', 'video_feed'])
+        if session.video_feed_id:
+            raise UploadError('Upload already finalized', 409)
+        if start != session.received_bytes:
+            raise UploadError(f'Expected offset {session.received_bytes}', 409)
+        total = total if total is not None else session.total_size
+        if total is not None and session.total_size is not None and total != session.total_size:
+            raise UploadError('Total size does not match the upload')
+
+        written = 0
+        partial.seek(start)
+        try:
+            while written < length:
+                data = stream.read(min(UPLOAD_BUFFER_SIZE, length - written))
+                if not data:
+                    break
+                partial.write(data)
+                written += len(data)
+        except OSError as e:
+            logger.warning(f"Upload {session.upload_id} interrupted after {written} bytes: {str(e)}")
+        partial.truncate(start + written)
+        partial.flush()
+
+        # Still conditional, in case the lock isn't shared (e.g. a second
+        # host on a network filesystem without flock)
+        updated = VideoUploadSession.objects.filter(
+            upload_id=session.upload_id,
+            received_bytes=start
+        ).update(received_bytes=start + written, total_size=total, updated_at=timezone.now())
+        if not updated:
+            session.refresh_from_db(fields=['received_bytes'])
+            raise UploadError(f'Expected offset {session.received_bytes}', 409)
+
+    session.received_bytes = start + written
+    session.total_size = total
+    return session.received_bytes
+
+
+def finalize_upload(session):
+    """Move the completed partial file into sos_videos/ and record the feed.
+
+    Finalizing twice returns the feed created the first time, and bytes
+    identical to a chunk already stored for the emergency reuse that feed.
+    """
+    if session.video_feed_id:
+        return session.video_feed
+
+    if session.received_bytes == 0:
+        raise UploadError('Nothing has been uploaded')
+    if session.total_size is not None and session.received_bytes != session.total_size:
+        raise UploadError(f'Upload incomplete: {session.received_bytes} of {session.total_size} bytes', 409)
+
+    name = default_storage.get_available_name(
+        os.path.join('sos_videos', session.filename),
+        max_length=SOSVideoFeed._meta.get_field('video_file').max_length
+    )
+    try:
+        # Locked so a PATCH still writing can't be cut off by the move
+        with _locked_partial(session):
+            session.refresh_from_db(fields=['received_bytes', 'total_size', 'video_feed'])
+            if session.video_feed_id:
+                return session.video_feed
+            if session.total_size is not None and session.received_bytes != session.total_size:
+                raise UploadError(f'Upload incomplete: {session.received_bytes} of {session.total_size} bytes', 409)
+            chunk_hash = content_hash(_read_blocks(partial_path(session)))
+            duplicate = find_duplicate_chunk(session.emergency_id, chunk_hash)
+            if duplicate is not None:
+                # Same bytes already stored (a retried upload); don't keep a second copy
+                os.remove(partial_path(session))
+                session.video_feed = duplicate
+                session.save(update_fields=['video_feed', 'updated_at'])
+                return duplicate
+            os.replace(partial_path(session), default_storage.path(name))
+    except (FileNotFoundError, UploadError) as e:
+        # A concurrent finalize got there first
+        session.refresh_from_db()
+        if session.video_feed_id:
+            return session.video_feed
+        if isinstance(e, UploadError):
+            raise
+        raise UploadError('Upload data is missing', 410)
+
+    try:
+        with transaction.atomic():
+            video_feed = SOSVideoFeed(
+                emergency_id=session.emergency_id,
+                sent_to_police=True,
+                file_size=session.received_bytes,
+                chunk_sequence=session.chunk_sequence,
+                content_hash=chunk_hash,
+                timestamp=timezone.now()
+            )
+            video_feed.video_file.name = name
+
+            sos_alert = SOSAlert.objects.filter(id=session.emergency_id).first() if session.emergency_id.isdigit() else None
+            if sos_alert is not None:
+                if not sos_alert.is_streaming:
+                    sos_alert.is_streaming = True
+                    sos_alert.save()
+                video_feed.sos_alert = sos_alert
+            video_feed.save()
+
+            session.video_feed = video_feed
+            session.save(update_fields=['video_feed', 'updated_at'])
+    except Exception:
+        # Put the bytes back so a retried finalize finds them instead of a 410
+        os.replace(default_storage.path(name), partial_path(session))
+        raise
+
+    return video_feed
+
+
+def purge_stale_uploads(max_age=timedelta(days=1)):
+    """Delete unfinished uploads (and their partial files) idle for max_age"""
+    stale = VideoUploadSession.objects.filter(
+        video_feed__isnull=True,
+        updated_at__lt=timezone.now() - max_age
+    )
+    count = 0
+    for session in stale:
+        try:
+            os.remove(partial_path(session))
+        except FileNotFoundError:
+            pass
+        session.delete()
+        count += 1
+    return count
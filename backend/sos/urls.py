@@ -33,7 +33,12 @@ urlpatterns = [
     # path('upload-video-chunk/', upload_emergency_video_chunk, name='upload_emergency_video_chunk')
     # path('<int:sos_id>/video-feed/', views.get_video_feed, name='video_feed'),
     path('camera-feed/', views.upload_emergency_video_chunk, name='camera_feed'),
+    path('video-uploads/', views.start_video_upload, name='start_video_upload'),
+    path('video-uploads/<uuid:upload_id>/', views.video_upload_detail, name='video_upload_detail'),
+    path('video-uploads/<uuid:upload_id>/complete/', views.finalize_video_upload, name='finalize_video_upload'),
     path('emergency/<str:emergency_id>/video-feeds/', views.get_emergency_video_feeds, name='get_emergency_video_feeds'),
+    path('emergency/<str:emergency_id>/recording/', views.get_emergency_recording, name='get_emergency_recording'),
+    path('emergency/<str:emergency_id>/recording/stream/', views.stream_emergency_recording, name='stream_emergency_recording'),
     path('<int:sos_id>/start-video/', views.start_video_feed, name='start_video'),
 
     # NEW: Police video feed endpoints
@@ -0,0 +1,136 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from core.db import write_lane
+from .models import PoliceVideoView, SOSVideoFeed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_SECONDS = 5
+
+
+class VideoViewRecorder:
+    """Write-behind buffer for PoliceVideoView rows.
+
+    Dashboard reads only add (feed, officer) pairs to in-memory buffers; a
+    daemon thread writes them every VIDEO_VIEW_FLUSH_SECONDS with one
+    bulk insert on the write lane (core/db.py), so refreshing the
+    dashboard doesn't take the database write lock per chunk. A view
+    recorded twice before a flush is written once, and rows that already
+    exist are skipped by the unique constraint.
+    Buffered views are lost if the process dies before the next flush.
+    """
+
+    def __init__(self):
+        self._views = {}  # (feed_id, officer_id) -> viewed_at
+        self._durations = {}  # (feed_id, officer_id) -> (viewed_at, seconds)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'VIDEO_VIEW_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)
+
+    def record_views(self, officer_id, feed_ids):
+        now = timezone.now()
+        with self._lock:
+            for feed_id in feed_ids:
+                self._views.setdefault((feed_id, officer_id), now)
+        self._ensure_running()
+
+    def record_duration(self, officer_id, feed_id, seconds):
+        with self._lock:
+            self._durations[(feed_id, officer_id)] = (timezone.now(), seconds)
+        self._ensure_running()
+
+    def pending_feed_ids(self):
+        """Feeds with views not yet written to the database"""
+        with self._lock:
+            return {feed_id for feed_id, _ in self._views} | {feed_id for feed_id, _ in self._durations}
+
+    def flush(self):
+        with self._lock:
+            views, self._views = self._views, {}
+            durations, self._durations = self._durations, {}
+        if not views and not durations:
+            return 0
+
+        try:
+            write_lane.run(self._write, views, durations)
+        except DatabaseError:
+            # Put them back for the next flush, keeping anything newer
+            with self._lock:
+                for key, viewed_at in views.items():
+                    self._views.setdefault(key, viewed_at)
+                for key, value in durations.items():
+                    self._durations.setdefault(key, value)
+            raise
+        return len(views) + len(durations)
+
+    def _write(self, views, durations):
+        # Feeds can be deleted between the read and the flush
+        feed_ids = {feed_id for feed_id, _ in views} | {feed_id for feed_id, _ in durations}
+        existing = set(SOSVideoFeed.objects.filter(id__in=feed_ids).values_list('id', flat=True))
+
+        PoliceVideoView.objects.bulk_create(
+            [
+                PoliceVideoView(video_feed_id=feed_id, police_officer_id=officer_id, viewed_at=viewed_at)
+                for (feed_id, officer_id), viewed_at in views.items()
+                if feed_id in existing and (feed_id, officer_id) not in durations
+            ],
+            batch_size=500,
+            ignore_conflicts=True
+        )
+        PoliceVideoView.objects.bulk_create(
+            [
+                PoliceVideoView(
+                    video_feed_id=feed_id,
+                    police_officer_id=officer_id,
+                    viewed_at=viewed_at,
+                    viewing_duration=seconds
+                )
+                for (feed_id, officer_id), (viewed_at, seconds) in durations.items()
+                if feed_id in existing
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['video_feed', 'police_officer'],
+            update_fields=['viewing_duration']
+        )
+
+    def _ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='video-view-recorder', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except DatabaseError as e:
+                logger.error(f"Error flushing police video views: {str(e)}")
+            finally:
+                close_old_connections()
+
+
+video_view_recorder = VideoViewRecorder()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        video_view_recorder.flush()
+    except Exception as e:
+        logger.error(f"Error flushing police video views on exit: {str(e)}")
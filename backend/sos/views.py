@@ -4,17 +4,33 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 from datetime import datetime, timedelta
 import math
 import json
+import os
 import logging
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from django.db.models import Q
-from .models import PoliceVideoView, SOSAlert, SOSLocationUpdate, SOSVideoFeed, Volunteer, VolunteerAlert
+from django.db.models import Prefetch, Q
+from cityshield_backend.media import serve_media, signed_media_url
+from core.db import write_lane
+from core.idempotency import idempotent
+from .models import PoliceVideoView, SOSAlert, SOSLocationUpdate, SOSVideoFeed, VideoUploadSession, Volunteer, VolunteerAlert
 from .serializers import SOSAlertSerializer, VolunteerSerializer, VolunteerAlertSerializer
+from .dispatch import dispatch_volunteer_alerts
+from .escalation import escalation_scheduler
+from .segments import SegmentStore
+from .tasks import flush_emergency_recording, notify_police_about_video_feed
+from .tracking import get_simplified_track, normalize_tolerance
+from .view_tracking import video_view_recorder
+from .uploads import (
+    UPLOAD_BUFFER_SIZE, UploadError, append_chunk, content_hash, finalize_upload, find_duplicate_chunk,
+    max_upload_size, start_upload
+)
+from .volunteer_index import clamp_radius, volunteer_index
 
 # ==================== UTILITY FUNCTIONS ====================
 
@@ -31,32 +47,27 @@ def calculate_distance(lat1, lng1, lat2, lng2):
 
     return R * c
 
-def get_volunteers_in_radius(latitude, longitude, radius_meters):
-    """Get available volunteers within specified radius"""
-    thirty_minutes_ago = timezone.now() - timedelta(minutes=30)
-    
-    available_volunteers = Volunteer.objects.filter(
-        is_available=True,
-        last_location_update__gte=thirty_minutes_ago,
-        current_latitude__isnull=False,
-        current_longitude__isnull=False
-    )
-    
-    nearby_volunteers = []
-    for volunteer in available_volunteers:
-        distance = calculate_distance(
-            latitude, longitude,
-            volunteer.current_latitude, volunteer.current_longitude
-        )
-        if distance <= radius_meters:
-            nearby_volunteers.append(volunteer)
-    
-    return nearby_volunteers
+def get_volunteers_in_radius(latitude, longitude, radius_meters, limit=None):
+    """Get available volunteers within specified radius, nearest first
+
+    Candidates come from the in-memory volunteer index; only the matched
+    rows are loaded from the DB.
+    """
+    if limit:
+        matches = volunteer_index.nearest(latitude, longitude, limit, max_radius=radius_meters)
+    else:
+        matches = volunteer_index.within_radius(latitude, longitude, radius_meters)
+    if not matches:
+        return []
+
+    volunteers = Volunteer.objects.select_related('user').in_bulk([volunteer_id for volunteer_id, _ in matches])
+    return [volunteers[volunteer_id] for volunteer_id, _ in matches if volunteer_id in volunteers]
 
 # ==================== SOS ALERT MANAGEMENT ====================
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent
 def create_emergency_alert(request):
     """Create immediate emergency SOS alert"""
     try:
@@ -178,6 +189,9 @@ def resolve_sos(request, sos_id):
         sos_alert.resolved_at = timezone.now()
         sos_alert.save()
 
+        escalation_scheduler.cancel(sos_alert.id)
+        flush_emergency_recording.delay(sos_alert.id)
+
         return Response({
             'success': True,
             'message': 'Emergency alert resolved successfully'
@@ -188,6 +202,21 @@ def resolve_sos(request, sos_id):
 
 # ==================== LOCATION SERVICES ====================
 
+def _save_location_update(sos_alert, latitude, longitude, accuracy=None):
+    """Store a location ping and move the alert to it (runs on the write lane)"""
+    location_update = SOSLocationUpdate.objects.create(
+        sos_alert=sos_alert,
+        latitude=latitude,
+        longitude=longitude,
+        accuracy=accuracy
+    )
+
+    # Only the coordinates, so a ping can't undo a concurrent resolve
+    sos_alert.latitude = latitude
+    sos_alert.longitude = longitude
+    sos_alert.save(update_fields=['latitude', 'longitude'])
+    return location_update
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def send_location_update(request):
@@ -205,19 +234,14 @@ def send_location_update(request):
 
         sos_alert = get_object_or_404(SOSAlert, id=sos_id, is_active=True)
 
-        # Save location update
-        location_update = SOSLocationUpdate.objects.create(
-            sos_alert=sos_alert,
+        location_update = write_lane.run(
+            _save_location_update,
+            sos_alert,
             latitude=float(latitude),
             longitude=float(longitude),
             accuracy=float(accuracy) if accuracy else None
         )
 
-        # Update main SOS record with latest location
-        sos_alert.latitude = float(latitude)
-        sos_alert.longitude = float(longitude)
-        sos_alert.save()
-
         return Response({
             'success': True,
             'message': 'Location updated successfully',
@@ -230,21 +254,61 @@ def send_location_update(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_location_updates(request, sos_id):
-    """Get location updates for specific SOS alert"""
+    """Get location updates for specific SOS alert
+
+    Optional query params:
+    - since=<id|ISO timestamp>: only return points newer than this
+    - tolerance=<meters>: return a simplified (Douglas-Peucker) track
+    """
     try:
         sos_alert = get_object_or_404(SOSAlert, id=sos_id)
-        updates = SOSLocationUpdate.objects.filter(
-            sos_alert=sos_alert
-        ).order_by('-timestamp')
+
+        since = request.GET.get('since')
+        since_id = None
+        since_time = None
+        if since:
+            if since.isdigit():
+                since_id = int(since)
+            else:
+                since_time = parse_datetime(since.replace(' ', '+'))
+                if since_time is None:
+                    return Response({'error': 'since must be an update id or ISO timestamp'},
+                                  status=status.HTTP_400_BAD_REQUEST)
+                if timezone.is_naive(since_time):
+                    since_time = timezone.make_aware(since_time)
+
+        tolerance = request.GET.get('tolerance')
+        if tolerance:
+            try:
+                tolerance = normalize_tolerance(tolerance)
+            except (ValueError, TypeError):
+                return Response({'error': 'tolerance must be a number of meters'},
+                              status=status.HTTP_400_BAD_REQUEST)
+
+            updates = get_simplified_track(sos_alert.id, tolerance)
+            if since_id is not None:
+                updates = [u for u in updates if u['id'] > since_id]
+            elif since_time is not None:
+                updates = [u for u in updates if u['timestamp'] > since_time]
+            updates.reverse()
+        else:
+            updates = SOSLocationUpdate.objects.filter(sos_alert=sos_alert)
+            if since_id is not None:
+                updates = updates.filter(id__gt=since_id)
+            elif since_time is not None:
+                updates = updates.filter(timestamp__gt=since_time)
+            updates = updates.order_by('-timestamp').values(
+                'id', 'latitude', 'longitude', 'accuracy', 'timestamp'
+            )
 
         updates_data = []
         for update in updates:
             updates_data.append({
-                'id': update.id,
-                'latitude': update.latitude,
-                'longitude': update.longitude,
-                'accuracy': update.accuracy,
-                'timestamp': update.timestamp.isoformat()
+                'id': update['id'],
+                'latitude': update['latitude'],
+                'longitude': update['longitude'],
+                'accuracy': update['accuracy'],
+                'timestamp': update['timestamp'].isoformat()
             })
 
         return Response(updates_data)
@@ -266,19 +330,13 @@ def update_sos_location(request, sos_id):
             return Response({'error': 'Latitude and longitude required'},
                           status=status.HTTP_400_BAD_REQUEST)
         
-        # Create location update
-        location_update = SOSLocationUpdate.objects.create(
-            sos_alert=sos_alert,
+        location_update = write_lane.run(
+            _save_location_update,
+            sos_alert,
             latitude=float(latitude),
-            longitude=float(longitude),
-            timestamp=timezone.now()
+            longitude=float(longitude)
         )
         
-        # Update SOS alert location
-        sos_alert.latitude = float(latitude)
-        sos_alert.longitude = float(longitude)
-        sos_alert.save()
-        
         return Response({
             'success': True,
             'location_update_id': location_update.id,
@@ -488,7 +546,10 @@ def alert_volunteers_view(request):
         latitude = request.data.get('latitude')
         longitude = request.data.get('longitude')
         sos_alert_id = request.data.get('sos_alert_id')
-        radius = request.data.get('radius', 2000)  # Default 2km radius
+        try:
+            radius = clamp_radius(request.data.get('radius', 2000))  # Default 2km radius
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         if not all([latitude, longitude, sos_alert_id]):
             return Response({'error': 'latitude, longitude, and sos_alert_id are required'},
@@ -497,31 +558,20 @@ def alert_volunteers_view(request):
         # Get the SOS alert
         sos_alert = get_object_or_404(SOSAlert, id=sos_alert_id)
         
-        # Find nearby available volunteers
-        nearby_volunteers = get_volunteers_in_radius(float(latitude), float(longitude), radius)
+        # Alert all nearby available volunteers in one bulk insert
+        alerted = dispatch_volunteer_alerts(sos_alert, float(latitude), float(longitude), radius)
         
-        # Create volunteer alerts
-        volunteer_alerts_created = []
-        for volunteer in nearby_volunteers:
-            # Don't alert if already responded to this SOS
-            if not VolunteerAlert.objects.filter(
-                volunteer=volunteer,
-                sos_alert=sos_alert
-            ).exists():
-                volunteer_alert = VolunteerAlert.objects.create(
-                    volunteer=volunteer,
-                    sos_alert=sos_alert,
-                    distance_from_sos=calculate_distance(
-                        float(latitude), float(longitude),
-                        volunteer.current_latitude, volunteer.current_longitude
-                    )
-                )
-                volunteer_alerts_created.append(volunteer_alert)
+        # Widen the search later if nobody responds
+        next_radius = None
+        if sos_alert.is_active:
+            next_radius = escalation_scheduler.start_escalation(sos_alert.id, radius)
         
         return Response({
             'success': True,
-            'volunteers_alerted': len(volunteer_alerts_created),
-            'message': f'Alerted {len(volunteer_alerts_created)} nearby volunteers'
+            'volunteers_alerted': len(alerted),
+            'alerted_volunteer_ids': sorted(alerted),
+            'next_escalation_radius': next_radius,
+            'message': f'Alerted {len(alerted)} nearby volunteers'
         })
         
     except Exception as e:
@@ -581,13 +631,17 @@ def get_nearby_volunteers(request):
     try:
         latitude = float(request.GET.get('latitude', 0))
         longitude = float(request.GET.get('longitude', 0))
-        radius = float(request.GET.get('radius', 5000))  # Default 5km
+        limit = int(request.GET.get('limit', 0))  # Optional k-nearest
+        try:
+            radius = clamp_radius(request.GET.get('radius', 5000))  # Default 5km
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         if not latitude or not longitude:
             return Response({'error': 'latitude and longitude are required'},
                           status=status.HTTP_400_BAD_REQUEST)
         
-        volunteers = get_volunteers_in_radius(latitude, longitude, radius)
+        volunteers = get_volunteers_in_radius(latitude, longitude, radius, limit=limit or None)
         serializer = VolunteerSerializer(volunteers, many=True)
         
         return Response({
@@ -673,7 +727,7 @@ def upload_camera_feed(request):
                 sos_alert=sos_alert
             ).order_by('-chunk_sequence').first()
             
-            next_sequence = (last_chunk.chunk_sequence + 1) if last_chunk else 1
+            next_sequence = (last_chunk.chunk_sequence + 1) if last_chunk else 0
             
             # Save video feed
             video_feed = SOSVideoFeed.objects.create(
@@ -690,10 +744,7 @@ def upload_camera_feed(request):
             sos_alert.save()
             
             # Notify all police users about new video feed
-            try:
-                notify_police_about_video_feed.delay(video_feed.id)
-            except Exception as celery_error:
-                logger.warning(f"Failed to send Celery notification: {celery_error}")
+            transaction.on_commit(lambda: notify_police_about_video_feed.delay(video_feed.id))
             
         logger.info(f"✅ Video chunk {next_sequence} uploaded for SOS {sos_id}: {video_file.name} ({video_file.size} bytes)")
         
@@ -731,36 +782,39 @@ def get_police_video_feeds(request):
                 'error': 'Access denied - police access required'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Get active SOS alerts with video feeds
+        # Read-only: latest 10 chunks per active SOS and their views, in
+        # three queries; the views themselves are written behind
         active_sos_with_video = SOSAlert.objects.filter(
             is_active=True,
             is_streaming=True,
             video_feeds__isnull=False
-        ).distinct().order_by('-created_at')
+        ).distinct().select_related('user').order_by('-created_at').prefetch_related(
+            Prefetch(
+                'video_feeds',
+                queryset=SOSVideoFeed.objects.order_by('-timestamp')[:10],
+                to_attr='latest_feeds'
+            ),
+            Prefetch(
+                'latest_feeds__police_views',
+                queryset=PoliceVideoView.objects.only('id', 'video_feed_id'),
+                to_attr='views'
+            )
+        )
         
+        pending_views = video_view_recorder.pending_feed_ids()
+        seen_feed_ids = []
         feeds_data = []
         for sos_alert in active_sos_with_video:
-            # Get latest video feeds for this SOS
-            latest_feeds = SOSVideoFeed.objects.filter(
-                sos_alert=sos_alert
-            ).order_by('-timestamp')[:10]  # Latest 10 chunks
-            
             feed_chunks = []
-            for feed in latest_feeds:
-                # Mark as viewed by this police officer
-                PoliceVideoView.objects.get_or_create(
-                    video_feed=feed,
-                    police_officer=request.user,
-                    defaults={'viewed_at': timezone.now()}
-                )
-                
+            for feed in sos_alert.latest_feeds:
+                seen_feed_ids.append(feed.id)
                 feed_chunks.append({
                     'id': feed.id,
-                    'video_url': feed.video_file.url if feed.video_file else None,
+                    'video_url': signed_media_url(feed.video_file.name, request) if feed.video_file else None,
                     'timestamp': feed.timestamp.isoformat(),
                     'file_size': f"{feed.file_size / 1024 / 1024:.1f}MB" if feed.file_size else "Unknown",
                     'chunk_sequence': feed.chunk_sequence,
-                    'viewed_by_police': feed.viewed_by_police
+                    'viewed_by_police': bool(feed.views) or feed.id in pending_views
                 })
             
             feeds_data.append({
@@ -776,6 +830,8 @@ def get_police_video_feeds(request):
                 'video_feeds': feed_chunks
             })
         
+        video_view_recorder.record_views(request.user.id, seen_feed_ids)
+        
         return Response({
             'success': True,
             'active_emergency_feeds': feeds_data,
@@ -814,7 +870,7 @@ def get_emergency_video_feeds(request, emergency_id):
         for feed in video_feeds:
             feeds_data.append({
                 'id': feed.id,
-                'video_url': request.build_absolute_uri(feed.video_file.url) if feed.video_file else None,
+                'video_url': signed_media_url(feed.video_file.name, request) if feed.video_file else None,
                 'timestamp': feed.timestamp.isoformat(),
                 'chunk_sequence': feed.chunk_sequence,
                 'file_size': feed.file_size,
@@ -859,16 +915,80 @@ def get_emergency_video_feeds(request, emergency_id):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_emergency_recording(request, emergency_id):
+    """Playlist of an emergency's recording: one Range request per segment"""
+    try:
+        user_role = get_user_role(request.user)
+        if user_role not in ['police', 'admin']:
+            return Response({
+                'success': False,
+                'error': 'Access denied - police access required'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        store = SegmentStore(emergency_id)
+        if not store.exists():
+            return Response({
+                'success': False,
+                'error': f'No recording for emergency {emergency_id}'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        index = store.load_index()
+        return Response({
+            'success': True,
+            'emergency_id': emergency_id,
+            'recording_url': signed_media_url(store.recording_name, request),
+            'content_type': 'video/webm',
+            'size': index['size'],
+            'duration': index['duration'],
+            # Each segment is a WebM file of its own; the bytes are not one stream
+            'segments': [
+                {**segment, 'range': f"bytes={segment['offset']}-{segment['offset'] + segment['length'] - 1}"}
+                for segment in index['segments']
+            ],
+            'pending_sequences': sorted(int(key) for key in index['pending']),
+            'skipped_sequences': index['skipped']
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting recording for emergency {emergency_id}: {str(e)}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def stream_emergency_recording(request, emergency_id):
+    """Serve an emergency's recording file; play it segment by segment with Range"""
+    user_role = get_user_role(request.user)
+    if user_role not in ['police', 'admin']:
+        return Response({
+            'success': False,
+            'error': 'Access denied - police access required'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    store = SegmentStore(emergency_id)
+    if not os.path.exists(store.recording_path):
+        return Response({
+            'success': False,
+            'error': f'No recording for emergency {emergency_id}'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    return serve_media(request, store.recording_name)
+
 # sos/views.py - Handle discrete chunks
 @api_view(['POST'])
 @permission_classes([AllowAny])
 @parser_classes([MultiPartParser, FormParser])
+@idempotent
 def upload_emergency_video_chunk(request):
     """Upload discrete video chunk for emergency"""
     try:
         emergency_id = request.data.get('sos_id')
         video_file = request.FILES.get('video')
-        chunk_number = request.data.get('chunk_number', 1)  # Get chunk sequence
+        chunk_number = request.data.get('chunk_number', 0)  # Get chunk sequence
         
         if not emergency_id or not video_file:
             return Response({
@@ -882,6 +1002,25 @@ def upload_emergency_video_chunk(request):
                 'error': 'Video chunk too large (max 50MB)'
             }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
         
+        # A retried chunk with the same bytes reuses the stored feed
+        chunk_hash = content_hash(video_file.chunks())
+        video_feed = find_duplicate_chunk(emergency_id, chunk_hash)
+        if video_feed is not None:
+            logger.info(f"Duplicate chunk {chunk_number} for emergency {emergency_id}, reusing feed {video_feed.id}")
+            return Response({
+                'success': True,
+                'duplicate': True,
+                'message': f'Discrete chunk {video_feed.chunk_sequence} already saved',
+                'feed_details': {
+                    'feed_id': video_feed.id,
+                    'emergency_id': emergency_id,
+                    'chunk_sequence': video_feed.chunk_sequence,
+                    'file_size': f"{video_feed.file_size / (1024 * 1024):.1f}MB",
+                    'uploaded_at': video_feed.timestamp.isoformat(),
+                    'video_url': signed_media_url(video_feed.video_file.name, request) if video_feed.video_file else None
+                }
+            })
+        
         with transaction.atomic():
             # ✅ SAVE EACH DISCRETE CHUNK AS SEPARATE RECORD
             video_feed = SOSVideoFeed.objects.create(
@@ -890,6 +1029,7 @@ def upload_emergency_video_chunk(request):
                 sent_to_police=True,
                 file_size=video_file.size,
                 chunk_sequence=chunk_number,  # Track sequence
+                content_hash=chunk_hash,
                 timestamp=timezone.now()
             )
             
@@ -904,6 +1044,8 @@ def upload_emergency_video_chunk(request):
             except SOSAlert.DoesNotExist:
                 pass
             
+        notify_police_about_video_feed.delay(video_feed.id)
+        
         logger.info(f"✅ Saved discrete chunk {chunk_number} for emergency {emergency_id}: {video_file.size} bytes")
         
         return Response({
@@ -915,7 +1057,7 @@ def upload_emergency_video_chunk(request):
                 'chunk_sequence': chunk_number,
                 'file_size': f"{video_file.size / (1024 * 1024):.1f}MB",
                 'uploaded_at': video_feed.timestamp.isoformat(),
-                'video_url': request.build_absolute_uri(video_feed.video_file.url)
+                'video_url': signed_media_url(video_feed.video_file.name, request)
             }
         })
         
@@ -926,6 +1068,125 @@ def upload_emergency_video_chunk(request):
             'error': f'Server error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def start_video_upload(request):
+    """Start a resumable video chunk upload and return its upload id"""
+    try:
+        emergency_id = request.data.get('sos_id')
+        if not emergency_id:
+            return Response({
+                'success': False,
+                'error': 'Emergency ID is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            chunk_number = int(request.data.get('chunk_number', 0))
+            total_size = request.data.get('total_size')
+            total_size = int(total_size) if total_size not in (None, '') else None
+        except (ValueError, TypeError):
+            return Response({
+                'success': False,
+                'error': 'chunk_number and total_size must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        session = start_upload(emergency_id, chunk_number, request.data.get('filename'), total_size)
+
+        return Response({
+            'success': True,
+            'upload_id': str(session.upload_id),
+            'offset': 0,
+            'buffer_size': UPLOAD_BUFFER_SIZE,
+            'max_size': max_upload_size()
+        }, status=status.HTTP_201_CREATED)
+
+    except UploadError as e:
+        return Response({'success': False, 'error': str(e)}, status=e.status_code)
+    except Exception as e:
+        logger.error(f"Error starting video upload: {str(e)}")
+        return Response({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'HEAD', 'PATCH'])
+@permission_classes([AllowAny])
+@parser_classes([])
+def video_upload_detail(request, upload_id):
+    """Report the resume offset (GET/HEAD) or append bytes at Content-Range (PATCH)"""
+    session = get_object_or_404(VideoUploadSession, upload_id=upload_id)
+
+    if request.method == 'PATCH':
+        try:
+            content_length = request.META.get('CONTENT_LENGTH')
+            try:
+                content_length = int(content_length) if content_length else None
+            except ValueError:
+                raise UploadError('Invalid Content-Length')
+            append_chunk(session, request.stream, request.headers.get('Content-Range'), content_length)
+        except UploadError as e:
+            response = Response({
+                'success': False,
+                'error': str(e),
+                'offset': session.received_bytes
+            }, status=e.status_code)
+            response['Upload-Offset'] = session.received_bytes
+            return response
+        except Exception as e:
+            logger.error(f"Error appending to upload {upload_id}: {str(e)}")
+            return Response({
+                'success': False,
+                'error': f'Server error: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    response = Response({
+        'success': True,
+        'upload_id': str(session.upload_id),
+        'offset': session.received_bytes,
+        'total_size': session.total_size,
+        'finalized': session.video_feed_id is not None
+    })
+    response['Upload-Offset'] = session.received_bytes
+    return response
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def finalize_video_upload(request, upload_id):
+    """Finish a resumable upload and save it as a video feed chunk"""
+    session = get_object_or_404(VideoUploadSession, upload_id=upload_id)
+
+    try:
+        video_feed = finalize_upload(session)
+    except UploadError as e:
+        return Response({
+            'success': False,
+            'error': str(e),
+            'offset': session.received_bytes
+        }, status=e.status_code)
+    except Exception as e:
+        logger.error(f"Error finalizing upload {upload_id}: {str(e)}")
+        return Response({
+            'success': False,
+            'error': f'Server error: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    notify_police_about_video_feed.delay(video_feed.id)
+
+    logger.info(f"Saved resumable chunk {video_feed.chunk_sequence} for emergency {video_feed.emergency_id}: {video_feed.file_size} bytes")
+
+    return Response({
+        'success': True,
+        'message': f'Chunk {video_feed.chunk_sequence} saved successfully',
+        'feed_details': {
+            'feed_id': video_feed.id,
+            'emergency_id': video_feed.emergency_id,
+            'chunk_sequence': video_feed.chunk_sequence,
+            'file_size': f"{video_feed.file_size / (1024 * 1024):.1f}MB",
+            'uploaded_at': video_feed.timestamp.isoformat(),
+            'video_url': signed_media_url(video_feed.video_file.name, request)
+        }
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_video_viewed(request, video_feed_id):
@@ -939,27 +1200,15 @@ def mark_video_viewed(request, video_feed_id):
             }, status=status.HTTP_403_FORBIDDEN)
         
         video_feed = get_object_or_404(SOSVideoFeed, id=video_feed_id)
-        viewing_duration = request.data.get('viewing_duration', 0)
-        
-        # Update or create police view record
-        police_view, created = PoliceVideoView.objects.get_or_create(
-            video_feed=video_feed,
-            police_officer=request.user,
-            defaults={
-                'viewed_at': timezone.now(),
-                'viewing_duration': viewing_duration
-            }
-        )
-        
-        if not created:
-            police_view.viewing_duration = viewing_duration
-            police_view.save()
+        try:
+            viewing_duration = int(float(request.data.get('viewing_duration', 0)))
+        except (ValueError, TypeError):
+            return Response({
+                'success': False,
+                'error': 'viewing_duration must be a number of seconds'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Mark video as viewed
-        if not video_feed.viewed_by_police:
-            video_feed.viewed_by_police = True
-            video_feed.viewed_at = timezone.now()
-            video_feed.save()
+        video_view_recorder.record_duration(request.user.id, video_feed.id, viewing_duration)
         
         return Response({
             'success': True,
@@ -974,24 +1223,6 @@ def mark_video_viewed(request, video_feed_id):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-# NEW: Celery task for notifications (optional)
-def notify_police_about_video_feed(video_feed_id):
-    """Background task to notify police about new video feed"""
-    try:
-        video_feed = SOSVideoFeed.objects.get(id=video_feed_id)
-        
-        # Get all police users
-        police_users = User.objects.filter(
-            Q(is_police=True) | Q(groups__name='Police')
-        )
-        
-        # Here you would send push notifications, emails, etc.
-        # For now, just log
-        logger.info(f"New video feed available for SOS {video_feed.sos_alert.id} - notifying {police_users.count()} officers")
-        
-    except Exception as e:
-        logger.error(f"Error notifying police: {str(e)}")
-
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_video_feed(request, sos_id):
@@ -1004,7 +1235,7 @@ def get_video_feed(request, sos_id):
         for feed in video_feeds:
             feeds_data.append({
                 'id': feed.id,
-                'video_url': feed.video_file.url if feed.video_file else None,
+                'video_url': signed_media_url(feed.video_file.name, request) if feed.video_file else None,
                 'timestamp': feed.timestamp.isoformat(),
                 'sent_to_police': feed.sent_to_police
             })
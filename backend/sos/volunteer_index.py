@@ -0,0 +1,135 @@
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from .models import Volunteer
+from .spatial import GridIndex
+
+logger = logging.getLogger(__name__)
+
+# Volunteers whose last location is older than this are not alerted
+VOLUNTEER_FRESHNESS = timedelta(minutes=30)
+# Largest radius a caller may search or alert, in meters
+MAX_VOLUNTEER_RADIUS = 50000
+
+
+def clamp_radius(radius):
+    """A caller-supplied radius capped to MAX_VOLUNTEER_RADIUS; ValueError if it isn't a positive number"""
+    radius = float(radius)
+    if not math.isfinite(radius) or radius <= 0:
+        raise ValueError('radius must be a positive number of meters')
+    return min(radius, getattr(settings, 'MAX_VOLUNTEER_RADIUS', MAX_VOLUNTEER_RADIUS))
+
+
+class VolunteerIndex:
+    """Live positions of available volunteers, kept in memory.
+
+    Availability and location writes update the index through model signals
+    (see sos/signals.py). Each worker process has its own copy, so the index
+    is also re-synced from the DB every VOLUNTEER_INDEX_RESYNC_SECONDS to
+    pick up writes handled by other workers. The re-sync runs on a
+    background thread; queries keep using the current copy meanwhile.
+    """
+
+    def __init__(self, freshness=VOLUNTEER_FRESHNESS):
+        self.freshness = freshness
+        self.grid = GridIndex(
+            cell_size=getattr(settings, 'VOLUNTEER_INDEX_CELL_SIZE', 0.01),
+            ttl=freshness.total_seconds()
+        )
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._resync_thread = None
+
+    @property
+    def resync_interval(self):
+        return getattr(settings, 'VOLUNTEER_INDEX_RESYNC_SECONDS', 30)
+
+    def warm(self, max_age=None):
+        """Rebuild the index from Volunteer rows.
+
+        With ``max_age`` (seconds), skip the rebuild if another caller
+        finished one that recently while this one waited for the lock.
+        """
+        with self._lock:
+            if max_age is not None and self._synced_at is not None and time.monotonic() - self._synced_at <= max_age:
+                return
+            cutoff = timezone.now() - self.freshness
+            rows = Volunteer.objects.filter(
+                is_available=True,
+                last_location_update__gte=cutoff,
+                current_latitude__isnull=False,
+                current_longitude__isnull=False
+            ).values_list('id', 'current_latitude', 'current_longitude', 'last_location_update')
+
+            self.grid.replace_all(
+                (volunteer_id, lat, lng, updated.timestamp())
+                for volunteer_id, lat, lng, updated in rows
+            )
+            self._synced_at = time.monotonic()
+        logger.info(f"Volunteer index warmed with {len(self.grid)} live volunteers")
+
+    def ensure_warm(self):
+        """Load the index on first use; later re-syncs run in the background"""
+        synced_at = self._synced_at
+        if synced_at is None:
+            self.warm(max_age=self.resync_interval)
+        elif time.monotonic() - synced_at > self.resync_interval:
+            self._resync_in_background()
+
+    def _resync_in_background(self):
+        if self._resync_thread is not None and self._resync_thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._resync_thread is None or not self._resync_thread.is_alive():
+                self._resync_thread = threading.Thread(
+                    target=self._resync, name='volunteer-index-resync', daemon=True
+                )
+                self._resync_thread.start()
+
+    def _resync(self):
+        try:
+            self.warm(max_age=self.resync_interval)
+        except DatabaseError as e:
+            logger.warning(f"Volunteer index re-sync failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+    def update(self, volunteer):
+        """Reflect a saved Volunteer in the index"""
+        if (volunteer.is_available
+                and volunteer.current_latitude is not None
+                and volunteer.current_longitude is not None
+                and volunteer.last_location_update is not None
+                and volunteer.last_location_update >= timezone.now() - self.freshness):
+            self.grid.upsert(
+                volunteer.id,
+                volunteer.current_latitude,
+                volunteer.current_longitude,
+                volunteer.last_location_update.timestamp()
+            )
+        else:
+            self.grid.remove(volunteer.id)
+
+    def remove(self, volunteer_id):
+        self.grid.remove(volunteer_id)
+
+    def within_radius(self, latitude, longitude, radius_meters):
+        """(volunteer_id, distance) pairs within radius, nearest first"""
+        self.ensure_warm()
+        return self.grid.within_radius(latitude, longitude, radius_meters)
+
+    def nearest(self, latitude, longitude, k, max_radius=50000):
+        """Up to k (volunteer_id, distance) pairs, nearest first"""
+        self.ensure_warm()
+        return self.grid.nearest(latitude, longitude, k, max_radius=max_radius)
+
+
+volunteer_index = VolunteerIndex()
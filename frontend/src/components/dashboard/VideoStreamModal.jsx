@@ -21,6 +21,8 @@ const VideoStreamModal = ({ streamData, onClose }) => {
     const [activeTab, setActiveTab] = useState('details');
     const [loadingFeeds, setLoadingFeeds] = useState(false);
     const [showControls, setShowControls] = useState(true);
+    const [recording, setRecording] = useState(null);
+    const [currentUrl, setCurrentUrl] = useState(null);
 
     const videoRef = useRef(null);
     const containerRef = useRef(null);
@@ -28,7 +30,11 @@ const VideoStreamModal = ({ streamData, onClose }) => {
     const fetchFeeds = useCallback(async () => {
         setLoadingFeeds(true);
         try {
-            const res = await sosService.getEmergencyVideoFeeds(streamData.id);
+            const [res, rec] = await Promise.all([
+                sosService.getEmergencyVideoFeeds(streamData.id),
+                sosService.getEmergencyRecording(streamData.id)
+            ]);
+            setRecording(rec.success ? rec.data : null);
             if (res.success) {
                 setVideoFeeds(res.data.video_feeds);
                 setCurrentIndex(0);
@@ -73,7 +79,43 @@ const VideoStreamModal = ({ streamData, onClose }) => {
         };
     }, [onClose]);
 
-    const currentUrl = videoFeeds[currentIndex]?.video_url;
+    const currentFeed = videoFeeds[currentIndex];
+    const currentSegment = recording?.segments.find(segment => segment.feed_id === currentFeed?.id);
+
+    // Chunks archived by retention have no file of their own. Each segment of
+    // the recording is a complete WebM file, so fetch just its byte range and
+    // play that; the recording as a whole is not one playable stream.
+    useEffect(() => {
+        if (currentFeed?.video_url || !currentSegment) {
+            setCurrentUrl(currentFeed?.video_url || null);
+            return undefined;
+        }
+
+        let cancelled = false;
+        let objectUrl = null;
+        fetch(recording.recording_url, { headers: { Range: currentSegment.range } })
+            .then(res => {
+                if (!res.ok) throw new Error(`HTTP ${res.status}`);
+                return res.blob();
+            })
+            .then(blob => {
+                if (cancelled) return;
+                objectUrl = URL.createObjectURL(new Blob([blob], { type: recording.content_type }));
+                setCurrentUrl(objectUrl);
+            })
+            .catch(() => {
+                if (!cancelled) {
+                    setError('Failed to load recording segment');
+                    setLoading(false);
+                }
+            });
+
+        return () => {
+            cancelled = true;
+            if (objectUrl) URL.revokeObjectURL(objectUrl);
+        };
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [currentFeed?.id, currentFeed?.video_url, currentSegment?.range, recording?.recording_url]);
 
     // Video event handlers
     const handleVideoLoaded = () => {
@@ -241,7 +241,7 @@ export const SOSProvider = ({ children }) => {
 
             mediaRecorder.onstop = async () => {
                 if (chunks.length > 0) {
-                    const chunkNumber = ++chunkCounterRef.current;
+                    const chunkNumber = chunkCounterRef.current++;
                     const videoBlob = new Blob(chunks, { type: 'video/webm' });
 
                     if (videoBlob.size > 1000) {
@@ -267,7 +267,7 @@ export const SOSProvider = ({ children }) => {
             };
 
             mediaRecorder.start();
-            console.log(`🔴 Started recording chunk ${chunkCounterRef.current + 1}`);
+            console.log(`🔴 Started recording chunk ${chunkCounterRef.current}`);
 
             setTimeout(() => {
                 if (mediaRecorder.state === 'recording') {
@@ -200,6 +200,24 @@ const sosService = {
         }
     },
 
+    getEmergencyRecording: async (emergencyId) => {
+        try {
+            const response = await api.get(`/sos/emergency/${emergencyId}/recording/`);
+            return {
+                success: true,
+                data: response.data,
+                message: 'Recording fetched successfully'
+            };
+        } catch (error) {
+            console.error('Error fetching emergency recording:', error);
+            return {
+                success: false,
+                data: null,
+                message: error.response?.data?.error || 'Failed to fetch recording'
+            };
+        }
+    },
+
     startVideoStream: async (sosId) => {
         try {
             const response = await api.post(`/sos/${sosId}/start-video/`);